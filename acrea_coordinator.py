@@ -1,93 +1,511 @@
-# acrea_coordinator.py
-
-import logging
-import os
-from dotenv import load_dotenv
-from system_prompt_module import ACREA_SYSTEM_PROMPT
-
-# Basic logging setup
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-class AcreaCoordinator:
-    """
-    Acts as a Mediator for communication between different AI modules
-    within the main Acrea application (`gemini_2.5.py`). Modules are registered
-    by the main application, and messages are routed through this coordinator.
-    """
-    def __init__(self):
-        self.modules = {}  # Registry: module_name -> module_instance
-        self.context = {}  # Optional shared context
-        self.logger = logging.getLogger("AcreaCoordinator")
-        # Configuration loading from .env can be managed here or in the main app
-        # load_dotenv() # Load if coordinator needs direct access to config
-        # self.config = os.environ
-        self.logger.info("AcreaCoordinator (Mediator) initialized.")
-
-    def register_module(self, module_name: str, module_instance: object):
-        """Registers a functional module instance provided by the main application."""
-        if module_name in self.modules:
-             self.logger.warning(f"Re-registering module '{module_name}'. Overwriting previous instance.")
-        self.modules[module_name] = module_instance
-        self.logger.info(f"Module '{module_name}' registered with the coordinator.")
-
-    def get_module(self, module_name: str):
-         """Retrieves a registered module instance."""
-         return self.modules.get(module_name)
-
-    def route_message(self, message: dict):
-        """
-        Routes a message dictionary to the specified target module's handle_message method.
-
-        Args:
-            message: A dictionary containing message details, including:
-                - 'target_module': The string name of the destination module.
-                - 'action': The specific action the target module should perform.
-                - 'payload': A dictionary containing the data needed for the action.
-
-        Returns:
-            The result from the target module's handle_message method, or None on error.
-
-        Raises:
-            KeyError: If 'target_module' or 'action' is missing.
-            AttributeError: If the target module doesn't have 'handle_message'.
-        """
-        if 'target_module' not in message or 'action' not in message:
-            self.logger.error("Message routing failed: Missing 'target_module' or 'action' key.")
-            raise KeyError("Message dictionary must contain 'target_module' and 'action' keys.")
-
-        target_module_name = message["target_module"]
-        action = message["action"]
-        payload = message.get("payload", {}) # Payload is optional
-
-        module_instance = self.modules.get(target_module_name)
-
-        if module_instance:
-            self.logger.debug(f"Routing action '{action}' to module '{target_module_name}'.")
-            try:
-                # Check if module has the standard handler method
-                if not hasattr(module_instance, 'handle_message'):
-                     raise AttributeError(f"Module '{target_module_name}' is missing the required 'handle_message' method.")
-
-                # Call the module's handler
-                response = module_instance.handle_message(action=action, payload=payload)
-                return response
-
-            except AttributeError as ae:
-                 self.logger.error(ae)
-                 raise # Re-raise attribute error as it's a module implementation issue
-            except Exception as e:
-                 self.logger.error(f"Error executing handle_message in module '{target_module_name}' for action '{action}': {e}", exc_info=True)
-                 return None # Return None on general module error during handling
-        else:
-            self.logger.warning(f"Routing failed: Module '{target_module_name}' not found in registry.")
-            return None # Indicate routing failure
-
-    # --- Optional Context Management ---
-    def set_context(self, key: str, value: any):
-        """Sets a value in the shared context."""
-        self.context[key] = value
-        self.logger.debug(f"Coordinator context updated: '{key}' set.")
-
-    def get_context(self, key: str, default: any = None):
-        """Gets a value from the shared context."""
+# acrea_coordinator.py
+
+import asyncio
+import contextlib
+import inspect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from coordinator_metrics import CoordinatorMetrics, METRICS_DUMP_ENV
+from speech_chunking import SentenceAccumulator
+from startup_report import STARTUP
+from system_prompt_module import ACREA_SYSTEM_PROMPT
+
+# Basic logging setup
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# Worker threads per blocking module when neither the caller nor the module says otherwise
+DEFAULT_MODULE_MAX_WORKERS = 4
+# A spoken stream gives up on a playback queue that has had no room for this long (consumer gone)
+PLAYBACK_STALL_SECONDS = 120.0
+PLAYBACK_POLL_SECONDS = 0.25 # How often a blocked delivery rechecks the cancel token
+
+class AcreaCoordinator:
+    """
+    Acts as a Mediator for communication between different AI modules
+    within the main Acrea application (`gemini_2.5.py`). Modules are registered
+    by the main application, and messages are routed through this coordinator.
+
+    Every routed call and stream is timed in `self.metrics` (CoordinatorMetrics), labelled by
+    module and action; wrap a request in `self.metrics.trace()` to link its stages.
+    """
+    def __init__(self):
+        self.modules = {}  # Registry: module_name -> module_instance
+        self.factories = {}  # module_name -> factory for modules not built yet (see register_module)
+        self._module_locks = {}  # module_name -> lock held while its factory runs
+        self.executors = {}  # module_name -> bounded ThreadPoolExecutor for blocking handlers
+        self.context = {}  # Optional shared context
+        self.logger = logging.getLogger("AcreaCoordinator")
+        # Background event loop used by sync callers (GUI callbacks) to submit async work
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        self._background_tasks = set() # Fire-and-forget tasks, referenced until done
+        self.metrics = CoordinatorMetrics()
+        # Configuration loading from .env can be managed here or in the main app
+        # load_dotenv() # Load if coordinator needs direct access to config
+        # self.config = os.environ
+        self.logger.info("AcreaCoordinator (Mediator) initialized.")
+
+    def register_module(self, module_name: str, module_instance: object = None, max_workers: int = None,
+                        factory: callable = None):
+        """
+        Registers a functional module instance provided by the main application, or a factory
+        that builds it on first use.
+
+        Args:
+            module_name: Name used as 'target_module' when routing messages.
+            module_instance: Object exposing handle_message (and optionally handle_message_async).
+            max_workers: Size of the module's executor for async routing of blocking handlers.
+                         Defaults to the module's own 'max_workers' attribute, then
+                         DEFAULT_MODULE_MAX_WORKERS (always the latter for a factory).
+            factory: Zero-argument callable returning the module, instead of module_instance. It
+                     runs (once) on the first message routed to the module, get_module() call or
+                     warm-up, so slow imports and connections stay off the startup path.
+        """
+        if (module_instance is None) == (factory is None):
+            raise ValueError("Pass exactly one of module_instance and factory.")
+        if module_name in self.modules or module_name in self.factories:
+             self.logger.warning(f"Re-registering module '{module_name}'. Overwriting previous instance.")
+             self.modules.pop(module_name, None)
+             old_executor = self.executors.pop(module_name, None)
+             if old_executor:
+                 old_executor.shutdown(wait=False)
+        if factory is not None:
+            self.factories[module_name] = factory
+            self._module_locks[module_name] = threading.Lock()
+        else:
+            self.factories.pop(module_name, None)
+            self.modules[module_name] = module_instance
+        if max_workers is None:
+            max_workers = getattr(module_instance, "max_workers", DEFAULT_MODULE_MAX_WORKERS)
+        self.executors[module_name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"acrea-{module_name}")
+        self.logger.info(f"Module '{module_name}' registered with the coordinator (executor workers: {max_workers}"
+                         f"{', built on first use' if factory is not None else ''}).")
+
+    def get_module(self, module_name: str):
+         """Retrieves a registered module instance, building it first if it was registered with a factory."""
+         if module_name in self.factories:
+             return self._build_module(module_name)
+         return self.modules.get(module_name)
+
+    def _build_module(self, module_name: str):
+        """Runs a module's factory once (concurrent callers wait for it). Factory errors propagate."""
+        with self._module_locks[module_name]:
+            module_instance = self.modules.get(module_name)
+            if module_instance is None:
+                start = time.perf_counter()
+                module_instance = self.factories[module_name]()
+                elapsed = time.perf_counter() - start
+                self.modules[module_name] = module_instance
+                self.factories.pop(module_name, None)
+                STARTUP.record(f"module '{module_name}'", elapsed, kind="module")
+                self.logger.info(f"Module '{module_name}' built on first use in {elapsed * 1000:.0f} ms.")
+            return module_instance
+
+    def _resolve_route(self, message: dict):
+        """Validates a message and returns (module_name, action, payload, module_instance)."""
+        if 'target_module' not in message or 'action' not in message:
+            self.logger.error("Message routing failed: Missing 'target_module' or 'action' key.")
+            raise KeyError("Message dictionary must contain 'target_module' and 'action' keys.")
+
+        target_module_name = message["target_module"]
+        action = message["action"]
+        payload = message.get("payload", {}) # Payload is optional
+        return target_module_name, action, payload, self.modules.get(target_module_name)
+
+    def route_message(self, message: dict):
+        """
+        Routes a message dictionary to the specified target module's handle_message method.
+
+        Args:
+            message: A dictionary containing message details, including:
+                - 'target_module': The string name of the destination module.
+                - 'action': The specific action the target module should perform.
+                - 'payload': A dictionary containing the data needed for the action.
+
+        Returns:
+            The result from the target module's handle_message method, or None on error.
+
+        Raises:
+            KeyError: If 'target_module' or 'action' is missing.
+            AttributeError: If the target module doesn't have 'handle_message'.
+        """
+        target_module_name, action, payload, module_instance = self._resolve_route(message)
+        if module_instance is None and target_module_name in self.factories:
+            try:
+                module_instance = self._build_module(target_module_name)
+            except Exception as e:
+                self.logger.error(f"Failed to build module '{target_module_name}': {e}", exc_info=True)
+                return None
+
+        if module_instance:
+            self.logger.debug(f"Routing action '{action}' to module '{target_module_name}'.")
+            try:
+                # Check if module has the standard handler method
+                if not hasattr(module_instance, 'handle_message'):
+                     raise AttributeError(f"Module '{target_module_name}' is missing the required 'handle_message' method.")
+
+                # Call the module's handler
+                span = self.metrics.start(target_module_name, action)
+                try:
+                    response = module_instance.handle_message(action=action, payload=payload)
+                except BaseException as e:
+                    self.metrics.finish(span, e)
+                    raise
+                self.metrics.finish(span)
+                return response
+
+            except AttributeError as ae:
+                 self.logger.error(ae)
+                 raise # Re-raise attribute error as it's a module implementation issue
+            except Exception as e:
+                 self.logger.error(f"Error executing handle_message in module '{target_module_name}' for action '{action}': {e}", exc_info=True)
+                 return None # Return None on general module error during handling
+        else:
+            self.logger.warning(f"Routing failed: Module '{target_module_name}' not found in registry.")
+            return None # Indicate routing failure
+
+    async def route_message_async(self, message: dict, cancel_token=None):
+        """
+        Async counterpart of route_message.
+
+        Modules exposing a coroutine 'handle_message_async' (or a coroutine 'handle_message')
+        are awaited directly on the running loop. Blocking modules are run on their own
+        bounded executor, so a slow chat call cannot starve embedding or search calls.
+
+        Args:
+            message: Same as route_message.
+            cancel_token: Optional CancellationToken (job_scheduler); a cancelled job is not routed.
+
+        Returns/Raises: Same contract as route_message; asyncio.CancelledError once cancel_token is set.
+        """
+        target_module_name, action, payload, module_instance = self._resolve_route(message)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if module_instance is None and target_module_name in self.factories:
+            try:
+                # Built on the module's executor: its imports and connections must not block the loop
+                module_instance = await asyncio.get_running_loop().run_in_executor(
+                    self.executors.get(target_module_name), self._build_module, target_module_name)
+            except Exception as e:
+                self.logger.error(f"Failed to build module '{target_module_name}': {e}", exc_info=True)
+                return None
+
+        if not module_instance:
+            self.logger.warning(f"Routing failed: Module '{target_module_name}' not found in registry.")
+            return None
+
+        self.logger.debug(f"Routing action '{action}' to module '{target_module_name}' (async).")
+        span = self.metrics.start(target_module_name, action)
+        error = None
+        try:
+            async_handler = getattr(module_instance, 'handle_message_async', None)
+            if async_handler is None and inspect.iscoroutinefunction(getattr(module_instance, 'handle_message', None)):
+                async_handler = module_instance.handle_message
+            if async_handler is not None:
+                return await async_handler(action=action, payload=payload)
+
+            if not hasattr(module_instance, 'handle_message'):
+                 raise AttributeError(f"Module '{target_module_name}' is missing the required 'handle_message' method.")
+
+            loop = asyncio.get_running_loop()
+            executor = self.executors.get(target_module_name)
+            return await loop.run_in_executor(
+                executor, lambda: module_instance.handle_message(action=action, payload=payload)
+            )
+
+        except AttributeError as ae:
+             error = ae
+             self.logger.error(ae)
+             raise
+        except asyncio.CancelledError as ce:
+             error = ce
+             raise # Let cancellation propagate to the awaiting task
+        except Exception as e:
+             error = e
+             self.logger.error(f"Error executing handle_message in module '{target_module_name}' for action '{action}': {e}", exc_info=True)
+             return None
+        finally:
+             self.metrics.finish(span, error)
+
+    async def stream_message_async(self, message: dict, cancel_token=None):
+        """
+        Routes a streaming action and yields its chunks as they are produced.
+
+        The target handler may return an async iterator, a plain (blocking) iterator/generator,
+        or a single string. Blocking iterators are advanced on the module's executor so the
+        event loop never waits on the network. Nothing is yielded if routing fails.
+
+        With a cancel_token, the token is checked before every chunk (asyncio.CancelledError once
+        set). However the stream ends (including task cancellation or the consumer stopping), a
+        blocking generator is closed right after its in-flight step, which ends the module's
+        underlying request instead of leaving it running.
+
+        The whole stream, until the consumer stops reading, is recorded as a "stream" span, with
+        its time to first chunk.
+        """
+        span = self.metrics.start(message.get("target_module"), message.get("action"), kind="stream")
+        error = None
+        try:
+            async with contextlib.aclosing(self._stream_chunks(message, cancel_token)) as chunks:
+                async for chunk in chunks:
+                    self.metrics.first_chunk(span)
+                    yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.metrics.finish(span, error)
+
+    async def _stream_chunks(self, message: dict, cancel_token=None):
+        result = await self.route_message_async(message, cancel_token)
+        if result is None:
+            return
+        if isinstance(result, str):
+            yield result
+            return
+        if hasattr(result, "__aiter__"):
+            async for chunk in result:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                yield chunk
+            return
+
+        target_module_name = message["target_module"]
+        executor = self.executors.get(target_module_name)
+        iterator = iter(result)
+        done = object() # Sentinel returned by next() once the iterator is exhausted
+        step = None # Future of the in-flight next() call
+        try:
+            while True:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                step = executor.submit(next, iterator, done)
+                try:
+                    chunk = await asyncio.wrap_future(step)
+                except Exception as e:
+                    self.logger.error(f"Error while streaming from module '{target_module_name}' for action '{message['action']}': {e}", exc_info=True)
+                    return
+                if chunk is done:
+                    return
+                yield chunk
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None and step is not None:
+                # A generator cannot be closed while next() runs on another thread: close after the step
+                step.add_done_callback(lambda _: self._close_quietly(executor, close))
+
+    def _close_quietly(self, executor, close: callable):
+        try:
+            executor.submit(close)
+        except RuntimeError:
+            close() # Executor already shut down; the step has finished, so closing here is safe
+
+    async def stream_with_speech_async(self, message: dict, playback_queue: asyncio.Queue,
+                                       tts_payload: dict = None, tts_module: str = "tts", cancel_token=None):
+        """
+        Streams a text action like stream_message_async while speaking it sentence by sentence.
+
+        Each sentence is sent to the TTS module ('synthesize_speech') as soon as the stream
+        completes it, so synthesis overlaps generation. Results are put on `playback_queue` in
+        sentence order, each once it and every earlier sentence are synthesized: the TTS result
+        dict plus 'index' and 'text'. A synthesis that fails or is cancelled (e.g. through
+        cancel_token after the text finished) is delivered as a failed result. None is always
+        put last: after the last result, or as soon as the stream fails, the caller stops
+        consuming, or a bounded queue stays full for PLAYBACK_STALL_SECONDS (or until cancel_token
+        is set). Pending syntheses are then cancelled, and a full queue drops its oldest
+        results to make room for the None.
+
+        Args:
+            message: A streaming message, e.g. ChatModule's 'generate_response_stream'.
+            playback_queue: Queue the ordered audio results are delivered to.
+            tts_payload: Extra synthesize_speech payload (voice_name, language_code, ...).
+            tts_module: Registered name of the TTS module.
+            cancel_token: Optional CancellationToken, checked by the text stream and every synthesis.
+        """
+        sentences = SentenceAccumulator()
+        syntheses = asyncio.Queue() # (sentence, task) in sentence order, then None
+        tasks = []
+
+        def speak(sentence: str):
+            payload = {**(tts_payload or {}), "text": sentence}
+            task = asyncio.ensure_future(self.route_message_async(
+                {"target_module": tts_module, "action": "synthesize_speech", "payload": payload}, cancel_token))
+            tasks.append(task)
+            syntheses.put_nowait((sentence, task))
+
+        ended = False
+
+        def end():
+            nonlocal ended
+            if not ended:
+                ended = True
+                self._put_dropping_oldest(playback_queue, None)
+
+        async def deliver(item) -> bool:
+            """Puts one result, waiting for room; False once the consumer looks gone."""
+            deadline = loop.time() + PLAYBACK_STALL_SECONDS
+            while True:
+                try:
+                    await asyncio.wait_for(playback_queue.put(item), PLAYBACK_POLL_SECONDS)
+                    return True
+                except TimeoutError:
+                    if (cancel_token is not None and cancel_token.cancelled) or loop.time() >= deadline:
+                        self.logger.warning("Playback queue stopped draining; ending spoken stream.")
+                        return False
+
+        async def deliver_in_order():
+            index = 0
+            try:
+                while (item := await syntheses.get()) is not None:
+                    sentence, task = item
+                    try:
+                        result = await task
+                    except asyncio.CancelledError:
+                        if asyncio.current_task().cancelling():
+                            raise # This deliverer is being cancelled, not just the synthesis
+                        result = {"success": False, "output_path": None, "error": "Synthesis cancelled."}
+                    except Exception as e:
+                        result = {"success": False, "output_path": None, "error": f"Synthesis failed: {e}"}
+                    result = result or {"success": False, "output_path": None, "error": "Synthesis failed."}
+                    if not await deliver({**result, "index": index, "text": sentence}):
+                        break
+                    index += 1
+            finally:
+                for task in tasks:
+                    task.cancel() # No-op for finished ones
+                end()
+
+        loop = asyncio.get_running_loop()
+        deliverer = asyncio.create_task(deliver_in_order())
+        finished = False
+        try:
+            async for chunk in self.stream_message_async(message, cancel_token):
+                for sentence in sentences.feed(chunk):
+                    speak(sentence)
+                yield chunk
+            tail = sentences.flush()
+            if tail:
+                speak(tail)
+            finished = True
+        finally:
+            syntheses.put_nowait(None)
+            if not finished:
+                for task in tasks + [deliverer]:
+                    task.cancel()
+                end() # The deliverer may be cancelled before it ever runs
+            else:
+                # Keep a reference so the delivery task outlives this generator
+                self._background_tasks.add(deliverer)
+                deliverer.add_done_callback(self._background_tasks.discard)
+
+    @staticmethod
+    def _put_dropping_oldest(queue: asyncio.Queue, item):
+        """put_nowait that never raises QueueFull: a full bounded queue drops its oldest items first."""
+        while True:
+            try:
+                queue.put_nowait(item)
+                return
+            except asyncio.QueueFull:
+                try:
+                    queue.get_nowait()
+                    queue.task_done() # Keep join() balanced for the dropped item
+                except asyncio.QueueEmpty:
+                    pass
+
+    async def warm_up_async(self) -> dict:
+        """
+        Builds modules registered with a factory, then calls warm_up() on every module that has
+        one; all concurrently, each on its own executor. Returns {module_name: seconds};
+        failures are logged and reported as None.
+        """
+        loop = asyncio.get_running_loop()
+        pending = list(self.factories)
+        built = await asyncio.gather(
+            *(loop.run_in_executor(self.executors.get(name), self._build_module, name) for name in pending),
+            return_exceptions=True,
+        )
+        for name, result in zip(pending, built):
+            if isinstance(result, Exception):
+                self.logger.error(f"Failed to build module '{name}': {result}", exc_info=result)
+        names = [name for name, module in list(self.modules.items()) if hasattr(module, "warm_up")]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self.executors.get(name), self.modules[name].warm_up) for name in names),
+            return_exceptions=True,
+        )
+        timings = {}
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"Warm-up of module '{name}' failed: {result}")
+                timings[name] = None
+            else:
+                timings[name] = result
+        self.logger.info(f"Warm-up finished: {timings}")
+        return timings
+
+    def warm_up(self) -> dict:
+        """Blocking wrapper around warm_up_async, run on the background loop."""
+        return self.submit(self.warm_up_async()).result()
+
+    # --- Background Event Loop (for sync callers such as GUI callbacks) ---
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Starts the shared background event loop on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="acrea-coordinator-loop", daemon=True
+                )
+                self._loop_thread.start()
+                self.logger.info("Coordinator background event loop started.")
+            return self._loop
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on the coordinator's background event loop from any thread.
+
+        Returns:
+            A concurrent.futures.Future for the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def shutdown(self, wait: bool = True):
+        """Stops the background event loop and the per-module executors, then closes the modules."""
+        with self._loop_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                if wait and self._loop_thread:
+                    self._loop_thread.join(timeout=5)
+                self._loop = None
+                self._loop_thread = None
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+        self.executors.clear()
+        metrics_path = os.environ.get(METRICS_DUMP_ENV)
+        if metrics_path:
+            try:
+                self.metrics.write(metrics_path)
+            except OSError as e:
+                self.logger.error(f"Failed to write coordinator metrics to {metrics_path}: {e}")
+        # Modules holding files or state to persist expose close() (modules never built have nothing to close)
+        for name, module in self.modules.items():
+            if hasattr(module, "close"):
+                try:
+                    module.close()
+                except Exception as e:
+                    self.logger.error(f"Error closing module '{name}': {e}", exc_info=True)
+        self.logger.info("AcreaCoordinator shut down.")
+
+    # --- Optional Context Management ---
+    def set_context(self, key: str, value: any):
+        """Sets a value in the shared context."""
+        self.context[key] = value
+        self.logger.debug(f"Coordinator context updated: '{key}' set.")
+
+    def get_context(self, key: str, default: any = None):
+        """Gets a value from the shared context."""
         return self.context.get(key, default)
\ No newline at end of file
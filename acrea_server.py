@@ -0,0 +1,318 @@
+# acrea_server.py
+
+from startup_report import STARTUP, import_module # First import, so the startup report covers the rest
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+import uuid
+from aiohttp import web, WSMsgType
+from dotenv import load_dotenv
+
+# Import Acrea core components (modules and the Google SDKs are imported by their factories)
+from acrea_coordinator import AcreaCoordinator
+from chat_history import EPHEMERAL_SESSION_PREFIX
+from rag_pipeline import retrieve, chat_message
+from system_prompt_module import ACREA_SYSTEM_PROMPT
+
+# --- Basic Logging Setup ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("AcreaServer")
+
+# --- Configuration ---
+load_dotenv()
+GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
+VDB_API_ENDPOINT_ENV = "VDB_API_ENDPOINT"
+VDB_INDEX_ENDPOINT_ENV = "VDB_INDEX_ENDPOINT_RESOURCE_NAME"
+VDB_DEPLOYED_INDEX_ID_ENV = "VDB_DEPLOYED_INDEX_ID"
+VECTOR_BACKEND_ENV = "VECTOR_BACKEND" # "vertex" (default) or "local"
+LOCAL_INDEX_PATH_ENV = "LOCAL_INDEX_PATH"
+DEFAULT_LOCAL_INDEX_PATH = "local_vector_index.npz"
+CONTENT_STORE_DIR_ENV = "CONTENT_STORE_DIR"
+DEFAULT_CONTENT_STORE_DIR = "content_store"
+SERVER_HOST_ENV = "ACREA_HOST"
+SERVER_PORT_ENV = "ACREA_PORT"
+ACREA_MODEL_NAME = "gemini-2.5-pro-exp-03-25"
+DEFAULT_GENERATION_CONFIG = { "temperature": 0.8, "top_p": 0.95, "top_k": 64, "max_output_tokens": 8192 }
+DEFAULT_SAFETY_SETTINGS = { # Enum names, which the SDK accepts, so defining these does not import it
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_MEDIUM_AND_ABOVE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_MEDIUM_AND_ABOVE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_MEDIUM_AND_ABOVE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_MEDIUM_AND_ABOVE",
+}
+
+# --- Server Limits ---
+MAX_CONCURRENT_TURNS = 64 # RAG turns in flight; more are rejected with 503 for the load balancer to retry elsewhere
+MAX_WEBSOCKETS = 1000 # Open WebSocket connections
+TURN_TIMEOUT_SECONDS = 120.0 # Whole RAG turn, retrieval included
+CHUNK_TIMEOUT_SECONDS = 30.0 # Longest wait for the next streamed chunk
+WEBSOCKET_IDLE_SECONDS = 300.0 # Connections without a message for this long are closed
+DRAIN_TIMEOUT_SECONDS = 30.0 # Grace period for in-flight turns on shutdown
+MAX_REQUEST_BYTES = 64 * 1024
+MAX_PROMPT_CHARS = 16000
+
+
+def initialize_acrea_system() -> AcreaCoordinator:
+    """
+    Loads config, initializes the coordinator and registers the modules as factories; serve()
+    builds them in the background once the port is open.
+    """
+    logger.info("Initializing Acrea Coordinator and Modules for the server...")
+    use_local_index = os.environ.get(VECTOR_BACKEND_ENV, "vertex").lower() == "local"
+    required_keys = [GEMINI_API_KEY_ENV] if use_local_index else [GEMINI_API_KEY_ENV, VDB_API_ENDPOINT_ENV, VDB_INDEX_ENDPOINT_ENV, VDB_DEPLOYED_INDEX_ID_ENV]
+    config = {key: os.environ.get(key) for key in required_keys}
+    missing_keys = [key for key, val in config.items() if not val]
+    if missing_keys:
+        raise ValueError(f"Missing required configuration: {', '.join(missing_keys)}")
+
+    coordinator = AcreaCoordinator()
+
+    def build_chat_module():
+        return import_module("chat_module").ChatModule(
+            api_key=config[GEMINI_API_KEY_ENV], model_name=ACREA_MODEL_NAME,
+            system_instruction=ACREA_SYSTEM_PROMPT, generation_config=DEFAULT_GENERATION_CONFIG,
+            safety_settings=DEFAULT_SAFETY_SETTINGS, max_workers=MAX_CONCURRENT_TURNS,
+            embed_prompt=lambda text: coordinator.get_module("embedding").embed_query(text),
+        )
+
+    def build_vector_memory_module():
+        VectorMemoryModule = import_module("vector_memory_module").VectorMemoryModule
+        if use_local_index:
+            return VectorMemoryModule.with_local_index(os.environ.get(LOCAL_INDEX_PATH_ENV, DEFAULT_LOCAL_INDEX_PATH))
+        return VectorMemoryModule(
+            api_endpoint=config[VDB_API_ENDPOINT_ENV], index_endpoint_name=config[VDB_INDEX_ENDPOINT_ENV],
+            deployed_index_id=config[VDB_DEPLOYED_INDEX_ID_ENV]
+        )
+
+    coordinator.register_module("chat", factory=build_chat_module, max_workers=MAX_CONCURRENT_TURNS)
+    coordinator.register_module("vector_memory", factory=build_vector_memory_module, max_workers=16)
+    # The embedding module may be built before the chat module, so it configures the API key itself
+    coordinator.register_module("embedding", factory=lambda: import_module("embedding_module").EmbeddingModule(api_key=config[GEMINI_API_KEY_ENV]))
+    coordinator.register_module("content_store", factory=lambda: import_module("content_store").ContentStore(
+        os.environ.get(CONTENT_STORE_DIR_ENV, DEFAULT_CONTENT_STORE_DIR)))
+    logger.info("Coordinator and modules initialized and registered.")
+    return coordinator
+
+
+class AcreaServer:
+    """
+    Headless HTTP/WebSocket front end for the coordinator.
+
+    Endpoints:
+        POST /v1/chat      {"message": ..., "session_id"?: ...} -> {"response": ..., "session_id": ...}
+                           The X-Request-Id response header (or the caller's own) is the turn's trace id.
+        GET  /v1/chat/ws   WebSocket; each {"message", "session_id"?} frame gets
+                           {"type": "chunk", "text"} frames and a final {"type": "done", "trace_id"} (or "error").
+        GET  /healthz      200 while serving, 503 while draining (for load balancer health checks).
+        GET  /metrics      Coordinator latency/outcome metrics, Prometheus text (?format=json for a snapshot).
+
+    A turn without a session_id starts a new session whose id is returned; it is kept in memory
+    only, so it can be continued while it is active but is never written to disk.
+
+    Turns beyond MAX_CONCURRENT_TURNS and connections beyond MAX_WEBSOCKETS are rejected with
+    503 instead of queued, so a load balancer can send them to another instance. On SIGTERM
+    the server stops accepting work, waits up to DRAIN_TIMEOUT_SECONDS for in-flight turns,
+    then closes the remaining connections and shuts the coordinator down.
+    """
+    def __init__(self, coordinator: AcreaCoordinator, max_concurrent_turns: int = MAX_CONCURRENT_TURNS,
+                 max_websockets: int = MAX_WEBSOCKETS, turn_timeout: float = TURN_TIMEOUT_SECONDS):
+        self.coordinator = coordinator
+        self.max_concurrent_turns = max_concurrent_turns
+        self.max_websockets = max_websockets
+        self.turn_timeout = turn_timeout
+        self.active_turns = 0
+        self.websockets = set()
+        self.draining = False
+        self._idle = asyncio.Event() # Set whenever no turn is in flight
+        self._idle.set()
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=MAX_REQUEST_BYTES)
+        app.add_routes([
+            web.post("/v1/chat", self.handle_chat),
+            web.get("/v1/chat/ws", self.handle_chat_ws),
+            web.get("/healthz", self.handle_health),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        return app
+
+    # --- Admission ---
+    def _try_start_turn(self) -> bool:
+        if self.draining or self.active_turns >= self.max_concurrent_turns:
+            return False
+        self.active_turns += 1
+        self._idle.clear()
+        return True
+
+    def _end_turn(self):
+        self.active_turns -= 1
+        if self.active_turns == 0:
+            self._idle.set()
+
+    @staticmethod
+    def _overloaded(reason: str) -> web.Response:
+        return web.json_response({"error": reason}, status=503, headers={"Retry-After": "1"})
+
+    @staticmethod
+    def _parse_turn(data) -> tuple[str, str]:
+        """Validates a turn request; returns (message, session_id) or raises ValueError."""
+        if not isinstance(data, dict) or not isinstance(data.get("message"), str) or not data["message"].strip():
+            raise ValueError("Expected a JSON object with a non-empty 'message'.")
+        if len(data["message"]) > MAX_PROMPT_CHARS:
+            raise ValueError(f"'message' is longer than {MAX_PROMPT_CHARS} characters.")
+        # Without an id the turn gets a fresh session, kept in memory only (it expires when idle)
+        session_id = data.get("session_id") or EPHEMERAL_SESSION_PREFIX + uuid.uuid4().hex
+        if not isinstance(session_id, str):
+            raise ValueError("'session_id' must be a string.")
+        return data["message"].strip(), session_id
+
+    async def _stream_turn(self, message: str, session_id: str):
+        """
+        Yields response chunks; TimeoutError if a single chunk takes too long. The whole-turn
+        deadline belongs to the caller, around its consume loop (see _turn).
+        """
+        context, query_vector = await retrieve(self.coordinator, message)
+        turn = chat_message(message, context, session_id, prompt_embedding=query_vector)
+        async with contextlib.aclosing(self.coordinator.stream_message_async(turn)) as chunks:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), CHUNK_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+
+    @contextlib.asynccontextmanager
+    async def _turn(self, message: str, session_id: str):
+        """
+        Yields the turn's chunk stream under the turn deadline. The deadline covers the caller's
+        own awaits too (e.g. sending each chunk), so it surfaces as TimeoutError wherever it hits,
+        and the stream (with the model call behind it) is closed however the turn ends.
+        """
+        async with asyncio.timeout(self.turn_timeout):
+            async with contextlib.aclosing(self._stream_turn(message, session_id)) as chunks:
+                yield chunks
+
+    # --- Handlers ---
+    async def handle_health(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.json_response({"status": "draining"}, status=503)
+        return web.json_response({"status": "ok", "active_turns": self.active_turns, "websockets": len(self.websockets)})
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        if request.query.get("format") == "json":
+            return web.json_response(self.coordinator.metrics.snapshot())
+        return web.Response(text=self.coordinator.metrics.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        try:
+            message, session_id = self._parse_turn(await request.json())
+        except ValueError as e: # Includes malformed JSON
+            return web.json_response({"error": str(e)}, status=400)
+        if not self._try_start_turn():
+            return self._overloaded("draining" if self.draining else "too many concurrent requests")
+        trace_headers = None
+        try:
+            with self.coordinator.metrics.trace("http_turn", request.headers.get("X-Request-Id", "")[:64] or None) as trace_id:
+                trace_headers = {"X-Request-Id": trace_id}
+                async with self._turn(message, session_id) as chunks:
+                    parts = [chunk async for chunk in chunks]
+            if not parts:
+                return web.json_response({"error": "No response was generated.", "session_id": session_id}, status=502, headers=trace_headers)
+            return web.json_response({"response": "".join(parts), "session_id": session_id}, headers=trace_headers)
+        except TimeoutError:
+            logger.warning(f"Chat turn for session {session_id} timed out.")
+            return web.json_response({"error": "Timed out.", "session_id": session_id}, status=504, headers=trace_headers)
+        finally:
+            self._end_turn()
+
+    async def handle_chat_ws(self, request: web.Request) -> web.StreamResponse:
+        if self.draining or len(self.websockets) >= self.max_websockets:
+            return self._overloaded("draining" if self.draining else "too many connections")
+        ws = web.WebSocketResponse(heartbeat=30.0, receive_timeout=WEBSOCKET_IDLE_SECONDS, max_msg_size=MAX_REQUEST_BYTES)
+        await ws.prepare(request)
+        self.websockets.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    message, session_id = self._parse_turn(json.loads(msg.data))
+                except ValueError as e:
+                    await ws.send_json({"type": "error", "error": str(e)})
+                    continue
+                if not self._try_start_turn():
+                    await ws.send_json({"type": "error", "error": "overloaded", "session_id": session_id})
+                    if self.draining:
+                        break
+                    continue
+                try:
+                    with self.coordinator.metrics.trace("ws_turn") as trace_id:
+                        async with self._turn(message, session_id) as chunks:
+                            async for chunk in chunks:
+                                await ws.send_json({"type": "chunk", "text": chunk})
+                    await ws.send_json({"type": "done", "session_id": session_id, "trace_id": trace_id})
+                except TimeoutError:
+                    await ws.send_json({"type": "error", "error": "timed out", "session_id": session_id})
+                finally:
+                    self._end_turn()
+                if self.draining:
+                    break
+        except asyncio.TimeoutError:
+            logger.info("Closing idle WebSocket connection.")
+        except ConnectionResetError:
+            logger.info("WebSocket client went away mid-turn.")
+        finally:
+            self.websockets.discard(ws)
+            await ws.close()
+        return ws
+
+    # --- Lifecycle ---
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS):
+        """Stops admitting turns, waits for in-flight ones, then closes the remaining WebSockets."""
+        self.draining = True
+        logger.info(f"Draining: {self.active_turns} turn(s) in flight, {len(self.websockets)} WebSocket(s) open.")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except TimeoutError:
+            logger.warning(f"Drain timed out with {self.active_turns} turn(s) still in flight.")
+        for ws in list(self.websockets):
+            await ws.close(code=1001, message=b"Server shutting down")
+
+
+async def serve(coordinator: AcreaCoordinator, host: str, port: int):
+    """Runs the server until SIGINT/SIGTERM, then drains and shuts down."""
+    server = AcreaServer(coordinator)
+    runner = web.AppRunner(server.build_app(), handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, backlog=1024)
+    await site.start()
+    logger.info(f"Acrea server listening on http://{host}:{port}")
+    STARTUP.mark("listening")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await coordinator.warm_up_async() # Builds the modules; turns arriving meanwhile wait for theirs
+    STARTUP.log(logger)
+    await stop.wait()
+
+    await server.drain()
+    await runner.cleanup()
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    try:
+        acrea_coordinator = initialize_acrea_system()
+    except Exception as init_error:
+        logger.critical(f"Failed to initialize Acrea: {init_error}", exc_info=True)
+        print(f"FATAL: Acrea could not start: {init_error}. Check logs.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        asyncio.run(serve(acrea_coordinator, os.environ.get(SERVER_HOST_ENV, "0.0.0.0"), int(os.environ.get(SERVER_PORT_ENV, "8080"))))
+    finally:
+        acrea_coordinator.shutdown()
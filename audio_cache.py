@@ -0,0 +1,192 @@
+# audio_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class AudioCache:
+    """
+    Content-addressed, size-bounded store of synthesized audio files.
+
+    Each file is named by a SHA-256 of the input (text or SSML), voice, language and encoding,
+    so identical requests map to the same file and never reach the API twice. Files are
+    written to a temporary name and renamed into place, so readers never see partial audio.
+
+    An append-only index log records puts, hits and deletions; it is replayed into an LRU dict
+    at startup (no directory scan) and rewritten when it grows well past the live entries.
+    The least recently used files are deleted once `max_entries` or `max_bytes` is exceeded,
+    except files returned by get() or put() within the last `grace_seconds`, which callers may
+    still be about to play (the cache then stays over its limits until the grace period ends).
+    """
+    def __init__(self, directory: str = "audio_cache", max_entries: int = 10000, max_bytes: int = 512 * 1024 * 1024,
+                 grace_seconds: float = 120.0):
+        """
+        Args:
+            directory: Folder holding the audio files and index log (created if missing).
+            max_entries: Maximum cached files.
+            max_bytes: Maximum total size of the cached files.
+            grace_seconds: How long a returned file is protected from eviction.
+        """
+        self.logger = logging.getLogger("AudioCache")
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self._returned_at = {} # key -> monotonic time its path was last returned
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (filename, size), in LRU order
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._log_records = 0 # Records in the index log, to decide when to compact it
+        self._index_file = None
+        os.makedirs(directory, exist_ok=True)
+        torn_tail = self._load_index()
+        self._index_file = open(self._index_path(), "a", encoding="utf-8")
+        if torn_tail:
+            self._index_file.write("\n") # Start the next record on its own line
+        with self._lock:
+            self._evict() # Limits may have been lowered since the last run
+        self.logger.info(f"AudioCache opened at '{directory}' ({len(self._entries)} files, {self.total_bytes / 1e6:.1f} MB).")
+
+    # --- Keys and paths ---
+    @staticmethod
+    def make_key(text_or_ssml: str, language_code: str, voice_name: str, audio_encoding) -> str:
+        """Content hash of the synthesis input and every parameter that changes the audio."""
+        digest = hashlib.sha256()
+        digest.update(f"{language_code}\0{voice_name}\0{int(audio_encoding)}\0".encode("utf-8"))
+        digest.update(text_or_ssml.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.log")
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _load_index(self) -> bool:
+        """Replays the index log. Returns True if its last line is unterminated."""
+        if not os.path.exists(self._index_path()):
+            return False
+        line = "\n"
+        with open(self._index_path(), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn final line from an interrupted append; compaction rewrites the log cleanly
+                    self.logger.warning("Dropping malformed audio cache index record.")
+                    continue
+                self._log_records += 1
+                op, key = record[0], record[1]
+                if op == "put":
+                    self._forget(key)
+                    self._entries[key] = (record[2], record[3])
+                    self.total_bytes += record[3]
+                elif op == "hit" and key in self._entries:
+                    self._entries.move_to_end(key)
+                elif op == "del":
+                    self._forget(key)
+        return not line.endswith("\n")
+
+    # --- Public API ---
+    def get(self, key: str) -> str | None:
+        """Returns the path of the cached audio for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not os.path.exists(self._path(entry[0])):
+                # Deleted behind our back; treat as a miss
+                self._forget(key)
+                self._append(["del", key])
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._returned_at[key] = time.monotonic()
+            self._append(["hit", key])
+            self._maybe_compact()
+            self.hits += 1
+            return self._path(entry[0])
+
+    def put(self, key: str, audio: bytes, extension: str) -> str:
+        """Atomically writes audio under its content-addressed name and returns the path."""
+        filename = f"{key}{extension}"
+        path = self._path(filename)
+        temp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(temp_path, "wb") as out:
+            out.write(audio)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (filename, len(audio))
+            self.total_bytes += len(audio)
+            self._returned_at[key] = time.monotonic()
+            self._append(["put", key, filename, len(audio)])
+            self._evict(keep=key)
+            self._maybe_compact()
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._index_file.close()
+
+    # --- Internals (called with the lock held) ---
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        self._returned_at.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def _append(self, record: list):
+        if self._index_file is not None and not self._index_file.closed:
+            self._index_file.write(json.dumps(record) + "\n")
+            self._index_file.flush()
+            self._log_records += 1
+
+    def _evict(self, keep: str = None):
+        now = time.monotonic()
+        self._returned_at = {key: at for key, at in self._returned_at.items() if now - at < self.grace_seconds}
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            # Never evict the file just written (even if it alone exceeds max_bytes) or one still in its grace period
+            key = next((key for key in self._entries if key != keep and key not in self._returned_at), None)
+            if key is None:
+                break
+            filename, _ = self._entries[key]
+            self._forget(key)
+            try:
+                os.remove(self._path(filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.warning(f"Could not delete evicted audio file '{filename}': {e}")
+            self._append(["del", key])
+
+    def _maybe_compact(self):
+        """Rewrites the index log as one 'put' per live entry, in LRU order, once it is mostly history."""
+        if self._log_records <= 2 * len(self._entries) + 1000:
+            return
+        temp_path = f"{self._index_path()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for key, (filename, size) in self._entries.items():
+                f.write(json.dumps(["put", key, filename, size]) + "\n")
+        self._index_file.close()
+        os.replace(temp_path, self._index_path())
+        self._index_file = open(self._index_path(), "a", encoding="utf-8")
+        self._log_records = len(self._entries)
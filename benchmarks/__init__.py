@@ -0,0 +1,9 @@
+# benchmarks/__init__.py
+"""
+Offline benchmarks for the Acrea stack.
+
+Runs the real coordinator, RAG pipeline, VectorMemoryModule and ContentStore against in-process
+fakes of Gemini (chat and embeddings), Vertex AI Vector Search and Text-to-Speech, with
+configurable latency and failure distributions, so no credentials or network are needed.
+Run `python -m benchmarks --help` from the repository root.
+"""
@@ -0,0 +1,52 @@
+# benchmarks/__main__.py
+
+import argparse
+import json
+import logging
+import os
+import sys
+from benchmarks.scenarios import DEFAULT_CONFIG, QUICK_OVERRIDES, SCENARIOS, compare, run_benchmarks
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline Acrea benchmarks with fake backends.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable). Default: all.")
+    parser.add_argument("--quick", action="store_true", help="Scaled-down latencies and turn counts, for a smoke run.")
+    parser.add_argument("--config", help="JSON file of DEFAULT_CONFIG overrides (latency distributions, turn counts...).")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results JSON.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative change beyond which a metric counts as a regression (default 0.10).")
+    args = parser.parse_args()
+
+    # The modules log every call at INFO; keep the output to progress and problems
+    logging.getLogger().setLevel(logging.WARNING)
+
+    config = dict(QUICK_OVERRIDES) if args.quick else {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        parser.error(f"Unknown config keys: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(config, args.scenario)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["comparison"] = {"baseline": os.path.abspath(args.baseline),
+                                     "changes": compare(results, json.load(f), args.tolerance)}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    for name, scenario in results["scenarios"].items():
+        print(f"\n{name}:")
+        print(json.dumps({key: value for key, value in scenario.items() if key != "stages"}, indent=2))
+    regressions = [change for change in results.get("comparison", {}).get("changes", []) if change["regression"]]
+    for change in regressions:
+        print(f"REGRESSION {change['metric']}: {change['baseline']:.4g} -> {change['current']:.4g} ({change['change']:+.1%})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
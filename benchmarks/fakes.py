@@ -0,0 +1,229 @@
+# benchmarks/fakes.py
+
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+import numpy as np
+from chat_history import ChatHistory, ChatSessionPool, DEFAULT_HISTORY_TOKEN_BUDGET, DEFAULT_SESSION_ID
+from vector_memory_module import as_neighbor_counts
+
+Z_99 = 2.3263 # Standard normal 99th percentile, for deriving a lognormal's sigma from its p99
+SENTENCE_CHUNKS = 8 # Fake replies end a sentence every this many chunks (sentence-wise TTS splits there)
+
+class FakeBackendError(RuntimeError):
+    """Injected backend failure (stands in for google_exceptions.GoogleAPICallError)."""
+
+class LatencyModel:
+    """
+    Latency and failure distribution of one fake backend call.
+
+    Latencies are lognormal with the given median and 99th percentile, which matches the long
+    right tail of real API calls. A call fails with FakeBackendError at `failure_rate`, or
+    times out at `timeout_rate` (it waits `timeout_seconds`, then raises TimeoutError).
+    """
+    def __init__(self, median: float = 0.05, p99: float = None, failure_rate: float = 0.0,
+                 timeout_rate: float = 0.0, timeout_seconds: float = 1.0, seed: int = None):
+        """
+        Args:
+            median: Median latency in seconds (0 makes calls instantaneous).
+            p99: 99th percentile latency in seconds. Defaults to 3x the median.
+            failure_rate: Probability that a call fails immediately.
+            timeout_rate: Probability that a call hangs for timeout_seconds, then times out.
+            timeout_seconds: How long a timed-out call waits.
+            seed: Seed for reproducible samples.
+        """
+        self.median = median
+        self.p99 = p99 if p99 is not None else median * 3
+        self.sigma = math.log(self.p99 / median) / Z_99 if median > 0 and self.p99 > median else 0.0
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock() # random.Random is not safe to share between threads
+
+    @classmethod
+    def from_dict(cls, config: dict | None, **defaults) -> "LatencyModel":
+        """Builds a model from a scenario config entry, e.g. {"median": 0.2, "p99": 1.5}."""
+        return cls(**{**defaults, **(config or {})})
+
+    def to_dict(self) -> dict:
+        return {"median": self.median, "p99": self.p99, "failure_rate": self.failure_rate,
+                "timeout_rate": self.timeout_rate, "timeout_seconds": self.timeout_seconds}
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self.median * math.exp(self._random.gauss(0.0, self.sigma)) if self.sigma else self.median
+
+    def wait(self, what: str = "call"):
+        """Blocks for one sampled latency, raising an injected failure or timeout at the configured rates."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.failure_rate:
+            raise FakeBackendError(f"Injected failure in fake {what}.")
+        if roll < self.failure_rate + self.timeout_rate:
+            time.sleep(self.timeout_seconds)
+            raise TimeoutError(f"Injected timeout in fake {what}.")
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+def fake_vector(text: str, dimensions: int) -> np.ndarray:
+    """Deterministic unit vector for text, so repeated texts embed (and retrieve) identically."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class FakeEmbeddingModule:
+    """Stands in for EmbeddingModule: deterministic vectors, one sampled latency per request."""
+    def __init__(self, dimensions: int = 768, latency: LatencyModel = None, max_workers: int = 8):
+        self.logger = logging.getLogger("FakeEmbeddingModule")
+        self.dimensions = dimensions
+        self.latency = latency or LatencyModel(median=0.08, p99=0.3)
+        self.max_workers = max_workers
+
+    def embed_query(self, text: str) -> list[float]:
+        self.latency.wait("embedding")
+        return fake_vector(text, self.dimensions).tolist()
+
+    def handle_message(self, action: str, payload: dict):
+        if action == "generate_embedding":
+            return self.embed_query(payload.get("text", ""))
+        elif action == "generate_embeddings":
+            self.latency.wait("embedding")
+            return [fake_vector(text, self.dimensions).tolist() for text in payload.get("texts", [])]
+        self.logger.warning(f"FakeEmbeddingModule received unknown action: {action}")
+        return None
+
+class FakeVectorSearchBackend:
+    """
+    Stands in for VertexVectorSearchClient behind a real VectorMemoryModule: same find_neighbors /
+    find_neighbors_batch interface, with one sampled round-trip per request (a batch is one RPC,
+    as with MatchServiceClient). Neighbors are drawn from `corpus_ids`, deterministically per query.
+    """
+    def __init__(self, corpus_ids: list[str], latency: LatencyModel = None):
+        if not corpus_ids:
+            raise ValueError("corpus_ids must not be empty.")
+        self.corpus_ids = list(corpus_ids)
+        self.latency = latency or LatencyModel(median=0.04, p99=0.15)
+        self.calls = 0
+
+    def _neighbors(self, query_vector, neighbor_count: int) -> list[dict]:
+        seed = int.from_bytes(hashlib.sha256(np.asarray(query_vector, dtype=np.float32).tobytes()).digest()[:8], "little")
+        picks = random.Random(seed).sample(self.corpus_ids, min(neighbor_count, len(self.corpus_ids)))
+        return [{"id": datapoint_id, "distance": 1.0 - rank * 0.01} for rank, datapoint_id in enumerate(picks)]
+
+    def find_neighbors(self, query_vector, neighbor_count: int = 10, return_full_datapoint: bool = False) -> list[dict]:
+        self.calls += 1
+        self.latency.wait("vector search")
+        return self._neighbors(query_vector, neighbor_count)
+
+    def find_neighbors_batch(self, query_vectors, neighbor_counts=10, return_full_datapoint: bool = False) -> list[list[dict]]:
+        self.calls += 1
+        self.latency.wait("vector search")
+        neighbor_counts = as_neighbor_counts(neighbor_counts, len(query_vectors))
+        return [self._neighbors(query, count) for query, count in zip(query_vectors, neighbor_counts)]
+
+    def warm_up(self) -> float:
+        return 0.0
+
+class FakeChatModule:
+    """
+    Stands in for ChatModule: same generate_response / generate_response_stream actions and
+    per-session history (a real ChatSessionPool of ChatHistory, so memory per session is
+    representative). A reply arrives after `first_chunk` latency and then streams
+    `chunks_per_response` chunks `inter_chunk` apart. Injected failures raise out of the call
+    or the stream, which the coordinator logs and reports as an empty response.
+    """
+    def __init__(self, first_chunk: LatencyModel = None, inter_chunk: LatencyModel = None,
+                 chunks_per_response: int = 40, chunk_chars: int = 24, sessions_dir: str = None,
+                 history_token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET, max_sessions: int = 256,
+                 max_workers: int = 8):
+        """
+        Args:
+            first_chunk: Latency until the first chunk (model queueing plus prompt processing).
+            inter_chunk: Latency between later chunks (token generation).
+            chunks_per_response: Chunks per reply.
+            chunk_chars: Characters per chunk.
+            sessions_dir: Where idle sessions are written (a ChatSessionPool directory). None drops them.
+            history_token_budget: Token budget of each session's ChatHistory.
+            max_sessions: Sessions kept in memory before idle ones are written out.
+            max_workers: Concurrent turns (the coordinator sizes this module's executor from it).
+        """
+        self.logger = logging.getLogger("FakeChatModule")
+        self.first_chunk = first_chunk or LatencyModel(median=0.6, p99=2.0)
+        self.inter_chunk = inter_chunk or LatencyModel(median=0.02, p99=0.06)
+        self.chunks_per_response = chunks_per_response
+        self.chunk_chars = chunk_chars
+        self.max_workers = max_workers
+        # Summaries would be a second model call; the fake folds old turns into a fixed-size stub
+        self.sessions = ChatSessionPool(
+            lambda: ChatHistory(token_budget=history_token_budget, summarize=lambda summary, turns: f"Summary of {len(turns)} turns."),
+            directory=sessions_dir, max_sessions=max_sessions,
+        )
+
+    def _chunks(self, prompt: str):
+        word = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:self.chunk_chars - 1]
+        self.first_chunk.wait("chat model")
+        for index in range(self.chunks_per_response):
+            if index:
+                self.inter_chunk.wait("chat model")
+            yield word + (". " if index % SENTENCE_CHUNKS == SENTENCE_CHUNKS - 1 else " ")
+
+    def _stream(self, history: ChatHistory, prompt: str):
+        parts = []
+        for chunk in self._chunks(prompt):
+            parts.append(chunk)
+            yield chunk
+        history.add_turn(prompt, "".join(parts))
+
+    def close(self):
+        self.sessions.save_all()
+
+    def handle_message(self, action: str, payload: dict):
+        session_id = payload.get("session_id") or DEFAULT_SESSION_ID
+        prompt = payload.get("prompt")
+        if action == "generate_response":
+            if not prompt:
+                return "I received an empty request."
+            history = self.sessions.get(session_id)
+            text = "".join(self._chunks(prompt))
+            history.add_turn(prompt, text)
+            return text
+        elif action == "generate_response_stream":
+            if not prompt:
+                return iter(["I received an empty request."])
+            return self._stream(self.sessions.get(session_id), prompt)
+        elif action == "get_session_stats":
+            return self.sessions.stats()
+        self.logger.warning(f"FakeChatModule received unknown action: {action}")
+        return None
+
+class FakeTTSModule:
+    """
+    Stands in for TTSModule's synthesize_speech: one sampled latency per request plus
+    `seconds_per_kilobyte` of input, and the same result dict. Nothing is written to disk.
+    """
+    def __init__(self, latency: LatencyModel = None, seconds_per_kilobyte: float = 0.05, max_workers: int = 4):
+        self.logger = logging.getLogger("FakeTTSModule")
+        self.latency = latency or LatencyModel(median=0.25, p99=0.8)
+        self.seconds_per_kilobyte = seconds_per_kilobyte
+        self.max_workers = max_workers
+
+    def handle_message(self, action: str, payload: dict):
+        if action == "synthesize_speech":
+            content = payload.get("ssml") or payload.get("text")
+            if not content:
+                return {"success": False, "error": "Missing input text/ssml", "output_path": None}
+            try:
+                self.latency.wait("speech synthesis")
+            except (FakeBackendError, TimeoutError) as e:
+                return {"success": False, "output_path": None, "error": str(e)}
+            time.sleep(len(content.encode("utf-8")) / 1024 * self.seconds_per_kilobyte)
+            return {"success": True, "output_path": f"fake://{hashlib.sha1(content.encode('utf-8')).hexdigest()}.mp3", "error": None}
+        self.logger.warning(f"FakeTTSModule received unknown action: {action}")
+        return {"success": False, "error": f"Unknown action: {action}", "output_path": None}
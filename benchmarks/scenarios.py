@@ -0,0 +1,317 @@
+# benchmarks/scenarios.py
+
+import asyncio
+import gc
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from acrea_coordinator import AcreaCoordinator
+from content_store import ContentStore
+from coordinator_metrics import CoordinatorMetrics
+from rag_pipeline import stream_rag_turn, retrieve, chat_message
+from vector_memory_module import VectorMemoryModule
+from benchmarks.fakes import (LatencyModel, FakeEmbeddingModule, FakeVectorSearchBackend, FakeChatModule,
+                              FakeTTSModule)
+
+logger = logging.getLogger("Benchmarks")
+
+# Backend latencies in seconds, roughly those observed against the live services
+DEFAULT_CONFIG = {
+    "seed": 1234,
+    "latency_scale": 1.0, # Multiplies every backend latency (0 measures orchestration overhead only)
+    "embedding": {"median": 0.08, "p99": 0.3},
+    "vector_search": {"median": 0.04, "p99": 0.15},
+    "chat_first_chunk": {"median": 0.6, "p99": 2.0},
+    "chat_inter_chunk": {"median": 0.02, "p99": 0.06},
+    "chat_chunks_per_response": 40,
+    "tts": {"median": 0.25, "p99": 0.8},
+    "corpus_size": 1000, # Documents in the content store
+    "document_chars": 1500,
+    "num_neighbors": 3,
+    "latency_turns": 50, # Sequential turns in rag_turn_latency and spoken_turn_latency
+    "concurrency_levels": [1, 4, 16, 64],
+    "throughput_turns_per_worker": 8,
+    "memory_sessions": 200,
+    "memory_turns_per_session": 4,
+}
+
+# Faster settings for a smoke run (e.g. in CI): a tenth of the latencies, fewer turns
+QUICK_OVERRIDES = {
+    "latency_scale": 0.1,
+    "latency_turns": 20,
+    "concurrency_levels": [1, 8, 32],
+    "throughput_turns_per_worker": 4,
+    "memory_sessions": 50,
+}
+
+def summarize_latencies(samples: list[float]) -> dict:
+    """p50/p95/p99/mean/max in seconds (None when there are no samples)."""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(samples)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(samples), "p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "mean": float(values.mean()), "max": float(values.max())}
+
+class BenchmarkStack:
+    """
+    A coordinator wired like the runners' (same module names, executor sizes and RAG pipeline),
+    with fake embedding, chat and TTS modules and a real VectorMemoryModule and ContentStore on
+    a fake Vector Search backend. All state lives under `work_dir`.
+    """
+    def __init__(self, config: dict, work_dir: str, retrieval_cache_entries: int = 1024, max_sessions: int = 256,
+                 max_spans: int = None):
+        self.config = config
+        scale = config["latency_scale"]
+        seed = config["seed"]
+
+        def latency(name: str, offset: int) -> LatencyModel:
+            settings = dict(config[name])
+            for key in ("median", "p99", "timeout_seconds"):
+                if key in settings:
+                    settings[key] *= scale
+            return LatencyModel.from_dict(settings, seed=seed + offset)
+
+        corpus_ids = [f"doc-{i}" for i in range(config["corpus_size"])]
+        self.content_store = ContentStore(os.path.join(work_dir, "content_store"))
+        self.content_store.put_many((doc_id, (doc_id + " ") * (config["document_chars"] // (len(doc_id) + 1)))
+                                    for doc_id in corpus_ids)
+        self.vector_backend = FakeVectorSearchBackend(corpus_ids, latency("vector_search", 1))
+
+        self.coordinator = AcreaCoordinator()
+        if max_spans is not None:
+            self.coordinator.metrics = CoordinatorMetrics(max_spans=max_spans)
+        self.coordinator.register_module("embedding", FakeEmbeddingModule(latency=latency("embedding", 2)))
+        self.coordinator.register_module("vector_memory", VectorMemoryModule(backend=self.vector_backend,
+                                                                             cache_max_entries=retrieval_cache_entries),
+                                         max_workers=16)
+        self.coordinator.register_module("content_store", self.content_store)
+        self.coordinator.register_module("chat", FakeChatModule(
+            first_chunk=latency("chat_first_chunk", 3), inter_chunk=latency("chat_inter_chunk", 4),
+            chunks_per_response=config["chat_chunks_per_response"],
+            sessions_dir=os.path.join(work_dir, "chat_sessions"), max_sessions=max_sessions,
+        ))
+        self.coordinator.register_module("tts", FakeTTSModule(latency=latency("tts", 5)))
+
+    def run(self, coro):
+        """Runs a coroutine on the coordinator's loop and waits for it."""
+        return self.coordinator.submit(coro).result()
+
+    def close(self):
+        self.coordinator.shutdown()
+
+async def _timed_turn(stack: BenchmarkStack, prompt: str, session_id: str) -> tuple[float | None, float, bool]:
+    """Runs one streamed RAG turn. Returns (seconds to first chunk, total seconds, succeeded)."""
+    start = time.perf_counter()
+    first_chunk = None
+    async for _ in stream_rag_turn(stack.coordinator, prompt, session_id, stack.config["num_neighbors"]):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+    return first_chunk, time.perf_counter() - start, first_chunk is not None
+
+def _stage_latencies(stack: BenchmarkStack) -> dict:
+    """p50/p95/p99 per 'module.action' from the coordinator's own metrics."""
+    calls = stack.coordinator.metrics.snapshot()["latency_seconds"].get("call", {})
+    return {f"{module}.{action}": {key: summary[key] for key in ("count", "p50", "p95", "p99")}
+            for module, actions in calls.items() for action, summary in actions.items()}
+
+# --- Scenarios ---
+def rag_turn_latency(config: dict, work_dir: str) -> dict:
+    """End-to-end latency of sequential streamed RAG turns (first chunk and full reply)."""
+    stack = BenchmarkStack(config, work_dir)
+    try:
+        async def run():
+            results = [await _timed_turn(stack, f"Question {i}: how should the atrium be lit?", "latency")
+                       for i in range(config["latency_turns"])]
+            return results
+        results = stack.run(run())
+        return {
+            "turns": len(results),
+            "failures": sum(not ok for _, _, ok in results),
+            "first_chunk_seconds": summarize_latencies([first for first, _, ok in results if ok]),
+            "total_seconds": summarize_latencies([total for _, total, ok in results if ok]),
+            "stages": _stage_latencies(stack),
+        }
+    finally:
+        stack.close()
+
+def throughput(config: dict, work_dir: str) -> dict:
+    """Completed turns per second and turn latency with N concurrent users, for each level."""
+    levels = {}
+    for concurrency in config["concurrency_levels"]:
+        stack = BenchmarkStack(config, os.path.join(work_dir, f"c{concurrency}"))
+        try:
+            async def user(worker: int) -> list:
+                return [await _timed_turn(stack, f"User {worker} question {i} about facades", f"user-{worker}")
+                        for i in range(config["throughput_turns_per_worker"])]
+
+            async def run():
+                start = time.perf_counter()
+                per_user = await asyncio.gather(*(user(worker) for worker in range(concurrency)))
+                return time.perf_counter() - start, [result for results in per_user for result in results]
+
+            elapsed, results = stack.run(run())
+            completed = sum(ok for _, _, ok in results)
+            levels[str(concurrency)] = {
+                "turns": len(results),
+                "failures": len(results) - completed,
+                "elapsed_seconds": elapsed,
+                "turns_per_second": completed / elapsed if elapsed else None,
+                "total_seconds": summarize_latencies([total for _, total, ok in results if ok]),
+            }
+        finally:
+            stack.close()
+    return {"concurrency": levels}
+
+def spoken_turn_latency(config: dict, work_dir: str) -> dict:
+    """Time to first audio and to last audio when a streamed reply is spoken sentence by sentence."""
+    stack = BenchmarkStack(config, work_dir)
+    try:
+        async def turn(i: int) -> tuple[float | None, float | None, int]:
+            start = time.perf_counter()
+            prompt = f"Spoken question {i}: describe the entrance."
+            context, query_vector = await retrieve(stack.coordinator, prompt, config["num_neighbors"])
+            playback = asyncio.Queue()
+
+            async def listen() -> tuple[float | None, float | None, int]:
+                first_audio = last_audio = None
+                clips = 0
+                while await playback.get() is not None:
+                    last_audio = time.perf_counter() - start
+                    first_audio = first_audio or last_audio
+                    clips += 1
+                return first_audio, last_audio, clips
+
+            listener = asyncio.create_task(listen()) # Audio is timed as it arrives, while text still streams
+            async for _ in stack.coordinator.stream_with_speech_async(chat_message(prompt, context, "spoken", prompt_embedding=query_vector), playback):
+                pass
+            return await listener
+
+        async def run():
+            return [await turn(i) for i in range(config["latency_turns"])]
+
+        results = stack.run(run())
+        return {
+            "turns": len(results),
+            "failures": sum(first is None for first, _, _ in results),
+            "first_audio_seconds": summarize_latencies([first for first, _, _ in results if first is not None]),
+            "last_audio_seconds": summarize_latencies([last for _, last, _ in results if last is not None]),
+            "clips_per_turn": float(np.mean([clips for _, _, clips in results])) if results else None,
+        }
+    finally:
+        stack.close()
+
+def memory_per_session(config: dict, work_dir: str) -> dict:
+    """
+    Python heap growth per chat session held in memory (history plus pool bookkeeping), measured
+    with tracemalloc at zero backend latency. Retrieval caching and span retention are disabled
+    so only per-session state grows.
+    """
+    sessions = config["memory_sessions"]
+    stack = BenchmarkStack({**config, "latency_scale": 0.0}, work_dir, retrieval_cache_entries=0,
+                           max_sessions=sessions + 1, max_spans=0)
+    try:
+        async def run():
+            for turn in range(config["memory_turns_per_session"]):
+                await asyncio.gather(*(_timed_turn(stack, f"Session {s} turn {turn}: which materials?", f"session-{s}")
+                                       for s in range(sessions)))
+
+        stack.run(_timed_turn(stack, "Warm-up question", "warm-up")) # Import-time and first-use allocations
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            stack.run(run())
+            gc.collect()
+            after, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        chat_stats = stack.coordinator.route_message({"target_module": "chat", "action": "get_session_stats", "payload": {}})
+        return {
+            "sessions": sessions,
+            "turns_per_session": config["memory_turns_per_session"],
+            "sessions_in_memory": chat_stats["in_memory"] if chat_stats else None,
+            "bytes_per_session": (after - before) / sessions,
+            "peak_bytes": peak - before,
+        }
+    finally:
+        stack.close()
+
+SCENARIOS = {
+    "rag_turn_latency": rag_turn_latency,
+    "throughput": throughput,
+    "spoken_turn_latency": spoken_turn_latency,
+    "memory_per_session": memory_per_session,
+}
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmarks(config: dict = None, scenarios: list[str] = None) -> dict:
+    """
+    Runs the named scenarios (all by default) and returns the JSON-able results.
+
+    Args:
+        config: Overrides of DEFAULT_CONFIG.
+        scenarios: Names from SCENARIOS.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="acrea-bench-") as work_dir:
+        for name in scenarios or list(SCENARIOS):
+            logger.warning(f"Running scenario '{name}'...")
+            start = time.perf_counter()
+            results["scenarios"][name] = SCENARIOS[name](config, os.path.join(work_dir, name))
+            results["scenarios"][name]["wall_seconds"] = time.perf_counter() - start
+    return results
+
+# --- Regression tracking ---
+_LOWER_IS_BETTER = ("p50", "p95", "p99", "bytes_per_session")
+_HIGHER_IS_BETTER = ("turns_per_second",)
+
+def _flatten(tree: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.10) -> list[dict]:
+    """
+    Compares tracked metrics (latency percentiles, throughput, memory per session) with a
+    baseline run. Returns one entry per metric present in both, flagged as a regression when it
+    is worse by more than `tolerance` (a fraction).
+    """
+    current, previous = _flatten(results["scenarios"]), _flatten(baseline.get("scenarios", {}))
+    changes = []
+    for path, value in current.items():
+        metric = path.rsplit(".", 1)[-1]
+        if metric not in _LOWER_IS_BETTER + _HIGHER_IS_BETTER or ".stages." in path or not previous.get(path):
+            continue
+        change = (value - previous[path]) / previous[path]
+        worse = change > tolerance if metric in _LOWER_IS_BETTER else change < -tolerance
+        changes.append({"metric": path, "baseline": previous[path], "current": value, "change": change, "regression": worse})
+    return changes
@@ -0,0 +1,307 @@
+# chat_history.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_HISTORY_TOKEN_BUDGET = 16000
+DEFAULT_SESSION_ID = "default"
+EPHEMERAL_SESSION_PREFIX = "ephemeral-" # Sessions with ids starting with this are never written to disk
+CHARS_PER_TOKEN = 4 # Rough average for English text with Gemini's tokenizer
+
+class SessionBusyError(TimeoutError):
+    """Raised by ChatSessionPool.checkout when the session's previous turn does not finish in time."""
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting (no API call)."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class ChatHistory:
+    """
+    Sliding window of recent chat turns kept within a token budget.
+
+    When the window grows past `token_budget`, the oldest turns are handed to `summarize`
+    on a background thread and folded into a running summary, so the next request carries
+    the summary plus the recent turns instead of the whole conversation. Until the summary
+    is ready the turns being compacted are still sent, so no context is lost in between.
+
+    Token counts are estimates (see estimate_tokens); the actual prompt size reported by
+    the API for the last request is kept in `last_prompt_tokens`.
+    """
+    def __init__(self, token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET, keep_recent_turns: int = 2,
+                 summarize: callable = None):
+        """
+        Args:
+            token_budget: Target size of the history sent with each request.
+            keep_recent_turns: Turns never compacted, however long they are.
+            summarize: Callable (previous_summary: str | None, turns: list[tuple[str, str]]) -> str.
+                       If None, old turns are simply dropped.
+        """
+        self.logger = logging.getLogger("ChatHistory")
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summarize = summarize
+        self._lock = threading.Lock()
+        self.turns = [] # (user_text, model_text, tokens), oldest first
+        self.summary = None
+        self.summary_tokens = 0
+        self._compacting = [] # Turns handed to the summarizer, still sent until it finishes
+        self._compaction_thread = None
+        self.compactions = 0
+        self.last_prompt_tokens = None
+
+    def add_turn(self, user_text: str, model_text: str):
+        """Records a completed turn and starts a compaction if the budget is exceeded."""
+        with self._lock:
+            self.turns.append((user_text, model_text, estimate_tokens(user_text) + estimate_tokens(model_text)))
+            self._maybe_compact()
+
+    def render(self) -> list[dict]:
+        """Returns the history to send with the next request, as Gemini content dicts."""
+        with self._lock:
+            contents = []
+            if self.summary:
+                contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+                contents.append({"role": "model", "parts": ["Understood, I'll keep that in mind."]})
+            for user_text, model_text, _ in self._compacting + self.turns:
+                contents.append({"role": "user", "parts": [user_text]})
+                contents.append({"role": "model", "parts": [model_text]})
+            return contents
+
+    def token_count(self) -> int:
+        """Estimated tokens of the rendered history."""
+        with self._lock:
+            return self._token_count()
+
+    def _token_count(self) -> int:
+        return self.summary_tokens + sum(tokens for *_, tokens in self._compacting + self.turns)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "turns": len(self._compacting) + len(self.turns),
+                "summary_tokens": self.summary_tokens,
+                "estimated_tokens": self._token_count(),
+                "token_budget": self.token_budget,
+                "compacting": bool(self._compacting),
+                "compactions": self.compactions,
+                "last_prompt_tokens": self.last_prompt_tokens,
+            }
+
+    def clear(self):
+        with self._lock:
+            self.turns = []
+            self.summary = None
+            self.summary_tokens = 0
+            self._compacting = []
+
+    def _maybe_compact(self):
+        # Caller holds the lock
+        if self._compacting or self._token_count() <= self.token_budget:
+            return
+        # Compact down to half the budget so a summary is not requested on every turn
+        target = self.token_budget // 2
+        window_tokens = self._token_count()
+        count = 0
+        while count < len(self.turns) - self.keep_recent_turns and window_tokens > target:
+            window_tokens -= self.turns[count][2]
+            count += 1
+        if not count:
+            return
+        self._compacting, self.turns = self.turns[:count], self.turns[count:]
+        if self.summarize is None:
+            self.logger.info(f"Dropped {count} old turns to stay within the token budget.")
+            self._compacting = []
+            return
+        self._compaction_thread = threading.Thread(
+            target=self._compact, args=(self.summary, self._compacting),
+            name="acrea-history-compaction", daemon=True,
+        )
+        self._compaction_thread.start()
+
+    def _compact(self, previous_summary: str | None, compacting: list):
+        turns = [(user_text, model_text) for user_text, model_text, _ in compacting]
+        try:
+            summary = self.summarize(previous_summary, turns)
+        except Exception as e:
+            self.logger.error(f"History compaction failed; dropping {len(turns)} old turns: {e}", exc_info=True)
+            summary = previous_summary
+        with self._lock:
+            if self._compacting is not compacting:
+                return # History was cleared meanwhile
+            self.summary = summary or None
+            self.summary_tokens = estimate_tokens(summary) if summary else 0
+            self._compacting = []
+            self.compactions += 1
+            self.logger.info(f"Compacted {len(turns)} turns; history now ~{self._token_count()} tokens.")
+            self._maybe_compact()
+
+    def to_dict(self) -> dict:
+        """Serializable state. Turns still being compacted are saved as ordinary turns."""
+        with self._lock:
+            return {
+                "summary": self.summary,
+                "turns": [[user_text, model_text] for user_text, model_text, _ in self._compacting + self.turns],
+                "compactions": self.compactions,
+            }
+
+    def load_dict(self, state: dict):
+        """Restores state produced by to_dict (compacting again if it is over budget)."""
+        with self._lock:
+            self.summary = state.get("summary")
+            self.summary_tokens = estimate_tokens(self.summary) if self.summary else 0
+            self.turns = [(u, m, estimate_tokens(u) + estimate_tokens(m)) for u, m in state.get("turns", [])]
+            self._compacting = []
+            self.compactions = state.get("compactions", 0)
+            self._maybe_compact()
+
+    def wait_for_compaction(self, timeout: float = None):
+        """Blocks until a running compaction finishes (used before persisting the history)."""
+        thread = self._compaction_thread
+        if thread:
+            thread.join(timeout)
+
+
+class ChatSessionPool:
+    """
+    ChatHistory objects keyed by session id, with a bounded set kept in memory.
+
+    Sessions live in an LRU pool of at most `max_sessions`. The least recently used session,
+    and any session idle for longer than `idle_seconds`, is written to `directory` as JSON
+    and dropped from memory; it is reloaded the next time its id is used. Since each history
+    is itself token-budgeted, memory use is bounded by the pool size whatever the number of users.
+
+    Turns use checkout(), which pins the session (it is not evicted until released, so a slow
+    turn cannot finish into a history that was already written out) and runs the turns of one
+    session one at a time. The pool can exceed `max_sessions` by the number of pinned sessions.
+
+    Sessions whose id starts with EPHEMERAL_SESSION_PREFIX (e.g. ones a server creates for
+    requests without a session id) live in memory only: once evicted they are gone.
+    """
+    def __init__(self, history_factory: callable, directory: str = "chat_sessions",
+                 max_sessions: int = 256, idle_seconds: float = 900.0):
+        """
+        Args:
+            history_factory: Zero-argument callable returning a new, empty ChatHistory.
+            directory: Folder for evicted sessions (created if missing). None discards evicted sessions.
+            max_sessions: Sessions kept in memory.
+            idle_seconds: Sessions unused for this long are evicted on the next pool access.
+        """
+        self.logger = logging.getLogger("ChatSessionPool")
+        self.history_factory = history_factory
+        self.directory = directory
+        self.max_sessions = max(1, max_sessions)
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict() # session_id -> (history, last_used), least recently used first
+        self._in_use = {} # session_id -> [pins, turn lock], while any turn holds or waits for the session
+        self.loads = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, session_id: str = DEFAULT_SESSION_ID) -> ChatHistory:
+        """Returns the session's history, loading it from disk or creating it as needed."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            history = entry[0] if entry else self._load(session_id)
+            self._sessions[session_id] = (history, now)
+            # Saved under the lock so a concurrent get() cannot load an older file for an evicted id
+            for evicted_id, evicted_history in self._collect_evictions(now):
+                self._save(evicted_id, evicted_history)
+        return history
+
+    @contextmanager
+    def checkout(self, session_id: str = DEFAULT_SESSION_ID, timeout: float = None):
+        """
+        Context manager for one turn: waits for the session's previous turn, then yields its
+        history pinned in memory until the block exits.
+
+        Args:
+            session_id: Session to use.
+            timeout: Longest wait for the previous turn, in seconds (None waits indefinitely).
+
+        Raises:
+            SessionBusyError: If the previous turn did not finish within `timeout`.
+        """
+        with self._lock:
+            entry = self._in_use.setdefault(session_id, [0, threading.Lock()])
+            entry[0] += 1
+        try:
+            if not entry[1].acquire(timeout=-1 if timeout is None else timeout):
+                raise SessionBusyError(f"Session '{session_id}' is still busy with a previous turn.")
+            try:
+                yield self.get(session_id)
+            finally:
+                entry[1].release() # Plain Lock: a streamed turn may finish on another thread
+        finally:
+            with self._lock:
+                entry[0] -= 1
+                if not entry[0]:
+                    del self._in_use[session_id]
+                if session_id in self._sessions:
+                    # Idle time counts from the end of the turn
+                    self._sessions[session_id] = (self._sessions[session_id][0], time.monotonic())
+
+    def discard(self, session_id: str):
+        """Forgets a session, in memory and on disk."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self.directory and os.path.exists(self._path(session_id)):
+                os.remove(self._path(session_id))
+
+    def save_all(self):
+        """Writes every in-memory session to disk (e.g. at shutdown); they stay in memory."""
+        with self._lock:
+            for session_id, (history, _) in self._sessions.items():
+                self._save(session_id, history)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_memory": len(self._sessions), "loads": self.loads, "evictions": self.evictions}
+
+    def _collect_evictions(self, now: float) -> list:
+        # Caller holds the lock
+        evicted = []
+        for session_id, (history, last_used) in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and now - last_used < self.idle_seconds:
+                break
+            if session_id in self._in_use:
+                continue # Pinned by a turn; evicted on a later access once released
+            del self._sessions[session_id]
+            evicted.append((session_id, history))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _path(self, session_id: str) -> str:
+        # Hashed so arbitrary ids are safe file names
+        return os.path.join(self.directory, hashlib.sha1(session_id.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, session_id: str) -> ChatHistory:
+        history = self.history_factory()
+        if self.directory and os.path.exists(self._path(session_id)):
+            try:
+                with open(self._path(session_id), "r", encoding="utf-8") as f:
+                    history.load_dict(json.load(f))
+                self.loads += 1
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Could not load session '{session_id}', starting it fresh: {e}")
+        return history
+
+    def _save(self, session_id: str, history: ChatHistory):
+        if not self.directory or session_id.startswith(EPHEMERAL_SESSION_PREFIX):
+            return
+        path = self._path(session_id)
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(dict(history.to_dict(), session_id=session_id), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self.logger.error(f"Could not save session '{session_id}': {e}")
\ No newline at end of file
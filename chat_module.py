@@ -1,67 +1,261 @@
-# chat_module.py
-
-import logging
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from system_prompt_module import ACREA_SYSTEM_PROMPT
-
-class ChatModule:
-    """Handles interaction with the Gemini language model for Acrea."""
-    def __init__(self, api_key: str, model_name: str, system_instruction: str,
-                 generation_config: dict, safety_settings: dict):
-        self.logger = logging.getLogger("ChatModule")
-        try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(
-                model_name,
-                system_instruction=system_instruction,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
-            # Start a chat session to maintain history internally
-            self.chat = self.model.start_chat(history=[])
-            self.logger.info(f"ChatModule initialized with model '{model_name}'.")
-        except Exception as e:
-            self.logger.error(f"Failed to initialize ChatModule's Gemini model: {e}", exc_info=True)
-            raise
-
-    def handle_message(self, action: str, payload: dict):
-        """Handles actions directed to the chat module."""
-        if action == "generate_response":
-            user_prompt = payload.get("prompt")
-            context_info = payload.get("context") # Optional context from RAG
-
-            if not user_prompt:
-                self.logger.warning("Generate response action received without 'prompt' in payload.")
-                return "I received an empty request."
-
-            full_prompt = user_prompt
-            if context_info:
-                # Basic context injection - adjust formatting as needed
-                full_prompt = f"Based on the following relevant context:\n---\n{context_info}\n---\n\nPlease answer the user's query: {user_prompt}"
-                self.logger.info("Injecting retrieved context into prompt for Gemini.")
-
-            try:
-                # Use the internal chat session which manages history
-                response = self.chat.send_message(full_prompt) # Blocking call for simplicity
-                self.logger.info("Successfully generated response from Gemini.")
-
-                # Basic safety/completion check
-                if not response.candidates or response.candidates[0].finish_reason not in (1, 0): # 1=STOP, 0=UNSPECIFIED (often ok)
-                    finish_reason = response.candidates[0].finish_reason if response.candidates else 'UNKNOWN'
-                    self.logger.warning(f"Gemini response finished with reason: {finish_reason}")
-                    if hasattr(response, 'prompt_feedback'):
-                        self.logger.warning(f"Prompt Feedback: {response.prompt_feedback}")
-                    # Decide how to handle non-ideal finishes (e.g., return partial or error message)
-
-                return response.text
-            except Exception as e:
-                self.logger.error(f"Error during Gemini response generation: {e}", exc_info=True)
-                return "I apologize, but I encountered an error trying to generate a response."
-
-        elif action == "get_history":
-             # Example: Action to retrieve history if needed externally
-             return self.chat.history
-        else:
-            self.logger.warning(f"ChatModule received unknown action: {action}")
+# chat_module.py
+
+import logging
+import time
+from chat_history import ChatHistory, ChatSessionPool, SessionBusyError, DEFAULT_HISTORY_TOKEN_BUDGET, DEFAULT_SESSION_ID
+from response_cache import ResponseCache, fingerprint
+from startup_report import import_module
+from system_prompt_module import ACREA_SYSTEM_PROMPT
+
+SESSION_BUSY_REPLY = "I'm still answering your previous message in this conversation. Please try again once it finishes."
+
+class ChatModule:
+    """
+    Handles interaction with the Gemini language model for Acrea.
+
+    Conversation history is kept by a ChatHistory within `history_token_budget` tokens: older
+    turns are summarized in the background by `summary_model_name` (which is called without the
+    system prompt). History stores the user's own prompt, not the retrieved context injected for
+    that turn, since context is retrieved afresh for every request.
+
+    Each conversation is a session named by the payload's 'session_id' (DEFAULT_SESSION_ID when
+    absent). Sessions are held in a ChatSessionPool: hot ones in memory, idle ones on disk under
+    `sessions_dir` until they are used again. Different sessions run in parallel; turns of one
+    session run one at a time (a turn waits up to `session_wait_seconds` for the previous one,
+    then gets a busy reply), and a session is kept in memory while its turn runs.
+
+    Answers are cached in a ResponseCache keyed on the prompt, the retrieved context, the
+    session's history (summary and turns) and the model configuration; with a prompt embedding
+    (the payload's 'prompt_embedding', else `embed_prompt`), a paraphrased prompt can also hit. Hits therefore come from conversations in the same state,
+    typically the first question of a session, and a follow-up never gets another session's
+    answer. A cached answer is still recorded as a turn of the asking session. Callers may send
+    'bypass_cache' to force a fresh answer.
+    """
+    def __init__(self, api_key: str, model_name: str, system_instruction: str,
+                 generation_config: dict, safety_settings: dict,
+                 history_token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET, summary_model_name: str = None,
+                 sessions_dir: str = "chat_sessions", max_sessions: int = 256, session_idle_seconds: float = 900.0,
+                 max_workers: int = 8, response_cache_entries: int = 2048, response_cache_ttl_seconds: float = 3600.0,
+                 response_cache_similarity: float = 0.97, embed_prompt: callable = None,
+                 session_wait_seconds: float = 30.0):
+        self.logger = logging.getLogger("ChatModule")
+        # Concurrent turns for different sessions; turns of one session are serialized by the pool
+        self.max_workers = max_workers
+        # Bounded so waiting turns cannot hold the coordinator's workers (which the running turn needs) indefinitely
+        self.session_wait_seconds = session_wait_seconds
+        # Response cache (0 entries disables it). Semantic hits use the payload's 'prompt_embedding'
+        # (the retrieval query vector, see rag_pipeline.chat_message), else embed_prompt(text) -> vector.
+        self.response_cache = ResponseCache(response_cache_entries, response_cache_ttl_seconds, response_cache_similarity) if response_cache_entries else None
+        self.embed_prompt = embed_prompt
+        self._config_fingerprint = fingerprint({"model": model_name, "system": system_instruction,
+                                                "generation_config": generation_config})
+        try:
+            genai = import_module("google.generativeai") # Deferred: slow to import, only needed once the module is built
+            genai.configure(api_key=api_key)
+            self.model = genai.GenerativeModel(
+                model_name,
+                system_instruction=system_instruction,
+                generation_config=generation_config,
+                safety_settings=safety_settings
+            )
+            # Summaries are plain requests: no system prompt, short output
+            self.summary_model = genai.GenerativeModel(
+                summary_model_name or model_name,
+                generation_config={"temperature": 0.2, "max_output_tokens": max(256, history_token_budget // 4)},
+                safety_settings=safety_settings
+            )
+            # Token-budgeted history per session, sent with each request
+            self.sessions = ChatSessionPool(
+                lambda: ChatHistory(token_budget=history_token_budget, summarize=self._summarize),
+                directory=sessions_dir, max_sessions=max_sessions, idle_seconds=session_idle_seconds,
+            )
+            self.logger.info(f"ChatModule initialized with model '{model_name}'.")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize ChatModule's Gemini model: {e}", exc_info=True)
+            raise
+
+    def _build_prompt(self, user_prompt: str, context_info: str = None) -> str:
+        """Builds the prompt sent to Gemini, injecting RAG context when available."""
+        if not context_info:
+            return user_prompt
+        # Basic context injection - adjust formatting as needed
+        self.logger.info("Injecting retrieved context into prompt for Gemini.")
+        return f"Based on the following relevant context:\n---\n{context_info}\n---\n\nPlease answer the user's query: {user_prompt}"
+
+    def _summarize(self, previous_summary: str | None, turns: list[tuple[str, str]]) -> str:
+        """Folds old turns into the running conversation summary (runs on the compaction thread)."""
+        transcript = "\n\n".join(f"User: {user_text}\nAssistant: {model_text}" for user_text, model_text in turns)
+        prompt = (
+            "Update the summary of this conversation between a user and an AI assistant. Keep facts, "
+            "names, decisions, open questions and the user's preferences; drop small talk. "
+            "Reply with the summary only.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        return self.summary_model.generate_content(prompt).text
+
+    def _send(self, history: ChatHistory, full_prompt: str, stream: bool = False):
+        """Sends the prompt with the session's compacted history (the history is updated by the caller)."""
+        return self.model.generate_content(history.render() + [{"role": "user", "parts": [full_prompt]}], stream=stream)
+
+    def _lookup_cache(self, payload: dict, user_prompt: str, history: ChatHistory):
+        """
+        Looks the prompt up in the response cache, within the session's current history. Returns
+        (response, scope, embedding): a cached response or None, plus the scope and prompt
+        embedding to store the fresh answer under. A None scope means the turn bypasses the cache.
+        The prompt is embedded only on an exact miss without a 'prompt_embedding' in the payload;
+        with no embedding at all, only exact hits are possible.
+        """
+        if self.response_cache is None or payload.get("bypass_cache", False):
+            return None, None, None
+        scope = ResponseCache.scope(payload.get("context"), self._config_fingerprint, history.render())
+        cached = self.response_cache.get_exact(user_prompt, scope)
+        if cached is not None:
+            return cached, scope, None
+        embedding = payload.get("prompt_embedding")
+        if embedding is None and self.embed_prompt is not None:
+            try:
+                embedding = self.embed_prompt(user_prompt)
+            except Exception as e:
+                self.logger.warning(f"Could not embed prompt for the response cache: {e}")
+        if embedding is None:
+            self.response_cache.record_miss()
+            return None, scope, None
+        return self.response_cache.get_similar(embedding, scope), scope, embedding
+
+    def _record_turn(self, history: ChatHistory, user_prompt: str, model_text: str, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            history.last_prompt_tokens = usage.prompt_token_count
+        history.add_turn(user_prompt, model_text)
+
+    def _check_finish_reason(self, response) -> bool:
+        """Basic safety/completion check on a (fully consumed) Gemini response. Returns True for a normal finish."""
+        if not response.candidates or response.candidates[0].finish_reason not in (1, 0): # 1=STOP, 0=UNSPECIFIED (often ok)
+            finish_reason = response.candidates[0].finish_reason if response.candidates else 'UNKNOWN'
+            self.logger.warning(f"Gemini response finished with reason: {finish_reason}")
+            if hasattr(response, 'prompt_feedback'):
+                self.logger.warning(f"Prompt Feedback: {response.prompt_feedback}")
+            # Decide how to handle non-ideal finishes (e.g., return partial or error message)
+            return False
+        return True
+
+    def _stream_turn(self, session_id: str, user_prompt: str, payload: dict):
+        """
+        Streams one turn of the session. The session is checked out when the stream starts and
+        released when it is exhausted or closed, so the turn holds it for its whole duration.
+        """
+        try:
+            with self.sessions.checkout(session_id, self.session_wait_seconds) as history:
+                cached, scope, embedding = self._lookup_cache(payload, user_prompt, history)
+                if cached is not None:
+                    self.logger.info("Served streamed response from the response cache.")
+                    history.add_turn(user_prompt, cached)
+                    yield cached
+                    return
+                yield from self._stream_response(history, user_prompt, self._build_prompt(user_prompt, payload.get("context")),
+                                                 scope, embedding)
+        except SessionBusyError as e:
+            self.logger.warning(str(e))
+            yield SESSION_BUSY_REPLY
+
+    def _stream_response(self, history: ChatHistory, user_prompt: str, full_prompt: str, scope: str = None, embedding=None):
+        """Yields response text chunks as Gemini produces them. History (and the cache) are updated once the stream is consumed."""
+        try:
+            response = self._send(history, full_prompt, stream=True)
+            parts = []
+            for chunk in response:
+                # Chunks without text (e.g. safety-only updates) are skipped
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    parts.append(chunk.text)
+                    yield chunk.text
+            self.logger.info("Successfully streamed response from Gemini.")
+            finished = self._check_finish_reason(response)
+            self._record_turn(history, user_prompt, "".join(parts), response)
+            if finished and parts and scope is not None:
+                self.response_cache.put(user_prompt, scope, "".join(parts), embedding)
+        except Exception as e:
+            self.logger.error(f"Error during Gemini streaming response generation: {e}", exc_info=True)
+            yield "I apologize, but I encountered an error trying to generate a response."
+
+    def warm_up(self) -> float:
+        """
+        Sends a cheap count_tokens call so the SDK's connection and credentials are ready before
+        the first chat turn (the SDK manages its own channel, so it is not pooled). Returns elapsed seconds.
+        """
+        start = time.perf_counter()
+        try:
+            self.model.count_tokens("ping")
+        except Exception as e:
+            self.logger.warning(f"ChatModule warm-up failed: {e}")
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"ChatModule warmed up in {elapsed * 1000:.0f} ms.")
+        return elapsed
+
+    def close(self):
+        """Writes the in-memory sessions to disk."""
+        self.sessions.save_all()
+
+    def handle_message(self, action: str, payload: dict):
+        """Handles actions directed to the chat module. Every action accepts an optional 'session_id'."""
+        session_id = payload.get("session_id") or DEFAULT_SESSION_ID
+        if action == "generate_response":
+            user_prompt = payload.get("prompt")
+
+            if not user_prompt:
+                self.logger.warning("Generate response action received without 'prompt' in payload.")
+                return "I received an empty request."
+
+            full_prompt = self._build_prompt(user_prompt, payload.get("context"))
+
+            try:
+                with self.sessions.checkout(session_id, self.session_wait_seconds) as history:
+                    cached, scope, embedding = self._lookup_cache(payload, user_prompt, history)
+                    if cached is not None:
+                        self.logger.info("Served response from the response cache.")
+                        history.add_turn(user_prompt, cached)
+                        return cached
+                    response = self._send(history, full_prompt) # Blocking call for simplicity
+                    self.logger.info("Successfully generated response from Gemini.")
+
+                    finished = self._check_finish_reason(response)
+                    self._record_turn(history, user_prompt, response.text, response)
+                    if finished and scope is not None:
+                        self.response_cache.put(user_prompt, scope, response.text, embedding)
+                    return response.text
+            except SessionBusyError as e:
+                self.logger.warning(str(e))
+                return SESSION_BUSY_REPLY
+            except Exception as e:
+                self.logger.error(f"Error during Gemini response generation: {e}", exc_info=True)
+                return "I apologize, but I encountered an error trying to generate a response."
+
+        elif action == "generate_response_stream":
+            # Returns a generator of text chunks; consume it via the coordinator's stream_message_async
+            user_prompt = payload.get("prompt")
+            if not user_prompt:
+                self.logger.warning("Generate response stream action received without 'prompt' in payload.")
+                return iter(["I received an empty request."])
+            return self._stream_turn(session_id, user_prompt, payload)
+
+        elif action == "get_history":
+            # The history as sent with the next request, plus its token footprint
+            history = self.sessions.get(session_id)
+            return {"session_id": session_id, "history": history.render(), **history.stats()}
+
+        elif action == "clear_history":
+            self.sessions.discard(session_id)
+            return True
+
+        elif action == "get_session_stats":
+            return self.sessions.stats()
+
+        elif action == "get_cache_stats":
+            return self.response_cache.stats() if self.response_cache else None
+
+        elif action == "clear_cache":
+            if self.response_cache:
+                self.response_cache.clear()
+            return True
+        else:
+            self.logger.warning(f"ChatModule received unknown action: {action}")
             return None
\ No newline at end of file
@@ -0,0 +1,179 @@
+# content_store.py
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import threading
+
+DEFAULT_MAX_SEGMENT_BYTES = 256 * 1024 * 1024
+
+class ContentStore:
+    """
+    Append-only document content store with memory-mapped reads.
+
+    Texts are appended (UTF-8) to numbered segment files. An append-only index log records
+    id -> (segment, offset, length); it is replayed into a dict at startup, and the last record
+    for an id wins. Reads slice the memory-mapped segment directly, so turning neighbor IDs
+    into context text is a dict lookup plus a memory copy.
+    """
+    def __init__(self, directory: str = "content_store", max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES):
+        """
+        Args:
+            directory: Folder holding the segment files and index log (created if missing).
+            max_segment_bytes: Size at which a new segment file is started.
+        """
+        self.logger = logging.getLogger("ContentStore")
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._index = {} # id -> (segment, offset, length)
+        self._maps = {} # segment -> mmap covering the bytes written when it was mapped
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+        segments = self._existing_segments()
+        self._active_segment = segments[-1] if segments else 0
+        self._segment_file = open(self._segment_path(self._active_segment), "ab")
+        self._index_file = open(self._index_path(), "a", encoding="utf-8")
+        self.logger.info(f"ContentStore opened at '{directory}' ({len(self._index)} documents, {len(segments)} segment(s)).")
+
+    # --- Paths ---
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment_{segment:05d}.dat")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.log")
+
+    def _existing_segments(self) -> list[int]:
+        names = [n for n in os.listdir(self.directory) if n.startswith("segment_") and n.endswith(".dat")]
+        return sorted(int(n[len("segment_"):-len(".dat")]) for n in names)
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path()):
+            return
+        good_bytes = 0 # Length of the index log up to the last complete record
+        with open(self._index_path(), "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    doc_id, segment, offset, length = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write; everything before it is intact
+                    self.logger.warning(f"Dropping malformed index record at line {line_number}.")
+                    break
+                self._index[doc_id] = (segment, offset, length)
+                good_bytes += len(line)
+        if good_bytes != os.path.getsize(self._index_path()):
+            # Cut the torn tail so new records start on a fresh line
+            with open(self._index_path(), "r+b") as f:
+                f.truncate(good_bytes)
+
+    # --- Writes ---
+    def put_many(self, items) -> int:
+        """
+        Appends documents. Items are a dict {id: text} or an iterable of (id, text) pairs.
+        Returns the number of documents written.
+        """
+        pairs = items.items() if isinstance(items, dict) else items
+        records = []
+        with self._lock:
+            for doc_id, text in pairs:
+                data = text.encode("utf-8")
+                if self._segment_file.tell() + len(data) > self.max_segment_bytes and self._segment_file.tell() > 0:
+                    self._roll_segment()
+                offset = self._segment_file.tell()
+                self._segment_file.write(data)
+                records.append((doc_id, self._active_segment, offset, len(data)))
+            # Segment data must be on disk before the index records that point at it
+            self._segment_file.flush()
+            for record in records:
+                self._index_file.write(json.dumps(record) + "\n")
+                self._index[record[0]] = record[1:]
+            self._index_file.flush()
+        return len(records)
+
+    def put(self, doc_id: str, text: str):
+        self.put_many([(doc_id, text)])
+
+    def _roll_segment(self):
+        self._segment_file.close()
+        self._active_segment += 1
+        self._segment_file = open(self._segment_path(self._active_segment), "ab")
+
+    # --- Reads ---
+    def get_many(self, ids) -> dict[str, str]:
+        """Returns {id: text} for the ids that exist (missing ids are left out)."""
+        found = {}
+        with self._lock:
+            for doc_id in ids:
+                location = self._index.get(doc_id)
+                if location is None:
+                    continue
+                segment, offset, length = location
+                if length == 0:
+                    found[doc_id] = "" # Empty files cannot be memory-mapped
+                    continue
+                found[doc_id] = self._map(segment, offset + length)[offset:offset + length].decode("utf-8")
+        return found
+
+    def get(self, doc_id: str) -> str | None:
+        return self.get_many([doc_id]).get(doc_id)
+
+    def _map(self, segment: int, needed_bytes: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < needed_bytes:
+            # The active segment grows after it is mapped; remap to cover the new bytes
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self._segment_file.close()
+            self._index_file.close()
+
+    # --- Coordinator interface ---
+    def handle_message(self, action: str, payload: dict):
+        """Handles actions directed to the content store."""
+        if action == "get_many":
+            ids = payload.get("ids")
+            if ids is None:
+                self.logger.error("Get many action received without 'ids' in payload.")
+                return {}
+            try:
+                return self.get_many(ids)
+            except Exception as e:
+                self.logger.error(f"Error reading content: {e}", exc_info=True)
+                return {}
+        elif action == "put_many":
+            items = payload.get("items")
+            if not items:
+                self.logger.error("Put many action received without 'items' in payload.")
+                return 0
+            try:
+                return self.put_many(items)
+            except Exception as e:
+                self.logger.error(f"Error writing content: {e}", exc_info=True)
+                return 0
+        elif action == "get_stats":
+            return {"documents": len(self._index), "segments": self._active_segment + 1}
+        else:
+            self.logger.warning(f"ContentStore received unknown action: {action}")
+            return None
+
+    async def handle_message_async(self, action: str, payload: dict):
+        """Reads are memory copies, so they run inline on the loop; writes go to a worker thread."""
+        if action == "put_many":
+            return await asyncio.to_thread(self.handle_message, action, payload)
+        return self.handle_message(action, payload)
\ No newline at end of file
@@ -0,0 +1,258 @@
+# coordinator_metrics.py
+
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds (cumulative, Prometheus style)
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_MAX_SPANS = 2048 # Finished spans kept for per-trace breakdowns
+DEFAULT_SLOW_TRACE_SECONDS = 10.0 # Traces at least this long log where their time went
+METRICS_DUMP_ENV = "ACREA_METRICS_DUMP" # Optional file the coordinator writes metrics to on shutdown
+
+_current_trace_id = contextvars.ContextVar("acrea_trace_id", default=None)
+
+def current_trace_id() -> str | None:
+    """Trace id of the request being handled in this context (asyncio task or thread), if any."""
+    return _current_trace_id.get()
+
+def classify_outcome(error: BaseException = None) -> str:
+    """
+    Maps how a call ended to the 'outcome' label: ok, timeout, cancelled (including a consumer
+    that stopped reading a stream) or error.
+    """
+    if error is None:
+        return "ok"
+    if isinstance(error, TimeoutError) or type(error).__name__ in ("DeadlineExceeded", "Timeout", "ReadTimeout"):
+        return "timeout"
+    if isinstance(error, (KeyboardInterrupt, SystemExit, GeneratorExit)) or type(error).__name__ == "CancelledError":
+        return "cancelled"
+    return "error"
+
+def _labels(**values) -> str:
+    """Prometheus label set, e.g. {module="chat",action="generate_response"}."""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(values, escaped)) + "}"
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with Prometheus semantics."""
+    def __init__(self, buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Per bucket (not cumulative); the last is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float | None:
+        """Estimates the q-quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower # Beyond the last bound; report the bound
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+class Span:
+    """One timed stage (a module call, a stream, or a whole trace)."""
+    __slots__ = ("trace_id", "kind", "module", "action", "started_at", "_start", "duration", "first_chunk", "outcome")
+
+    def __init__(self, kind: str, module: str, action: str):
+        self.trace_id = _current_trace_id.get()
+        self.kind = kind
+        self.module = module
+        self.action = action
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.first_chunk = None # Seconds to the first chunk (streams only)
+        self.outcome = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "kind": self.kind, "module": self.module, "action": self.action,
+            "started_at": self.started_at, "duration": self.duration, "first_chunk": self.first_chunk,
+            "outcome": self.outcome,
+        }
+
+class CoordinatorMetrics:
+    """
+    Latency histograms, outcome counters and in-flight gauges for coordinator-routed calls,
+    labelled by module and action, plus spans linked by a request-scoped trace id.
+
+    Wrap one request (e.g. a RAG turn) in trace(): every call routed inside it, including
+    from tasks it spawns, records a span carrying the trace's id, so spans(trace_id) shows
+    where that request spent its time. Thread-safe. Export with to_prometheus() or snapshot().
+    """
+    def __init__(self, buckets: tuple = DEFAULT_LATENCY_BUCKETS, max_spans: int = DEFAULT_MAX_SPANS,
+                 slow_trace_seconds: float = DEFAULT_SLOW_TRACE_SECONDS):
+        """
+        Args:
+            buckets: Histogram bucket upper bounds in seconds.
+            max_spans: Finished spans kept in memory (oldest are dropped).
+            slow_trace_seconds: Traces at least this long log a per-stage breakdown.
+        """
+        self.logger = logging.getLogger("CoordinatorMetrics")
+        self.buckets = buckets
+        self.slow_trace_seconds = slow_trace_seconds
+        self._lock = threading.Lock()
+        self._histograms = {} # (metric, module, action) -> LatencyHistogram
+        self._outcomes = {} # (kind, module, action, outcome) -> count
+        self._in_flight = {} # (kind, module, action) -> count
+        self._spans = deque(maxlen=max_spans)
+
+    # --- Recording ---
+    def start(self, module: str, action: str, kind: str = "call") -> Span:
+        """Starts a span and counts it in flight. Pair with finish()."""
+        # Labels are always strings: a malformed message's None must not break sorting in to_prometheus
+        span = Span(kind, str(module), str(action))
+        with self._lock:
+            key = (kind, module, action)
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return span
+
+    def first_chunk(self, span: Span):
+        """Marks a stream span's time to first chunk."""
+        if span.first_chunk is None:
+            span.first_chunk = time.perf_counter() - span._start
+            self._observe("first_chunk", span.module, span.action, span.first_chunk)
+
+    def finish(self, span: Span, error: BaseException = None):
+        """Ends a span; error (if any) decides its outcome label."""
+        span.duration = time.perf_counter() - span._start
+        span.outcome = classify_outcome(error)
+        with self._lock:
+            key = (span.kind, span.module, span.action)
+            self._in_flight[key] -= 1
+            outcome_key = key + (span.outcome,)
+            self._outcomes[outcome_key] = self._outcomes.get(outcome_key, 0) + 1
+            self._spans.append(span)
+        self._observe(span.kind, span.module, span.action, span.duration)
+
+    def _observe(self, metric: str, module: str, action: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get((metric, module, action))
+            if histogram is None:
+                histogram = self._histograms[(metric, module, action)] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def trace(self, name: str = "turn", trace_id: str = None):
+        """
+        Runs the enclosed block as one traced request and yields its trace id. The trace itself
+        is recorded as a span of kind "trace" under module "trace" and action `name`.
+        """
+        trace_id = trace_id or uuid.uuid4().hex[:16]
+        token = _current_trace_id.set(trace_id)
+        span = self.start("trace", name, kind="trace")
+        error = None
+        try:
+            yield trace_id
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_trace_id.reset(token)
+            self.finish(span, error)
+            if span.duration >= self.slow_trace_seconds:
+                self.logger.warning(f"Slow {name} {trace_id} ({span.duration:.2f}s): {self.breakdown(trace_id)}")
+
+    # --- Reading ---
+    def spans(self, trace_id: str = None) -> list[dict]:
+        """Finished spans, oldest first; only those of trace_id if given."""
+        with self._lock:
+            spans = list(self._spans)
+        return [span.to_dict() for span in spans if trace_id is None or span.trace_id == trace_id]
+
+    def breakdown(self, trace_id: str) -> dict:
+        """Seconds spent per 'module.action' within a trace (stages may overlap)."""
+        totals = {}
+        for span in self.spans(trace_id):
+            if span["kind"] != "trace":
+                stage = f"{span['module']}.{span['action']}" + (" (stream)" if span["kind"] == "stream" else "")
+                totals[stage] = round(totals.get(stage, 0.0) + span["duration"], 4)
+        return totals
+
+    def snapshot(self) -> dict:
+        """JSON-able view: per-metric histograms with p50/p95/p99, outcome counts and in-flight gauges."""
+        with self._lock:
+            histograms = {key: histogram.to_dict() for key, histogram in self._histograms.items()}
+            outcomes = dict(self._outcomes)
+            in_flight = dict(self._in_flight)
+        series = {}
+        for (metric, module, action), summary in histograms.items():
+            series.setdefault(metric, {}).setdefault(module, {})[action] = summary
+        counts = {}
+        for (kind, module, action, outcome), count in outcomes.items():
+            counts.setdefault(kind, {}).setdefault(module, {}).setdefault(action, {})[outcome] = count
+        gauges = {}
+        for (kind, module, action), count in in_flight.items():
+            gauges.setdefault(kind, {}).setdefault(module, {})[action] = count
+        return {"latency_seconds": series, "outcomes": counts, "in_flight": gauges}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.count, h.sum) for key, h in self._histograms.items()}
+            outcomes = dict(self._outcomes)
+            in_flight = dict(self._in_flight)
+
+        lines = []
+        metric_names = sorted({metric for metric, _, _ in histograms})
+        for metric in metric_names:
+            name = f"acrea_{metric}_seconds"
+            lines.append(f"# HELP {name} Latency of coordinator {metric} stages.")
+            lines.append(f"# TYPE {name} histogram")
+            for (series_metric, module, action), (bucket_counts, count, total) in sorted(histograms.items()):
+                if series_metric != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(module=module, action=action, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(module=module, action=action)} {total}")
+                lines.append(f"{name}_count{_labels(module=module, action=action)} {count}")
+        lines.append("# HELP acrea_requests_total Finished coordinator stages by outcome (ok, error, timeout, cancelled).")
+        lines.append("# TYPE acrea_requests_total counter")
+        for (kind, module, action, outcome), count in sorted(outcomes.items()):
+            lines.append(f"acrea_requests_total{_labels(kind=kind, module=module, action=action, outcome=outcome)} {count}")
+        lines.append("# HELP acrea_in_flight Coordinator stages currently running.")
+        lines.append("# TYPE acrea_in_flight gauge")
+        for (kind, module, action), count in sorted(in_flight.items()):
+            lines.append(f"acrea_in_flight{_labels(kind=kind, module=module, action=action)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Writes the metrics to path: Prometheus text for '.prom'/'.txt', otherwise a JSON snapshot."""
+        if path.endswith((".prom", ".txt")):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        self.logger.info(f"Wrote coordinator metrics to {path}.")
@@ -0,0 +1,166 @@
+# embedding_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors.
+
+    Tier 1 is a bounded in-process LRU. Tier 2 is a persistent on-disk store per model:
+    an append-only float32 matrix (`vectors.f32`) read through a memory map, plus an
+    append-only key file (`keys.txt`) whose line number is the row of each vector.
+    Keys are a SHA-256 of the model name, task type and text, so a warm restart serves
+    previously seen texts without an API round-trip.
+    """
+    def __init__(self, model_name: str, cache_dir: str = "embedding_cache", max_memory_entries: int = 10000):
+        """
+        Args:
+            model_name: Embedding model the cached vectors belong to (part of every key).
+            cache_dir: Root directory for the on-disk store. None keeps the cache in memory only.
+            max_memory_entries: Capacity of the in-process LRU tier.
+        """
+        self.logger = logging.getLogger("EmbeddingCache")
+        self.model_name = model_name
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict() # key -> np.ndarray (float32)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # --- Disk tier state ---
+        self.store_dir = None
+        self.dim = None
+        self._rows = {} # key -> row in vectors.f32
+        self._next_row = 0 # Row (and keys.txt line) of the next appended vector
+        self._mmap = None # np.memmap over the rows written so far (remapped as the file grows)
+        if cache_dir:
+            # One store per model keeps a single vector dimension per file
+            safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+            self.store_dir = os.path.join(cache_dir, safe_model)
+            os.makedirs(self.store_dir, exist_ok=True)
+            self._load_disk_index()
+
+    # --- Keys ---
+    def make_key(self, text: str, task_type: str = None) -> str:
+        """Content hash of the text, scoped to the model and task type."""
+        digest = hashlib.sha256()
+        digest.update(f"{self.model_name}\0{task_type or ''}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    # --- Public API ---
+    def get(self, text: str, task_type: str = None) -> list[float] | None:
+        """Returns the cached vector for text, or None on a miss."""
+        key = self.make_key(text, task_type)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+
+            row = self._rows.get(key)
+            if row is not None:
+                vector = np.array(self._disk_row(row)) # Copy out of the memory map
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: list[float], task_type: str = None):
+        """Stores a vector in both tiers."""
+        key = self.make_key(text, task_type)
+        array = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, array)
+            if self.store_dir and key not in self._rows:
+                self._append_to_disk(key, array)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._rows),
+            }
+
+    # --- Internals ---
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _paths(self):
+        return (os.path.join(self.store_dir, "vectors.f32"),
+                os.path.join(self.store_dir, "keys.txt"),
+                os.path.join(self.store_dir, "meta.json"))
+
+    def _load_disk_index(self):
+        vectors_path, keys_path, meta_path = self._paths()
+        if not os.path.exists(meta_path):
+            return
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+            with open(keys_path, "r", encoding="utf-8") as f:
+                keys = [line.strip() for line in f if line.strip()]
+            # Vectors are written before their key, so a torn write leaves at most an orphan vector
+            complete_rows = os.path.getsize(vectors_path) // (self.dim * 4) if os.path.exists(vectors_path) else 0
+            if len(keys) > complete_rows:
+                # Keys without a vector cannot be served; drop them so line numbers stay aligned with rows
+                keys = keys[:complete_rows]
+                with open(keys_path, "w", encoding="utf-8") as f:
+                    f.writelines(key + "\n" for key in keys)
+            for row, key in enumerate(keys):
+                self._rows.setdefault(key, row)
+            self._next_row = len(keys)
+            self.logger.info(f"Loaded {len(self._rows)} cached embeddings from {self.store_dir}.")
+        except Exception as e:
+            self.logger.error(f"Failed to load embedding cache from {self.store_dir}, disk tier disabled: {e}", exc_info=True)
+            self._rows = {}
+            self.store_dir = None # Never append to a store we could not read
+
+    def _disk_row(self, row: int) -> np.ndarray:
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            vectors_path = self._paths()[0]
+            rows = os.path.getsize(vectors_path) // (self.dim * 4)
+            self._mmap = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap[row]
+
+    def _append_to_disk(self, key: str, vector: np.ndarray):
+        vectors_path, keys_path, meta_path = self._paths()
+        try:
+            if self.dim is None:
+                self.dim = int(vector.shape[0])
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+            elif vector.shape[0] != self.dim:
+                self.logger.warning(f"Not persisting embedding of dimension {vector.shape[0]} (store uses {self.dim}).")
+                return
+            row = self._next_row
+            # Written at the row's offset: an orphaned vector left by an interrupted write is overwritten
+            # in place. (Truncating it away instead fails on Windows while the file is memory-mapped.)
+            with open(vectors_path, "r+b" if os.path.exists(vectors_path) else "wb") as f:
+                f.seek(row * self.dim * 4)
+                f.write(vector.tobytes())
+            with open(keys_path, "a", encoding="utf-8") as f:
+                f.write(key + "\n")
+            self._rows[key] = row
+            self._next_row += 1
+        except OSError as e:
+            self.logger.error(f"Failed to persist embedding to {self.store_dir}: {e}", exc_info=True)
\ No newline at end of file
@@ -1,41 +1,239 @@
-# embedding_module.py
-
-import logging
-from system_prompt_module import ACREA_SYSTEM_PROMPT
-
-class EmbeddingModule:
-    """(Placeholder) Handles text embedding generation."""
-    def __init__(self, model_name="models/text-embedding-004"): # Example model
-        self.logger = logging.getLogger("EmbeddingModule")
-        self.model_name = model_name
-        # Initialize the embedding model client here when implemented
-        # genai.configure(api_key=...) is likely needed if not done globally
-        self.logger.info(f"EmbeddingModule initialized (Placeholder - using model: {model_name}).")
-
-    def handle_message(self, action: str, payload: dict):
-        """Handles actions directed to the embedding module."""
-        if action == "generate_embedding":
-            text_to_embed = payload.get("text")
-            if not text_to_embed:
-                self.logger.error("Generate embedding action received without 'text' in payload.")
-                return None
-
-            self.logger.info(f"Generating embedding for text snippet (length: {len(text_to_embed)})...")
-            try:
-                # --- !!! IMPLEMENTATION NEEDED !!! ---
-                # result = genai.embed_content(model=self.model_name, content=text_to_embed)
-                # embedding_vector = result['embedding']
-                # self.logger.info("Successfully generated embedding.")
-                # return embedding_vector
-                # --- END IMPLEMENTATION NEEDED ---
-
-                # Placeholder return for now: returns None to indicate not implemented
-                self.logger.warning("Embedding generation is not yet implemented. Returning None.")
-                return None
-
-            except Exception as e:
-                self.logger.error(f"Error during embedding generation: {e}", exc_info=True)
-                return None
-        else:
-            self.logger.warning(f"EmbeddingModule received unknown action: {action}")
-            return None
\ No newline at end of file
+# embedding_module.py
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from embedding_cache import EmbeddingCache
+from startup_report import import_module
+from system_prompt_module import ACREA_SYSTEM_PROMPT
+
+# batchEmbedContents accepts at most 100 texts per request
+MAX_EMBEDDING_BATCH_SIZE = 100
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into batched embed_content calls.
+
+    Callers submit single texts and get a Future back. A worker thread waits up to
+    `max_wait_ms` after the first queued text for more to arrive, then sends one
+    request per task type (identical texts share a slot) and resolves each Future
+    with its own vector.
+    """
+    def __init__(self, embed_batch: callable, max_batch_size: int = MAX_EMBEDDING_BATCH_SIZE, max_wait_ms: float = 5.0):
+        """
+        Args:
+            embed_batch: Callable (texts: list[str], task_type: str | None) -> list[list[float]].
+            max_batch_size: Maximum number of unique texts sent in one request.
+            max_wait_ms: How long to wait for more texts after the first one arrives.
+        """
+        self.logger = logging.getLogger("EmbeddingBatcher")
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(1, min(max_batch_size, MAX_EMBEDDING_BATCH_SIZE))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, text: str, task_type: str = None) -> Future:
+        """Queues a text for embedding and returns a Future resolving to its vector."""
+        if self._closed:
+            raise RuntimeError("EmbeddingBatcher is closed.")
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, task_type, future))
+        return future
+
+    def close(self):
+        """Stops the worker thread after the queued requests are flushed."""
+        self._closed = True
+        if self._worker:
+            self._queue.put(None)
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="acrea-embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            # Gather more requests until the window closes or the batch is full
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                pending.append(item)
+            self._flush(pending)
+            if stop:
+                return
+
+    def _flush(self, pending: list):
+        # One request per task type; identical texts are embedded once
+        by_task_type = {}
+        for text, task_type, future in pending:
+            if future.set_running_or_notify_cancel():
+                by_task_type.setdefault(task_type, {}).setdefault(text, []).append(future)
+
+        for task_type, futures_by_text in by_task_type.items():
+            texts = list(futures_by_text)
+            try:
+                vectors = self.embed_batch(texts, task_type)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}.")
+            except Exception as e:
+                self.logger.error(f"Batched embedding request failed for {len(texts)} texts: {e}", exc_info=True)
+                for futures in futures_by_text.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+            self.logger.debug(f"Embedded batch of {len(texts)} unique texts (task type: {task_type}).")
+            for text, vector in zip(texts, vectors):
+                for future in futures_by_text[text]:
+                    future.set_result(vector)
+
+
+class EmbeddingModule:
+    """
+    Handles text embedding generation, batching concurrent requests into single API calls.
+    Vectors are cached (in-memory LRU + on-disk store) so repeated texts skip the API.
+    """
+    def __init__(self, model_name="models/text-embedding-004", api_key: str = None,
+                 max_batch_size: int = MAX_EMBEDDING_BATCH_SIZE, max_wait_ms: float = 5.0,
+                 cache_dir: str = "embedding_cache", cache_memory_entries: int = 10000):
+        """
+        Args:
+            model_name: Gemini embedding model.
+            api_key: Optional API key. If None, relies on genai already being configured (e.g. by ChatModule).
+            max_batch_size: Maximum texts per batched embedding request.
+            max_wait_ms: Coalescing window for concurrent requests.
+            cache_dir: Directory of the persistent embedding cache. None keeps the cache in memory only.
+            cache_memory_entries: Capacity of the in-memory LRU tier (0 disables caching).
+        """
+        self.logger = logging.getLogger("EmbeddingModule")
+        self.model_name = model_name
+        self.genai = import_module("google.generativeai") # Deferred: slow to import, only needed once the module is built
+        if api_key:
+            self.genai.configure(api_key=api_key)
+        self.cache = EmbeddingCache(model_name, cache_dir=cache_dir, max_memory_entries=cache_memory_entries) if cache_memory_entries else None
+        self.batcher = EmbeddingBatcher(self._embed_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.logger.info(f"EmbeddingModule initialized (model: {model_name}, batch size: {self.batcher.max_batch_size}, window: {max_wait_ms}ms).")
+
+    def _embed_batch(self, texts: list[str], task_type: str = None) -> list[list[float]]:
+        """Sends one embed_content request for a list of texts."""
+        kwargs = {"task_type": task_type} if task_type else {}
+        result = self.genai.embed_content(model=self.model_name, content=texts, **kwargs)
+        vectors = result['embedding']
+        if self.cache and len(vectors) == len(texts):
+            for text, vector in zip(texts, vectors):
+                self.cache.put(text, vector, task_type)
+        return vectors
+
+    def _submit_texts(self, payload: dict) -> list[Future] | None:
+        """Validates the payload of an embedding action; cache misses are queued on the batcher."""
+        texts = payload.get("texts")
+        if texts is None and payload.get("text"):
+            texts = [payload["text"]]
+        if not texts or not all(isinstance(t, str) and t for t in texts):
+            self.logger.error("Embedding action received without non-empty 'text'/'texts' in payload.")
+            return None
+        task_type = payload.get("task_type")
+        futures = []
+        for text in texts:
+            cached = self.cache.get(text, task_type) if self.cache else None
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+                futures.append(future)
+            else:
+                futures.append(self.batcher.submit(text, task_type))
+        return futures
+
+    def embed_texts(self, texts: list[str], task_type: str = None) -> list[list[float]]:
+        """
+        Embeds an already-formed batch directly, without the coalescing window. Cached texts
+        skip the API and the misses go out in requests of max_batch_size texts. Safe to call
+        from several threads at once, which is how bulk ingestion keeps multiple requests in flight.
+
+        Raises:
+            Exception: Whatever the embedding API raised (e.g. quota errors), so callers can retry.
+        """
+        vectors = [self.cache.get(text, task_type) if self.cache else None for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        batch_size = self.batcher.max_batch_size
+        for start in range(0, len(missing), batch_size):
+            rows = missing[start:start + batch_size]
+            embedded = self._embed_batch([texts[i] for i in rows], task_type)
+            if len(embedded) != len(rows):
+                raise ValueError(f"Expected {len(rows)} embeddings, got {len(embedded)}.")
+            for i, vector in zip(rows, embedded):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embeds one retrieval query directly; a query already embedded for search is served from the cache."""
+        return self.embed_texts([text], "RETRIEVAL_QUERY")[0]
+
+    def warm_up(self) -> float:
+        """Sends one tiny embedding request (bypassing the cache) to open the connection. Returns elapsed seconds."""
+        start = time.perf_counter()
+        try:
+            self.genai.embed_content(model=self.model_name, content="ping")
+        except Exception as e:
+            self.logger.warning(f"EmbeddingModule warm-up failed: {e}")
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"EmbeddingModule warmed up in {elapsed * 1000:.0f} ms.")
+        return elapsed
+
+    def handle_message(self, action: str, payload: dict):
+        """Handles actions directed to the embedding module."""
+        if action in ("generate_embedding", "generate_embeddings"):
+            futures = self._submit_texts(payload)
+            if futures is None:
+                return None
+            try:
+                vectors = [future.result() for future in futures]
+                self.logger.info(f"Generated {len(vectors)} embedding(s).")
+                # 'generate_embedding' returns a single vector, 'generate_embeddings' a list of vectors
+                return vectors[0] if action == "generate_embedding" else vectors
+            except Exception as e:
+                self.logger.error(f"Error during embedding generation: {e}", exc_info=True)
+                return None
+        elif action == "get_cache_stats":
+            return self.cache.stats() if self.cache else None
+        else:
+            self.logger.warning(f"EmbeddingModule received unknown action: {action}")
+            return None
+
+    async def handle_message_async(self, action: str, payload: dict):
+        """Async handler used by the coordinator: waits on the batcher without holding an executor thread."""
+        if action in ("generate_embedding", "generate_embeddings"):
+            futures = self._submit_texts(payload)
+            if futures is None:
+                return None
+            try:
+                vectors = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+                self.logger.info(f"Generated {len(vectors)} embedding(s).")
+                return vectors[0] if action == "generate_embedding" else list(vectors)
+            except Exception as e:
+                self.logger.error(f"Error during embedding generation: {e}", exc_info=True)
+                return None
+        return self.handle_message(action, payload)
\ No newline at end of file
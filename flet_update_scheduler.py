@@ -0,0 +1,111 @@
+# flet_update_scheduler.py
+
+import logging
+import threading
+import time
+import flet as ft
+
+DEFAULT_FRAME_RATE_HZ = 60
+
+class FrameScheduler:
+    """
+    Coalesces Flet UI changes into one round-trip per frame.
+
+    Any thread may queue changes: call() queues a function that mutates controls (a keyed call
+    replaces the one queued under the same key, so the latest state is applied), update()
+    marks controls dirty, scroll_to() requests a scroll (the last request per control wins).
+    A single flusher thread runs the queued functions in order, sends every dirty control in
+    one page.update(), then performs the scrolls, at most `rate_hz` times per second. Since
+    all queued mutations run on that thread, they never race each other or the update.
+    """
+    def __init__(self, page: ft.Page, rate_hz: float = DEFAULT_FRAME_RATE_HZ):
+        self.logger = logging.getLogger("FrameScheduler")
+        self.page = page
+        self.frame_interval = 1.0 / rate_hz
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._calls = [] # (key, fn) for the next frame
+        self._call_keys = {} # key -> position in _calls, so repeated requests collapse into the latest
+        self._deferred = [] # fns for the frame after next (e.g. the second half of an animation)
+        self._dirty = {} # id(control) -> control
+        self._scrolls = {} # id(control) -> (control, scroll_to kwargs)
+        self._stopped = False
+        self.frames = 0
+        self._thread = threading.Thread(target=self._run, name="acrea-ui-frames", daemon=True)
+        self._thread.start()
+
+    # --- Queueing (any thread) ---
+    def call(self, fn: callable, key=None):
+        """
+        Runs fn on the next frame. A call with a key already queued for that frame replaces the
+        queued fn (last call wins), keeping its place in the order.
+        """
+        with self._lock:
+            if key is not None:
+                position = self._call_keys.get(key)
+                if position is not None:
+                    self._calls[position] = (key, fn)
+                    return
+                self._call_keys[key] = len(self._calls)
+            self._calls.append((key, fn))
+        self._wake.set()
+
+    def next_frame(self, fn: callable):
+        """Runs fn one frame after the next, so the client renders the current state first."""
+        with self._lock:
+            self._deferred.append(fn)
+        self._wake.set()
+
+    def update(self, *controls: ft.Control):
+        with self._lock:
+            for control in controls:
+                self._dirty[id(control)] = control
+        self._wake.set()
+
+    def scroll_to(self, control: ft.Control, **kwargs):
+        with self._lock:
+            self._scrolls[id(control)] = (control, kwargs)
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    # --- Flushing (flusher thread) ---
+    def _run(self):
+        last_flush = 0.0
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            # Let changes from the rest of this frame accumulate
+            delay = last_flush + self.frame_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            last_flush = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"UI frame flush failed: {e}", exc_info=True)
+
+    def flush(self):
+        """Applies everything queued so far. Normally called by the flusher thread only."""
+        with self._lock:
+            calls, self._calls = self._calls, [(None, fn) for fn in self._deferred]
+            self._deferred = []
+            self._call_keys.clear()
+            if self._calls:
+                self._wake.set() # Deferred work needs another frame
+        for _, fn in calls:
+            try:
+                fn()
+            except Exception as e:
+                self.logger.error(f"Queued UI change failed: {e}", exc_info=True)
+        with self._lock:
+            dirty, self._dirty = list(self._dirty.values()), {}
+            scrolls, self._scrolls = list(self._scrolls.values()), {}
+        if dirty:
+            self.page.update(*dirty)
+        for control, kwargs in scrolls:
+            control.scroll_to(**kwargs)
+        if calls or dirty or scrolls:
+            self.frames += 1
@@ -1,201 +1,234 @@
-# gemini_2.5.py (Main Application - Refactored with External System Prompt)
-
-import os
-import sys
-import logging
-from dotenv import load_dotenv
-import google.generativeai as genai # Needed for safety types
-from google.generativeai.types import HarmCategory, HarmBlockThreshold # Explicit import for safety settings
-
-# Import the Coordinator and Modules
-from acrea_coordinator import AcreaCoordinator
-from chat_module import ChatModule
-from vector_memory_module import VectorMemoryModule
-from embedding_module import EmbeddingModule # Import the placeholder
-from system_prompt_module import ACREA_SYSTEM_PROMPT # <-- Import the prompt
-
-# --- Basic Logging Setup ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger("AcreaMainApp")
-
-# --- Load Environment Variables ---
-load_dotenv()
-logger.info("Loaded environment variables from .env")
-
-# --- Configuration Keys ---
-GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
-VDB_API_ENDPOINT_ENV = "VDB_API_ENDPOINT"
-VDB_INDEX_ENDPOINT_ENV = "VDB_INDEX_ENDPOINT_RESOURCE_NAME"
-VDB_DEPLOYED_INDEX_ID_ENV = "VDB_DEPLOYED_INDEX_ID"
-# Add other keys as needed
-
-# --- Gemini/Chat Configuration ---
-ACREA_MODEL_NAME = "gemini-2.5-pro-exp-03-25" # Or "gemini-1.5-flash-latest"
-# !!! ACREA_SYSTEM_PROMPT definition is REMOVED from here !!!
-
-# Define Generation Config and Safety Settings here as they are parameters for ChatModule init
-DEFAULT_GENERATION_CONFIG = {
-    "temperature": 0.8,
-    "top_p": 0.95,
-    "top_k": 64,
-    "max_output_tokens": 8192
-}
-# Ensure HarmCategory and HarmBlockThreshold are available or imported
-DEFAULT_SAFETY_SETTINGS = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-}
-
-# --- Main Application Logic ---
-
-def initialize_modules_and_coordinator():
-    """Loads config, initializes coordinator and all functional modules, and registers them."""
-    logger.info("Initializing Acrea Coordinator and Modules...")
-
-    # 1. Load and Validate Configuration
-    config = {
-        GEMINI_API_KEY_ENV: os.environ.get(GEMINI_API_KEY_ENV),
-        VDB_API_ENDPOINT_ENV: os.environ.get(VDB_API_ENDPOINT_ENV),
-        VDB_INDEX_ENDPOINT_ENV: os.environ.get(VDB_INDEX_ENDPOINT_ENV),
-        VDB_DEPLOYED_INDEX_ID_ENV: os.environ.get(VDB_DEPLOYED_INDEX_ID_ENV),
-        # Add other config values here
-    }
-
-    required_keys = [
-        GEMINI_API_KEY_ENV, VDB_API_ENDPOINT_ENV,
-        VDB_INDEX_ENDPOINT_ENV, VDB_DEPLOYED_INDEX_ID_ENV
-    ]
-    missing_keys = [key for key in required_keys if not config.get(key)]
-    if missing_keys:
-        raise ValueError(f"Missing required configuration: {', '.join(missing_keys)}")
-    logger.info("Configuration validated.")
-
-    # 2. Instantiate Coordinator
-    coordinator = AcreaCoordinator()
-
-    # 3. Instantiate and Register Modules
-    try:
-        # Chat Module - Uses imported prompt
-        chat_module = ChatModule(
-            api_key=config[GEMINI_API_KEY_ENV],
-            model_name=ACREA_MODEL_NAME,
-            system_instruction=ACREA_SYSTEM_PROMPT, # <-- Use imported prompt
-            generation_config=DEFAULT_GENERATION_CONFIG,
-            safety_settings=DEFAULT_SAFETY_SETTINGS
-        )
-        coordinator.register_module("chat", chat_module)
-
-        # Vector Memory Module
-        vector_memory_module = VectorMemoryModule(
-            api_endpoint=config[VDB_API_ENDPOINT_ENV],
-            index_endpoint_name=config[VDB_INDEX_ENDPOINT_ENV],
-            deployed_index_id=config[VDB_DEPLOYED_INDEX_ID_ENV]
-        )
-        coordinator.register_module("vector_memory", vector_memory_module)
-
-        # Embedding Module (Placeholder)
-        embedding_module = EmbeddingModule() # Add config if needed later
-        coordinator.register_module("embedding", embedding_module)
-
-        # Register other modules here
-        # e.g., tts_module = TextToSpeechModule(...)
-        # coordinator.register_module("tts", tts_module)
-
-    except Exception as e:
-        logger.error(f"Failed to initialize one or more modules: {e}", exc_info=True)
-        raise # Re-raise critical initialization errors
-
-    logger.info("Coordinator and modules initialized and registered.")
-    return coordinator
-
-def run_interaction_loop(coordinator: AcreaCoordinator):
-    """Runs the main interactive CLI loop, orchestrating via the coordinator."""
-    print("\n--- Acrea AI Architecture Assistant (Mediator Architecture) ---")
-    print(f"Chat Model: {ACREA_MODEL_NAME}")
-    print("Type 'quit' or 'exit' to end.")
-    print("-" * 60)
-
-    while True:
-        try:
-            user_input = input("You: ")
-            if user_input.lower() in ["quit", "exit"]:
-                print("\nAcrea: Goodbye! Architecting the future awaits.")
-                break
-            if not user_input.strip():
-                continue
-
-            print("Acrea: ...thinking...") # Indicate processing
-
-            # --- RAG Orchestration ---
-            retrieved_context_str = None
-            try:
-                # 1. Get Embedding (via Coordinator)
-                embedding_message = {
-                    "target_module": "embedding",
-                    "action": "generate_embedding",
-                    "payload": {"text": user_input}
-                }
-                query_vector = coordinator.route_message(embedding_message)
-
-                if query_vector:
-                    logger.info("Received query vector from embedding module.")
-                    # 2. Search Vector Memory (via Coordinator)
-                    search_message = {
-                        "target_module": "vector_memory",
-                        "action": "find_neighbors",
-                        "payload": {"query_vector": query_vector, "num_neighbors": 3}
-                    }
-                    neighbors = coordinator.route_message(search_message)
-
-                    if neighbors:
-                        logger.info(f"Retrieved {len(neighbors)} neighbors from vector memory.")
-                        # --- CONTEXT FORMATTING NEEDED ---
-                        formatted_neighbors = [f"ID: {n['id']} (Dist: {n['distance']:.4f})" for n in neighbors]
-                        retrieved_context_str = "Found potentially relevant items:\n" + "\n".join(formatted_neighbors)
-                        # --- END CONTEXT FORMATTING ---
-                    else:
-                        logger.info("No neighbors found in vector memory.")
-                else:
-                    logger.info("Skipping vector memory search (no query vector).")
-
-            except KeyError as ke:
-                 logger.error(f"RAG orchestration failed: Required module not found. {ke}")
-            except Exception as rag_e:
-                 logger.error(f"Error during RAG processing: {rag_e}", exc_info=True)
-
-            # 3. Generate Final Response (via Coordinator)
-            chat_message = {
-                "target_module": "chat",
-                "action": "generate_response",
-                "payload": {
-                    "prompt": user_input,
-                    "context": retrieved_context_str # Pass formatted context (or None)
-                }
-            }
-            ai_response = coordinator.route_message(chat_message)
-
-            # Handle potential errors from chat module
-            if ai_response is None:
-                ai_response = "Sorry, I encountered an issue generating a response."
-
-            # Clear "thinking" line and print response
-            print(f"\rAcrea: {ai_response}    ") # \r + spaces to clear line
-
-        except KeyboardInterrupt:
-            print("\n\nAcrea: Session interrupted. Goodbye!")
-            break
-        except Exception as e:
-            logger.error(f"\n[Error]: An unexpected error occurred in the main loop: {e}", exc_info=True)
-            print("\nAn critical error occurred. Please check the logs.")
-
-# --- Script Entry Point ---
-if __name__ == "__main__":
-    try:
-        acrea_coordinator = initialize_modules_and_coordinator()
-        run_interaction_loop(acrea_coordinator)
-    except Exception as init_error:
-        logger.critical(f"Failed to initialize Acrea: {init_error}", exc_info=True)
-        print("\nFATAL: Acrea could not start due to an initialization error. Check logs.", file=sys.stderr)
+# gemini_2.5.py (Main Application - Refactored with External System Prompt)
+
+from startup_report import STARTUP, import_module # First import, so the startup report covers the rest
+import os
+import sys
+import logging
+from dotenv import load_dotenv
+
+# Import the Coordinator (modules and the Google SDKs are imported by their factories on first use)
+from acrea_coordinator import AcreaCoordinator
+from system_prompt_module import ACREA_SYSTEM_PROMPT # <-- Import the prompt
+
+# --- Basic Logging Setup ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("AcreaMainApp")
+
+# --- Load Environment Variables ---
+load_dotenv()
+logger.info("Loaded environment variables from .env")
+
+# --- Configuration Keys ---
+GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
+VDB_API_ENDPOINT_ENV = "VDB_API_ENDPOINT"
+VDB_INDEX_ENDPOINT_ENV = "VDB_INDEX_ENDPOINT_RESOURCE_NAME"
+VDB_DEPLOYED_INDEX_ID_ENV = "VDB_DEPLOYED_INDEX_ID"
+VECTOR_BACKEND_ENV = "VECTOR_BACKEND" # "vertex" (default) or "local"
+LOCAL_INDEX_PATH_ENV = "LOCAL_INDEX_PATH"
+DEFAULT_LOCAL_INDEX_PATH = "local_vector_index.npz"
+CONTENT_STORE_DIR_ENV = "CONTENT_STORE_DIR"
+DEFAULT_CONTENT_STORE_DIR = "content_store"
+# Add other keys as needed
+
+# --- Gemini/Chat Configuration ---
+ACREA_MODEL_NAME = "gemini-2.5-pro-exp-03-25" # Or "gemini-1.5-flash-latest"
+# !!! ACREA_SYSTEM_PROMPT definition is REMOVED from here !!!
+
+# Define Generation Config and Safety Settings here as they are parameters for ChatModule init
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.8,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192
+}
+# The SDK accepts enum names, so defining these does not import it
+DEFAULT_SAFETY_SETTINGS = {
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_MEDIUM_AND_ABOVE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_MEDIUM_AND_ABOVE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_MEDIUM_AND_ABOVE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_MEDIUM_AND_ABOVE",
+}
+
+# --- Main Application Logic ---
+
+def initialize_modules_and_coordinator():
+    """
+    Loads config, initializes the coordinator and registers all functional modules as factories:
+    each is imported and built on first use (or by the background warm-up).
+    """
+    logger.info("Initializing Acrea Coordinator and Modules...")
+
+    # 1. Load and Validate Configuration
+    config = {
+        GEMINI_API_KEY_ENV: os.environ.get(GEMINI_API_KEY_ENV),
+        VDB_API_ENDPOINT_ENV: os.environ.get(VDB_API_ENDPOINT_ENV),
+        VDB_INDEX_ENDPOINT_ENV: os.environ.get(VDB_INDEX_ENDPOINT_ENV),
+        VDB_DEPLOYED_INDEX_ID_ENV: os.environ.get(VDB_DEPLOYED_INDEX_ID_ENV),
+        # Add other config values here
+    }
+
+    use_local_index = os.environ.get(VECTOR_BACKEND_ENV, "vertex").lower() == "local"
+    required_keys = [GEMINI_API_KEY_ENV]
+    if not use_local_index:
+        required_keys += [VDB_API_ENDPOINT_ENV, VDB_INDEX_ENDPOINT_ENV, VDB_DEPLOYED_INDEX_ID_ENV]
+    missing_keys = [key for key in required_keys if not config.get(key)]
+    if missing_keys:
+        raise ValueError(f"Missing required configuration: {', '.join(missing_keys)}")
+    logger.info("Configuration validated.")
+
+    # 2. Instantiate Coordinator
+    coordinator = AcreaCoordinator()
+
+    # 3. Register Module Factories
+    def build_chat_module():
+        # Chat Module - Uses imported prompt; its response cache embeds prompts with the embedding module
+        return import_module("chat_module").ChatModule(
+            api_key=config[GEMINI_API_KEY_ENV],
+            model_name=ACREA_MODEL_NAME,
+            system_instruction=ACREA_SYSTEM_PROMPT, # <-- Use imported prompt
+            generation_config=DEFAULT_GENERATION_CONFIG,
+            safety_settings=DEFAULT_SAFETY_SETTINGS,
+            embed_prompt=lambda text: coordinator.get_module("embedding").embed_query(text)
+        )
+
+    def build_vector_memory_module():
+        # Vertex AI Vector Search, or an in-process index when VECTOR_BACKEND=local
+        VectorMemoryModule = import_module("vector_memory_module").VectorMemoryModule
+        if use_local_index:
+            return VectorMemoryModule.with_local_index(
+                os.environ.get(LOCAL_INDEX_PATH_ENV, DEFAULT_LOCAL_INDEX_PATH)
+            )
+        return VectorMemoryModule(
+            api_endpoint=config[VDB_API_ENDPOINT_ENV],
+            index_endpoint_name=config[VDB_INDEX_ENDPOINT_ENV],
+            deployed_index_id=config[VDB_DEPLOYED_INDEX_ID_ENV]
+        )
+
+    try:
+        coordinator.register_module("chat", factory=build_chat_module, max_workers=8)
+        coordinator.register_module("vector_memory", factory=build_vector_memory_module)
+
+        # Embedding Module (may be built before the chat module, so it configures the API key itself)
+        coordinator.register_module("embedding", factory=lambda: import_module("embedding_module").EmbeddingModule(
+            api_key=config[GEMINI_API_KEY_ENV]))
+
+        # Content Store (document text for retrieved neighbor IDs)
+        coordinator.register_module("content_store", factory=lambda: import_module("content_store").ContentStore(
+            os.environ.get(CONTENT_STORE_DIR_ENV, DEFAULT_CONTENT_STORE_DIR)))
+
+        # Register other modules here
+        # e.g., coordinator.register_module("tts", factory=lambda: import_module("tts_module").TTSModule(...))
+
+    except Exception as e:
+        logger.error(f"Failed to initialize one or more modules: {e}", exc_info=True)
+        raise # Re-raise critical initialization errors
+
+    logger.info("Coordinator and modules initialized and registered.")
+    return coordinator
+
+def run_interaction_loop(coordinator: AcreaCoordinator):
+    """Runs the main interactive CLI loop, orchestrating via the coordinator."""
+    print("\n--- Acrea AI Architecture Assistant (Mediator Architecture) ---")
+    print(f"Chat Model: {ACREA_MODEL_NAME}")
+    print("Type 'quit' or 'exit' to end.")
+    print("-" * 60)
+
+    while True:
+        try:
+            user_input = input("You: ")
+            if user_input.lower() in ["quit", "exit"]:
+                print("\nAcrea: Goodbye! Architecting the future awaits.")
+                break
+            if not user_input.strip():
+                continue
+
+            print("Acrea: ...thinking...") # Indicate processing
+
+            # --- RAG Orchestration ---
+            retrieved_context_str = None
+            query_vector = None
+            try:
+                # 1. Get Embedding (via Coordinator)
+                embedding_message = {
+                    "target_module": "embedding",
+                    "action": "generate_embedding",
+                    "payload": {"text": user_input}
+                }
+                query_vector = coordinator.route_message(embedding_message)
+
+                if query_vector:
+                    logger.info("Received query vector from embedding module.")
+                    # 2. Search Vector Memory (via Coordinator)
+                    search_message = {
+                        "target_module": "vector_memory",
+                        "action": "find_neighbors",
+                        "payload": {"query_vector": query_vector, "num_neighbors": 3}
+                    }
+                    neighbors = coordinator.route_message(search_message)
+
+                    if neighbors:
+                        logger.info(f"Retrieved {len(neighbors)} neighbors from vector memory.")
+                        # 3. Fetch the document text for the neighbor IDs (via Coordinator)
+                        fetch_message = {
+                            "target_module": "content_store",
+                            "action": "get_many",
+                            "payload": {"ids": [n['id'] for n in neighbors]}
+                        }
+                        fetched_texts_map = coordinator.route_message(fetch_message) or {}
+                        context_pieces = [
+                            f"Source ID: {n['id']}\nContent: {fetched_texts_map[n['id']]}\n---"
+                            for n in neighbors if n['id'] in fetched_texts_map
+                        ]
+                        if context_pieces:
+                            retrieved_context_str = "Found potentially relevant information:\n\n" + "\n".join(context_pieces)
+                        else:
+                            logger.info("No stored content for the retrieved neighbor IDs.")
+                    else:
+                        logger.info("No neighbors found in vector memory.")
+                else:
+                    logger.info("Skipping vector memory search (no query vector).")
+
+            except KeyError as ke:
+                 logger.error(f"RAG orchestration failed: Required module not found. {ke}")
+            except Exception as rag_e:
+                 logger.error(f"Error during RAG processing: {rag_e}", exc_info=True)
+
+            # 3. Generate Final Response (via Coordinator)
+            chat_message = {
+                "target_module": "chat",
+                "action": "generate_response",
+                "payload": {
+                    "prompt": user_input,
+                    "context": retrieved_context_str, # Pass formatted context (or None)
+                    "prompt_embedding": query_vector or None # Reused by the response cache instead of embedding again
+                }
+            }
+            ai_response = coordinator.route_message(chat_message)
+
+            # Handle potential errors from chat module
+            if ai_response is None:
+                ai_response = "Sorry, I encountered an issue generating a response."
+
+            # Clear "thinking" line and print response
+            print(f"\rAcrea: {ai_response}    ") # \r + spaces to clear line
+
+        except KeyboardInterrupt:
+            print("\n\nAcrea: Session interrupted. Goodbye!")
+            break
+        except Exception as e:
+            logger.error(f"\n[Error]: An unexpected error occurred in the main loop: {e}", exc_info=True)
+            print("\nAn critical error occurred. Please check the logs.")
+
+# --- Script Entry Point ---
+if __name__ == "__main__":
+    try:
+        acrea_coordinator = initialize_modules_and_coordinator()
+        # Build the modules and open their connections while the user types the first question
+        acrea_coordinator.submit(acrea_coordinator.warm_up_async()).add_done_callback(lambda _: STARTUP.log(logger))
+        STARTUP.mark("prompt shown")
+        run_interaction_loop(acrea_coordinator)
+        acrea_coordinator.shutdown() # Persists chat sessions and closes the content store
+    except Exception as init_error:
+        logger.critical(f"Failed to initialize Acrea: {init_error}", exc_info=True)
+        print("\nFATAL: Acrea could not start due to an initialization error. Check logs.", file=sys.stderr)
         sys.exit(1) # Exit if initialization fails
\ No newline at end of file
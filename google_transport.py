@@ -0,0 +1,118 @@
+# google_transport.py
+
+import itertools
+import logging
+import threading
+import time
+
+# Keep idle connections open so the first request after a quiet period does not pay for a new handshake
+KEEPALIVE_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+]
+
+DEFAULT_POOL_SIZE = 2
+
+logger = logging.getLogger("GoogleTransport")
+
+
+class ClientPool:
+    """
+    Round-robin pool of Google API clients, each bound to its own persistent gRPC channel.
+
+    One pool is shared per (client class, endpoint) across the process, so every module
+    talking to the same endpoint reuses the same warm connections; a module asking for more
+    channels grows the shared pool in place. A single HTTP/2 channel multiplexes many calls;
+    extra channels only help past its concurrent-stream limit.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, client_class, transport_class, api_endpoint: str, size: int = DEFAULT_POOL_SIZE,
+                 client_options: dict = None, channel_options: list = None):
+        """
+        Args:
+            client_class: GAPIC client class (e.g. aiplatform_v1.MatchServiceClient).
+            transport_class: Matching gRPC transport class (e.g. MatchServiceGrpcTransport).
+            api_endpoint: Host name of the service, with or without a port.
+            size: Number of channels/clients in the pool.
+            client_options: Passed through to each client.
+            channel_options: gRPC channel options. Defaults to KEEPALIVE_CHANNEL_OPTIONS.
+        """
+        self.api_endpoint = api_endpoint
+        self.client_class = client_class
+        self.transport_class = transport_class
+        self.client_options = client_options
+        self.host = api_endpoint if ":" in api_endpoint else f"{api_endpoint}:443"
+        self.channel_options = channel_options if channel_options is not None else KEEPALIVE_CHANNEL_OPTIONS
+
+        self.channels = []
+        self.clients = []
+        self.size = 0
+        self._grow_lock = threading.Lock()
+        self._next = itertools.count()
+        self.grow(size)
+        logger.info(f"Created pool of {self.size} gRPC channel(s) for {self.host} ({client_class.__name__}).")
+
+    def grow(self, size: int):
+        """Adds channels/clients until the pool has `size` of them (never shrinks). Thread-safe."""
+        with self._grow_lock:
+            quota_project_id = (self.client_options or {}).get("quota_project_id")
+            while len(self.clients) < max(1, size):
+                # create_channel resolves Application Default Credentials and scopes like the client would
+                channel = self.transport_class.create_channel(self.host, quota_project_id=quota_project_id, options=self.channel_options)
+                transport = self.transport_class(host=self.host, channel=channel)
+                self.channels.append(channel)
+                self.clients.append(self.client_class(transport=transport, client_options=self.client_options))
+            self.size = len(self.clients) # Set last, so get() never indexes past the lists
+
+    @classmethod
+    def shared(cls, client_class, transport_class, api_endpoint: str, size: int = DEFAULT_POOL_SIZE, **kwargs) -> "ClientPool":
+        """
+        Returns the process-wide pool for this client class and endpoint, creating it on first use.
+        An existing pool smaller than `size` is grown, so modules already holding it keep working
+        and no channel is left open unused.
+        """
+        key = (client_class.__module__, client_class.__qualname__, api_endpoint)
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None:
+                pool = cls(client_class, transport_class, api_endpoint, size=size, **kwargs)
+                cls._shared[key] = pool
+            elif pool.size < size:
+                logger.info(f"Growing pool for {pool.host} from {pool.size} to {size} gRPC channel(s).")
+                pool.grow(size)
+            return pool
+
+    def get(self):
+        """Returns the next client in round-robin order (thread-safe)."""
+        return self.clients[next(self._next) % self.size]
+
+    def warm_up(self, cheap_call: callable = None, timeout: float = 10.0) -> float:
+        """
+        Connects every channel (DNS, TCP, TLS, HTTP/2) and optionally sends one cheap call per
+        client so credentials are fetched too. Failures are logged, never raised.
+
+        Args:
+            cheap_call: Callable taking a client, e.g. lambda c: c.list_voices(language_code="en-US").
+            timeout: Seconds to wait for each channel to become ready.
+
+        Returns:
+            Elapsed seconds.
+        """
+        import grpc # Deferred: only needed once a pool exists
+        start = time.perf_counter()
+        for channel, client in zip(self.channels, self.clients):
+            try:
+                grpc.channel_ready_future(channel).result(timeout=timeout)
+                if cheap_call:
+                    cheap_call(client)
+            except Exception as e:
+                logger.warning(f"Warm-up of a channel to {self.api_endpoint} failed: {e}")
+        elapsed = time.perf_counter() - start
+        logger.info(f"Warmed up {self.size} channel(s) to {self.api_endpoint} in {elapsed * 1000:.0f} ms.")
+        return elapsed
\ No newline at end of file
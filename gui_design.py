@@ -1,128 +1,280 @@
-# gui_design.py
-
-import tkinter as tk
-from tkinter import scrolledtext, font
-
-class AcreaGUI:
-    """
-    Defines the visual structure and widgets for the Acrea Tkinter GUI.
-    Layout and basic styling are handled here.
-    Interaction logic is delegated via callbacks.
-    """
-    def __init__(self, master: tk.Tk, send_callback: callable):
-        """
-        Initializes the GUI layout.
-
-        Args:
-            master: The root Tkinter window.
-            send_callback: A function to call when the user clicks 'Send'.
-                           This function should accept the user's input string
-                           as its argument.
-        """
-        self.master = master
-        self.send_callback = send_callback
-        master.title("Acrea - AI Architecture Assistant")
-        master.geometry("800x600") # Default size
-
-        # Configure styles (optional, can be expanded)
-        default_font = font.nametofont("TkDefaultFont")
-        default_font.configure(size=11)
-        text_font = font.Font(family="Consolas", size=10) # Monospaced for output maybe
-
-        # --- Main Frame ---
-        main_frame = tk.Frame(master, padx=10, pady=10)
-        main_frame.pack(fill=tk.BOTH, expand=True)
-
-        # --- Output Area ---
-        output_label = tk.Label(main_frame, text="Conversation:", anchor="w")
-        output_label.pack(fill=tk.X)
-
-        self.output_text = scrolledtext.ScrolledText(
-            main_frame,
-            wrap=tk.WORD,
-            state="disabled", # Start as read-only
-            height=20,
-            font=text_font,
-            bg="#f0f0f0", # Lighter background
-            relief=tk.SOLID,
-            bd=1
-        )
-        self.output_text.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-
-        # --- Input Area ---
-        input_label = tk.Label(main_frame, text="Your Message:", anchor="w")
-        input_label.pack(fill=tk.X)
-
-        self.input_text = tk.Text(
-            main_frame,
-            height=5,
-            font=default_font,
-            relief=tk.SOLID,
-            bd=1
-        )
-        self.input_text.pack(fill=tk.X, pady=(0, 10))
-        # Bind Enter key to send message as well
-        self.input_text.bind("<Return>", self._on_send)
-        self.input_text.bind("<Shift-Return>", self._insert_newline) # Allow Shift+Enter for newlines
-
-        # --- Send Button ---
-        self.send_button = tk.Button(
-            main_frame,
-            text="Send",
-            command=self._on_send,
-            width=10,
-            relief=tk.RAISED,
-            bd=2
-        )
-        self.send_button.pack(anchor="e")
-
-        # Set focus to input box on start
-        self.input_text.focus_set()
-
-
-    def _on_send(self, event=None):
-        """Internal handler for when the Send button or Enter key is pressed."""
-        user_input = self.input_text.get("1.0", tk.END).strip()
-        if user_input:
-            # Call the callback function provided during initialization
-            self.send_callback(user_input)
-            # Don't clear input here, let the callback decide if needed after processing
-        return "break" # Prevents default Enter key behavior (like adding a newline)
-
-    def _insert_newline(self, event=None):
-         """Allows Shift+Enter to insert a newline in the input."""
-         self.input_text.insert(tk.INSERT, '\n')
-         return "break" # Stop the event from propagating further
-
-
-    def display_message(self, role: str, message: str):
-        """
-        Appends a message to the output text area.
-
-        Args:
-            role: Typically "You" or "Acrea".
-            message: The text content to display.
-        """
-        self.output_text.config(state="normal") # Enable writing
-        if self.output_text.index('end-1c') != "1.0": # Add newline if not empty
-             self.output_text.insert(tk.END, "\n\n")
-        self.output_text.insert(tk.END, f"{role}: {message}")
-        self.output_text.see(tk.END) # Scroll to the end
-        self.output_text.config(state="disabled") # Disable writing again
-
-    def set_thinking_status(self, thinking: bool):
-         """Provides visual feedback while Acrea is processing."""
-         if thinking:
-             self.display_message("Acrea", "...thinking...")
-             self.send_button.config(state="disabled")
-             self.input_text.config(state="disabled")
-         else:
-             # Remove "thinking..." (simple approach: clear and redisplay - better ways exist)
-             # Or just rely on the actual response overwriting/appending
-             self.send_button.config(state="normal")
-             self.input_text.config(state="normal")
-             self.input_text.focus_set() # Return focus
-
-    def clear_input(self):
-        """Clears the user input text area."""
+# gui_design.py
+
+import tkinter as tk
+from collections import deque
+from tkinter import scrolledtext, font
+
+DEFAULT_RENDER_INTERVAL_MS = 33 # Transcript pump period (~30 renders per second)
+DEFAULT_MAX_TRANSCRIPT_LINES = 5000 # Oldest lines beyond this are trimmed
+THINKING_PLACEHOLDER = "...thinking..."
+ASSISTANT_ROLE = "Acrea" # Messages of this role start a streamed reply (see append_to_last_message)
+# Keys that may reach the read-only transcript (navigation and selection)
+_NAVIGATION_KEYS = {"Left", "Right", "Up", "Down", "Home", "End", "Prior", "Next",
+                    "Shift_L", "Shift_R", "Control_L", "Control_R"}
+
+class AcreaGUI:
+    """
+    Defines the visual structure and widgets for the Acrea Tkinter GUI.
+    Layout and basic styling are handled here.
+    Interaction logic is delegated via callbacks.
+
+    The transcript is append-only: display_message and append_to_last_message only queue text
+    (they are safe to call from any thread), and a `master.after` pump renders the queue every
+    `render_interval_ms`, coalescing streamed chunks into one insert. Lines beyond
+    `max_transcript_lines` are trimmed from the top.
+
+    Each ASSISTANT_ROLE message gets its own text mark, where its streamed chunks are inserted.
+    Other messages (e.g. one the user sends while a reply is still streaming) are added after
+    it without moving the mark, so the rest of the reply stays in its own message.
+    """
+    def __init__(self, master: tk.Tk, send_callback: callable, stop_callback: callable = None,
+                 render_interval_ms: int = DEFAULT_RENDER_INTERVAL_MS,
+                 max_transcript_lines: int = DEFAULT_MAX_TRANSCRIPT_LINES):
+        """
+        Initializes the GUI layout.
+
+        Args:
+            master: The root Tkinter window.
+            send_callback: A function to call when the user clicks 'Send'.
+                           This function should accept the user's input string
+                           as its argument.
+            stop_callback: A function (no arguments) to call when the user clicks 'Stop'.
+            render_interval_ms: Period of the transcript render pump.
+            max_transcript_lines: Transcript lines kept in the widget.
+        """
+        self.master = master
+        self.send_callback = send_callback
+        self.stop_callback = stop_callback
+        self.render_interval_ms = render_interval_ms
+        self.max_transcript_lines = max_transcript_lines
+        self._pending = deque() # Transcript operations waiting for the next render
+        self._placeholder_role = None # Role of the thinking placeholder while it is shown
+        self._stream_mark = None # Text mark at the end of the reply being streamed
+        self._stream_count = 0 # Numbers the stream marks
+        master.title("Acrea - AI Architecture Assistant")
+        master.geometry("800x600") # Default size
+
+        # Configure styles (optional, can be expanded)
+        default_font = font.nametofont("TkDefaultFont")
+        default_font.configure(size=11)
+        text_font = font.Font(family="Consolas", size=10) # Monospaced for output maybe
+
+        # --- Main Frame ---
+        main_frame = tk.Frame(master, padx=10, pady=10)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # --- Output Area ---
+        output_label = tk.Label(main_frame, text="Conversation:", anchor="w")
+        output_label.pack(fill=tk.X)
+
+        self.output_text = scrolledtext.ScrolledText(
+            main_frame,
+            wrap=tk.WORD,
+            # Stays editable for fast inserts; _block_edit keeps users from typing into it
+            height=20,
+            font=text_font,
+            bg="#f0f0f0", # Lighter background
+            relief=tk.SOLID,
+            bd=1
+        )
+        self.output_text.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        self.output_text.bind("<Key>", self._block_edit)
+        for sequence in ("<<Paste>>", "<<PasteSelection>>", "<<Cut>>", "<<Clear>>"):
+            self.output_text.bind(sequence, lambda event: "break")
+        self.output_text.tag_configure("thinking", foreground="#808080")
+
+        # --- Input Area ---
+        input_label = tk.Label(main_frame, text="Your Message:", anchor="w")
+        input_label.pack(fill=tk.X)
+
+        self.input_text = tk.Text(
+            main_frame,
+            height=5,
+            font=default_font,
+            relief=tk.SOLID,
+            bd=1
+        )
+        self.input_text.pack(fill=tk.X, pady=(0, 10))
+        # Bind Enter key to send message as well
+        self.input_text.bind("<Return>", self._on_send)
+        self.input_text.bind("<Shift-Return>", self._insert_newline) # Allow Shift+Enter for newlines
+
+        # --- Button Row: queue status, Stop and Send ---
+        button_frame = tk.Frame(main_frame)
+        button_frame.pack(fill=tk.X)
+        self.queue_label = tk.Label(button_frame, text="", anchor="w", fg="#606060")
+        self.queue_label.pack(side=tk.LEFT)
+        self.send_button = tk.Button(
+            button_frame,
+            text="Send",
+            command=self._on_send,
+            width=10,
+            relief=tk.RAISED,
+            bd=2
+        )
+        self.send_button.pack(side=tk.RIGHT)
+        self.stop_button = tk.Button(
+            button_frame,
+            text="Stop",
+            command=self._on_stop,
+            width=10,
+            relief=tk.RAISED,
+            bd=2,
+            state="disabled" # Enabled while a request is running
+        )
+        self.stop_button.pack(side=tk.RIGHT, padx=(0, 5))
+
+        # Set focus to input box on start
+        self.input_text.focus_set()
+
+        # Start the transcript render pump
+        self.master.after(self.render_interval_ms, self._pump)
+
+
+    def _on_send(self, event=None):
+        """Internal handler for when the Send button or Enter key is pressed."""
+        user_input = self.input_text.get("1.0", tk.END).strip()
+        if user_input:
+            # Call the callback function provided during initialization
+            self.send_callback(user_input)
+            # Don't clear input here, let the callback decide if needed after processing
+        return "break" # Prevents default Enter key behavior (like adding a newline)
+
+    def _on_stop(self):
+        """Internal handler for the Stop button."""
+        if self.stop_callback:
+            self.stop_callback()
+
+    def _insert_newline(self, event=None):
+         """Allows Shift+Enter to insert a newline in the input."""
+         self.input_text.insert(tk.INSERT, '\n')
+         return "break" # Stop the event from propagating further
+
+
+    def _block_edit(self, event):
+        """Keeps the transcript read-only for the user while allowing navigation and copy."""
+        if event.keysym in _NAVIGATION_KEYS or (event.state & 0x4 and event.keysym.lower() in ("c", "a")):
+            return None
+        return "break"
+
+    def display_message(self, role: str, message: str):
+        """
+        Queues a message for the transcript. An "Acrea" message takes the place of the
+        thinking placeholder if it is shown.
+
+        Args:
+            role: Typically "You" or "Acrea".
+            message: The text content to display.
+        """
+        self._pending.append(("message", role, message))
+
+    def append_to_last_message(self, chunk: str):
+        """
+        Queues a streamed text chunk for the end of the most recent ASSISTANT_ROLE message,
+        wherever later messages have been added. Call display_message(ASSISTANT_ROLE, "")
+        first to start the message.
+        """
+        self._pending.append(("chunk", chunk))
+
+    # --- Transcript rendering (Tk thread) ---
+    def _pump(self):
+        try:
+            self._render_pending()
+        finally:
+            self.master.after(self.render_interval_ms, self._pump)
+
+    def _render_pending(self):
+        if not self._pending:
+            return
+        chunks = [] # Consecutive chunks are inserted together
+        while self._pending:
+            operation = self._pending.popleft()
+            if operation[0] == "chunk":
+                chunks.append(operation[1])
+                continue
+            if chunks:
+                self._insert_chunks("".join(chunks))
+                chunks = []
+            if operation[0] == "message":
+                self._insert_message(operation[1], operation[2])
+            elif operation[0] == "thinking":
+                self._insert_message(operation[1], THINKING_PLACEHOLDER, placeholder=True)
+            elif operation[0] == "clear_thinking":
+                self._remove_placeholder()
+        if chunks:
+            self._insert_chunks("".join(chunks))
+        self._trim()
+        self.output_text.see(tk.END) # Scroll to the end
+
+    def _insert_chunks(self, text: str):
+        # Right gravity: the mark moves past each insert, so chunks stay in order
+        self.output_text.insert(self._stream_mark or "end-1c", text)
+
+    def _insert_message(self, role: str, message: str, placeholder: bool = False):
+        if self._stream_mark:
+            # Text added at the end must not push the streaming reply's mark along with it
+            self.output_text.mark_gravity(self._stream_mark, tk.LEFT)
+        try:
+            self._insert_message_text(role, message, placeholder)
+        finally:
+            if self._stream_mark:
+                self.output_text.mark_gravity(self._stream_mark, tk.RIGHT)
+
+    def _insert_message_text(self, role: str, message: str, placeholder: bool):
+        ranges = self.output_text.tag_ranges("thinking")
+        if ranges and role == self._placeholder_role and not placeholder:
+            # Replace the placeholder in place
+            start = self.output_text.index(ranges[0])
+            self.output_text.delete(ranges[0], ranges[1])
+            self._placeholder_role = None
+        else:
+            if self.output_text.index("end-1c") != "1.0": # Add newline if not empty
+                self.output_text.insert(tk.END, "\n\n")
+            start = self.output_text.index("end-1c")
+        text = f"{role}: {message}"
+        self.output_text.insert(start, text, ("thinking",) if placeholder else ())
+        if placeholder:
+            self._placeholder_role = role
+        elif role == ASSISTANT_ROLE:
+            # A new reply: later chunks go to the end of this message
+            if self._stream_mark:
+                self.output_text.mark_unset(self._stream_mark)
+            self._stream_count += 1
+            self._stream_mark = f"stream_end_{self._stream_count}"
+            self.output_text.mark_set(self._stream_mark, f"{start} + {len(text)} chars")
+            self.output_text.mark_gravity(self._stream_mark, tk.RIGHT)
+
+    def _remove_placeholder(self):
+        ranges = self.output_text.tag_ranges("thinking")
+        if ranges:
+            start = ranges[0]
+            if self.output_text.compare(start, "!=", "1.0"):
+                start = f"{start} - 2 chars" # The blank line before it
+            self.output_text.delete(start, ranges[1])
+        self._placeholder_role = None
+
+    def _trim(self):
+        lines = int(self.output_text.index("end-1c").split(".")[0])
+        excess = lines - self.max_transcript_lines
+        if excess > 0:
+            self.output_text.delete("1.0", f"{excess + 1}.0")
+
+    def set_thinking_status(self, thinking: bool):
+         """
+         Provides visual feedback while Acrea is processing a request. Input stays enabled so
+         the user can type ahead; new messages queue behind the current one.
+         """
+         # Placeholder replaced in place by Acrea's reply (or removed when thinking stops)
+         self._pending.append(("thinking", "Acrea") if thinking else ("clear_thinking",))
+
+    def set_queue_status(self, running: int, queued: int):
+         """Shows the request queue and enables Stop while a request runs (call from the Tk thread)."""
+         if running or queued:
+             self.queue_label.config(text=f"Working on {running} request(s), {queued} waiting")
+         else:
+             self.queue_label.config(text="")
+         self.stop_button.config(state="normal" if running else "disabled")
+
+    def clear_input(self):
+        """Clears the user input text area."""
         self.input_text.delete("1.0", tk.END)
\ No newline at end of file
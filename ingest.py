@@ -0,0 +1,418 @@
+# ingest.py
+
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import numpy as np
+
+# --- Basic Logging Setup ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("AcreaIngest")
+
+# --- Configuration Keys ---
+GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
+VDB_API_ENDPOINT_ENV = "VDB_API_ENDPOINT"
+VDB_INDEX_ENDPOINT_ENV = "VDB_INDEX_ENDPOINT_RESOURCE_NAME"
+VDB_DEPLOYED_INDEX_ID_ENV = "VDB_DEPLOYED_INDEX_ID"
+VDB_INDEX_RESOURCE_NAME_ENV = "VDB_INDEX_RESOURCE_NAME" # The Index itself, needed for upserts
+VECTOR_BACKEND_ENV = "VECTOR_BACKEND" # "vertex" (default) or "local"
+LOCAL_INDEX_PATH_ENV = "LOCAL_INDEX_PATH"
+DEFAULT_LOCAL_INDEX_PATH = "local_vector_index.npz"
+CONTENT_STORE_DIR_ENV = "CONTENT_STORE_DIR"
+DEFAULT_CONTENT_STORE_DIR = "content_store"
+
+# --- Pipeline Defaults ---
+DEFAULT_CHUNK_SIZE = 1500 # Characters per chunk
+DEFAULT_CHUNK_OVERLAP = 200 # Characters repeated at the start of the next chunk
+DEFAULT_EMBEDDING_WORKERS = 8 # Concurrent embedding requests
+DEFAULT_UPSERT_BATCH_SIZE = 1000 # Chunks written to the content store / index per flush
+DEFAULT_CHECKPOINT_INTERVAL = 30.0 # Seconds between checkpoints
+DEFAULT_INDEX_SAVE_INTERVAL = 300.0 # Seconds between saves of a local index (each rewrites the whole file)
+DEFAULT_EXTENSIONS = (".txt", ".md")
+READ_BLOCK_CHARS = 64 * 1024
+MAX_EMBEDDING_ATTEMPTS = 5
+DOCUMENT_TASK_TYPE = "RETRIEVAL_DOCUMENT"
+
+_DONE = object() # Sentinel closing a queue
+
+
+def iter_chunks(file, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP):
+    """
+    Yields overlapping text chunks from an open text file, reading it in blocks.
+
+    Chunks end on the last paragraph, line, sentence or word boundary in the second half
+    of the window; whitespace-only chunks are skipped.
+    """
+    overlap = min(overlap, chunk_size // 4)
+    buffer = ""
+    while True:
+        block = file.read(READ_BLOCK_CHARS)
+        buffer += block
+        while len(buffer) > chunk_size:
+            cut = _split_point(buffer, chunk_size)
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield chunk
+            # Restart a little before the cut (on a word boundary) so context spans chunks
+            start = buffer.find(" ", cut - overlap, cut) + 1 or cut - overlap
+            buffer = buffer[start:]
+        if not block:
+            if buffer.strip():
+                yield buffer.strip()
+            return
+
+
+def _split_point(text: str, chunk_size: int) -> int:
+    for separator in ("\n\n", "\n", ". ", " "):
+        i = text.rfind(separator, chunk_size // 2, chunk_size)
+        if i != -1:
+            return i + len(separator)
+    return chunk_size
+
+
+def document_id(file_path: str) -> str:
+    """Chunk ID prefix of a file: its absolute path with '/' separators, unique across ingested roots."""
+    return os.path.abspath(file_path).replace(os.sep, "/")
+
+
+def iter_files(paths: list[str], extensions=DEFAULT_EXTENSIONS):
+    """Yields (absolute path, document id prefix) for every matching file, in a stable order."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield os.path.abspath(path), document_id(path)
+            continue
+        for directory, subdirectories, names in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(names):
+                if name.lower().endswith(tuple(extensions)):
+                    file_path = os.path.join(directory, name)
+                    yield os.path.abspath(file_path), document_id(file_path)
+
+
+class IngestionPipeline:
+    """
+    Streams files into the content store and the vector index.
+
+    A reader thread chunks files into batches, a pool of worker threads embeds them
+    (several requests in flight, so the embedding quota is the limit), and the calling
+    thread writes text and vectors in bulk. Bounded queues between the stages provide
+    backpressure, so memory stays flat however large the corpus is.
+
+    Chunk IDs are '<absolute path>#<n>' (see document_id), so files with the same name
+    under different roots never overwrite each other.
+
+    Progress is checkpointed per file (path, size, mtime, chunk count, id prefix). A re-run skips
+    unchanged files that were fully written; partially written files are re-ingested,
+    which is safe because upserts and content writes replace by ID. With a local index, a
+    file only enters the checkpoint once an index save covers its vectors.
+    """
+    def __init__(self, embedding_module, content_store, vector_memory_module, checkpoint_path: str,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+                 embedding_workers: int = DEFAULT_EMBEDDING_WORKERS, embedding_batch_size: int = 100,
+                 upsert_batch_size: int = DEFAULT_UPSERT_BATCH_SIZE,
+                 checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                 index_save_interval: float = DEFAULT_INDEX_SAVE_INTERVAL):
+        """
+        Args:
+            embedding_module: EmbeddingModule used for the document embeddings.
+            content_store: ContentStore receiving the chunk texts.
+            vector_memory_module: VectorMemoryModule whose backend supports upsert_datapoints.
+            checkpoint_path: JSON file recording fully ingested files.
+            chunk_size, chunk_overlap: Chunking window in characters.
+            embedding_workers: Embedding requests kept in flight.
+            embedding_batch_size: Chunks per embedding request.
+            upsert_batch_size: Chunks per content store / index write.
+            checkpoint_interval: Minimum seconds between checkpoints (one is always written at the end).
+            index_save_interval: Minimum seconds between saves of a local index, and only once it has
+                                 changed (it is always saved at the end). Files finished in between
+                                 wait for the next save before they are checkpointed.
+        """
+        self.embedding_module = embedding_module
+        self.content_store = content_store
+        self.vector_memory = vector_memory_module
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedding_workers = max(1, embedding_workers)
+        self.embedding_batch_size = embedding_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.checkpoint_interval = checkpoint_interval
+        self.index_save_interval = index_save_interval
+        self._stop = threading.Event()
+        self._writer_gone = threading.Event() # Set when the writer aborts: nothing drains the result queue any more
+        self._error = None # Set by the reader if it fails
+        self._files = self._load_checkpoint()
+        self._saved_files = dict(self._files) # Files whose vectors are in the last saved index
+        self._index_dirty = False # Rows upserted or removed since the index was last saved
+        self._last_index_save = time.monotonic()
+
+    # --- Checkpoint ---
+    def _load_checkpoint(self) -> dict:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+        logger.info(f"Resuming from checkpoint '{self.checkpoint_path}' ({len(files)} files done).")
+        return files
+
+    def _save_checkpoint(self, save_index: bool = False):
+        """Writes the checkpoint; with a local index, saves it first when due (or when save_index is set)."""
+        if not hasattr(self.vector_memory.client, "save"):
+            self._saved_files = dict(self._files) # Remote upserts are durable once acknowledged
+        elif not self._index_dirty:
+            self._saved_files = dict(self._files)
+        elif save_index or time.monotonic() - self._last_index_save >= self.index_save_interval:
+            # A local index must be on disk before the checkpoint claims its files are done
+            if not self.vector_memory.handle_message("save_index", {}):
+                raise RuntimeError("Saving the vector index failed; checkpoint not written.")
+            self._saved_files = dict(self._files)
+            self._index_dirty = False
+            self._last_index_save = time.monotonic()
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self._saved_files}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    # --- Stages ---
+    def _put(self, target: queue.Queue, item, stop: threading.Event = None):
+        """Blocking put that gives up once the pipeline is stopping (or once `stop` is set, when given)."""
+        stop = stop or self._stop
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read(self, paths: list[str], extensions, embed_queue: queue.Queue, result_queue: queue.Queue):
+        """Reader stage: chunks changed files into embedding batches."""
+        batch = []
+        try:
+            for file_path, doc_prefix in iter_files(paths, extensions):
+                if self._stop.is_set():
+                    break
+                stat = os.stat(file_path)
+                signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+                previous = self._files.get(file_path)
+                if previous and all(previous.get(k) == v for k, v in signature.items()):
+                    continue
+                chunk_count = 0
+                with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                    for chunk in iter_chunks(f, self.chunk_size, self.chunk_overlap):
+                        batch.append((file_path, f"{doc_prefix}#{chunk_count}", chunk))
+                        chunk_count += 1
+                        if len(batch) >= self.embedding_batch_size:
+                            if not self._put(embed_queue, batch):
+                                return
+                            batch = []
+                # The writer marks the file done once this many chunks are written
+                previous = previous or {}
+                if previous.get("id_prefix", doc_prefix) != doc_prefix:
+                    stale_ids = [f"{previous['id_prefix']}#{i}" for i in range(previous.get("chunks", 0))]
+                else:
+                    stale_ids = [f"{doc_prefix}#{i}" for i in range(chunk_count, previous.get("chunks", 0))]
+                entry = dict(signature, chunks=chunk_count, id_prefix=doc_prefix)
+                if not self._put(result_queue, ("file", file_path, entry, stale_ids)):
+                    return
+            if batch:
+                self._put(embed_queue, batch)
+        except Exception as e:
+            logger.error(f"Reader failed: {e}", exc_info=True)
+            self._error = e
+            self._stop.set()
+        finally:
+            for _ in range(self.embedding_workers):
+                self._put(embed_queue, _DONE)
+
+    def _embed(self, embed_queue: queue.Queue, result_queue: queue.Queue):
+        """Worker stage: embeds batches, retrying with backoff (quota errors are expected at full speed)."""
+        try:
+            while not self._stop.is_set():
+                try:
+                    batch = embed_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if batch is _DONE:
+                    return
+                texts = [text for _, _, text in batch]
+                for attempt in range(1, MAX_EMBEDDING_ATTEMPTS + 1):
+                    try:
+                        vectors = np.asarray(self.embedding_module.embed_texts(texts, DOCUMENT_TASK_TYPE), dtype=np.float32)
+                        item = ("vectors", batch, vectors)
+                        break
+                    except Exception as e:
+                        if attempt == MAX_EMBEDDING_ATTEMPTS:
+                            logger.error(f"Embedding a batch of {len(batch)} chunks failed: {e}")
+                            item = ("failed", batch, None)
+                        else:
+                            delay = min(2 ** attempt, 60)
+                            logger.warning(f"Embedding request failed (attempt {attempt}), retrying in {delay}s: {e}")
+                            time.sleep(delay)
+                if not self._put(result_queue, item):
+                    return
+        finally:
+            # The writer keeps draining until every worker has reported, even while stopping; unless it aborted
+            self._put(result_queue, _DONE, stop=self._writer_gone)
+
+    def run(self, paths: list[str], extensions=DEFAULT_EXTENSIONS) -> dict:
+        """
+        Ingests every matching file under `paths` and blocks until done.
+
+        Returns:
+            Counts: {'files', 'chunks', 'failed_chunks', 'seconds'}.
+        """
+        embed_queue = queue.Queue(maxsize=self.embedding_workers * 2)
+        result_queue = queue.Queue(maxsize=self.embedding_workers * 2)
+        threads = [threading.Thread(target=self._read, args=(paths, extensions, embed_queue, result_queue),
+                                    name="acrea-ingest-reader", daemon=True)]
+        threads += [threading.Thread(target=self._embed, args=(embed_queue, result_queue),
+                                     name=f"acrea-ingest-embed-{i}", daemon=True) for i in range(self.embedding_workers)]
+        for thread in threads:
+            thread.start()
+
+        start = time.perf_counter()
+        pending_files, pending_ids, pending_texts, pending_vectors = [], [], [], []
+        expected = {} # file -> (checkpoint entry, stale ids) once the reader has finished it
+        written = {} # file -> chunks written so far
+        failed_files = set()
+        stats = {"files": 0, "chunks": 0, "failed_chunks": 0}
+        last_checkpoint = time.monotonic()
+        open_workers = self.embedding_workers
+
+        def flush(final: bool = False):
+            nonlocal pending_files, pending_ids, pending_texts, pending_vectors, last_checkpoint
+            if pending_ids:
+                self.content_store.put_many(zip(pending_ids, pending_texts))
+                upserted = self.vector_memory.handle_message(
+                    "upsert_datapoints", {"ids": pending_ids, "vectors": np.concatenate(pending_vectors)})
+                self._index_dirty = True
+                if upserted is None:
+                    raise RuntimeError("Vector upsert failed; see the VectorMemoryModule log.")
+                stats["chunks"] += len(pending_ids)
+                for file_path in pending_files:
+                    written[file_path] = written.get(file_path, 0) + 1
+                pending_files, pending_ids, pending_texts, pending_vectors = [], [], [], []
+            # Files whose chunks are all written (and none failed) are done
+            for file_path, (entry, stale_ids) in list(expected.items()):
+                if written.get(file_path, 0) == entry["chunks"] and file_path not in failed_files:
+                    if stale_ids:
+                        self.vector_memory.handle_message("remove_datapoints", {"ids": stale_ids})
+                        self._index_dirty = True
+                    self._files[file_path] = entry
+                    stats["files"] += 1
+                    del expected[file_path]
+            if final or time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                self._save_checkpoint(save_index=final)
+                last_checkpoint = time.monotonic()
+                elapsed = time.perf_counter() - start
+                logger.info(f"Checkpoint: {stats['files']} files, {stats['chunks']} chunks ({stats['chunks'] / elapsed:.0f} chunks/s).")
+
+        try:
+            while open_workers:
+                item = result_queue.get()
+                if item is _DONE:
+                    open_workers -= 1
+                    continue
+                kind = item[0]
+                if kind == "file":
+                    _, file_path, entry, stale_ids = item
+                    expected[file_path] = (entry, stale_ids)
+                elif kind == "failed":
+                    stats["failed_chunks"] += len(item[1])
+                    failed_files.update(file_path for file_path, _, _ in item[1])
+                else:
+                    _, batch, vectors = item
+                    for file_path, doc_id, text in batch:
+                        pending_files.append(file_path)
+                        pending_ids.append(doc_id)
+                        pending_texts.append(text)
+                    pending_vectors.append(vectors)
+                if len(pending_ids) >= self.upsert_batch_size:
+                    flush()
+            flush(final=True) # Always checkpoint (and save a changed index) at the end
+        except BaseException:
+            self._stop.set()
+            self._writer_gone.set()
+            try:
+                self._save_checkpoint(save_index=True) # Keep the files that were completed before the failure
+            except Exception as e:
+                logger.error(f"Could not write checkpoint: {e}")
+            raise
+        finally:
+            for thread in threads:
+                thread.join(timeout=5)
+
+        if self._error:
+            raise RuntimeError(f"Ingestion stopped early; completed files are checkpointed: {self._error}")
+        stats["seconds"] = time.perf_counter() - start
+        logger.info(f"Ingestion finished: {stats['files']} files, {stats['chunks']} chunks, "
+                    f"{stats['failed_chunks']} failed, {stats['seconds']:.1f}s.")
+        return stats
+
+
+# --- Main Execution ---
+def main():
+    parser = argparse.ArgumentParser(description="Ingest text files into Acrea's content store and vector index.")
+    parser.add_argument("paths", nargs="+", help="Files or directories to ingest.")
+    parser.add_argument("--checkpoint", default="ingest_checkpoint.json", help="Checkpoint file used to resume.")
+    parser.add_argument("--extensions", default=",".join(DEFAULT_EXTENSIONS), help="Comma-separated file extensions.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument("--workers", type=int, default=DEFAULT_EMBEDDING_WORKERS, help="Concurrent embedding requests.")
+    parser.add_argument("--upsert-batch-size", type=int, default=DEFAULT_UPSERT_BATCH_SIZE)
+    parser.add_argument("--index-save-interval", type=float, default=DEFAULT_INDEX_SAVE_INTERVAL,
+                        help="Seconds between saves of a local vector index.")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv # Deferred like the module imports below, so the pipeline can be imported on its own
+    load_dotenv()
+    api_key = os.environ.get(GEMINI_API_KEY_ENV)
+    if not api_key:
+        logger.critical(f"Missing required configuration: {GEMINI_API_KEY_ENV}")
+        sys.exit(1)
+
+    # Imported here so --help works without the Google libraries installed
+    from content_store import ContentStore
+    from embedding_module import EmbeddingModule
+    from vector_memory_module import VectorMemoryModule
+
+    if os.environ.get(VECTOR_BACKEND_ENV, "vertex").lower() == "local":
+        vector_memory_module = VectorMemoryModule.with_local_index(os.environ.get(LOCAL_INDEX_PATH_ENV, DEFAULT_LOCAL_INDEX_PATH),
+                                                                   cache_max_entries=0)
+    else:
+        vertex_keys = [VDB_API_ENDPOINT_ENV, VDB_INDEX_ENDPOINT_ENV, VDB_DEPLOYED_INDEX_ID_ENV, VDB_INDEX_RESOURCE_NAME_ENV]
+        missing_keys = [key for key in vertex_keys if not os.environ.get(key)]
+        if missing_keys:
+            logger.critical(f"Missing required configuration: {', '.join(missing_keys)}")
+            sys.exit(1)
+        vector_memory_module = VectorMemoryModule(
+            api_endpoint=os.environ[VDB_API_ENDPOINT_ENV], index_endpoint_name=os.environ[VDB_INDEX_ENDPOINT_ENV],
+            deployed_index_id=os.environ[VDB_DEPLOYED_INDEX_ID_ENV], index_resource_name=os.environ[VDB_INDEX_RESOURCE_NAME_ENV],
+            cache_max_entries=0, # Nothing is searched during ingestion
+        )
+    content_store = ContentStore(os.environ.get(CONTENT_STORE_DIR_ENV, DEFAULT_CONTENT_STORE_DIR))
+    # Document vectors are never looked up again, so they stay out of the query embedding cache
+    embedding_module = EmbeddingModule(api_key=api_key, cache_memory_entries=0)
+
+    pipeline = IngestionPipeline(
+        embedding_module, content_store, vector_memory_module, args.checkpoint,
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+        embedding_workers=args.workers, upsert_batch_size=args.upsert_batch_size,
+        index_save_interval=args.index_save_interval,
+    )
+    try:
+        pipeline.run(args.paths, extensions=tuple(e if e.startswith(".") else f".{e}" for e in args.extensions.split(",") if e))
+    except KeyboardInterrupt:
+        logger.info("Interrupted; re-run with the same checkpoint to resume.")
+    finally:
+        content_store.close()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,143 @@
+# job_scheduler.py
+
+import asyncio
+import itertools
+import logging
+import threading
+from collections import deque
+
+class CancellationToken:
+    """
+    Cancellation flag for one job, passed down to the coordinator stages it runs.
+    Stages call raise_if_cancelled() between steps; setting it from any thread is safe.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise asyncio.CancelledError("Job cancelled.")
+
+class Job:
+    """A queued or running unit of work (e.g. one chat turn) and its cancellation token."""
+    def __init__(self, job_id: int, label: str, run: callable):
+        self.id = job_id
+        self.label = label
+        self.run = run # async callable(token)
+        self.token = CancellationToken()
+        self.state = "queued" # queued -> running -> done | failed | cancelled
+        self.task = None # asyncio.Task once running
+        self.trace_id = None # Coordinator metrics trace covering the job's stages, once running
+
+class JobScheduler:
+    """
+    Runs jobs on the coordinator's event loop with at most `max_workers` in flight; the rest
+    wait in FIFO order. Any thread may submit or cancel. Cancelling a queued job drops it;
+    cancelling a running job sets its token and cancels its task, which stops the coordinator
+    stream it is reading (and with it the model call). `on_change(snapshot)` is called, from
+    the loop thread, whenever the queue changes, so front ends can show it. Each job runs in
+    its own coordinator metrics trace (Job.trace_id).
+    """
+    def __init__(self, coordinator, max_workers: int = 1, on_change: callable = None):
+        """
+        Args:
+            coordinator: AcreaCoordinator whose background loop runs the jobs.
+            max_workers: Jobs run concurrently. Keep 1 for jobs sharing a chat session, whose
+                         turns must not overlap.
+            on_change: Optional callback receiving snapshot() after every state change.
+        """
+        self.logger = logging.getLogger("JobScheduler")
+        self.coordinator = coordinator
+        self.max_workers = max_workers
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._running = {} # job id -> Job
+        self._ids = itertools.count(1)
+
+    def submit(self, label: str, run: callable) -> Job:
+        """Queues `run(token)`, an async callable, and returns its Job."""
+        with self._lock:
+            job = Job(next(self._ids), label, run)
+            self._queue.append(job)
+        self.logger.info(f"Queued job {job.id}: '{label[:50]}'")
+        self.coordinator.submit(self._dispatch())
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancels a queued or running job. Returns False if it is unknown or already finished."""
+        with self._lock:
+            job = self._running.get(job_id) or next((j for j in self._queue if j.id == job_id), None)
+            if job is None:
+                return False
+            job.token.cancel()
+            if job.state == "queued":
+                self._queue.remove(job)
+                job.state = "cancelled"
+        if job.task is not None:
+            job.task.get_loop().call_soon_threadsafe(job.task.cancel)
+        self.logger.info(f"Cancelled job {job.id}.")
+        self.coordinator.submit(self._dispatch()) # Publishes the change (and fills the freed slot)
+        return True
+
+    def cancel_running(self) -> int:
+        """Cancels every running job (queued ones go ahead). Returns how many were cancelled."""
+        with self._lock:
+            job_ids = list(self._running)
+        return sum(self.cancel(job_id) for job_id in job_ids)
+
+    def cancel_all(self) -> int:
+        with self._lock:
+            job_ids = list(self._running) + [job.id for job in self._queue]
+        return sum(self.cancel(job_id) for job_id in job_ids)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "running": [(job.id, job.label) for job in self._running.values()],
+                "queued": [(job.id, job.label) for job in self._queue],
+            }
+
+    # --- Loop side ---
+    async def _dispatch(self):
+        with self._lock:
+            started = []
+            while self._queue and len(self._running) < self.max_workers:
+                job = self._queue.popleft()
+                job.state = "running"
+                self._running[job.id] = job
+                started.append(job)
+        for job in started:
+            job.task = asyncio.create_task(self._run(job))
+        self._notify()
+
+    async def _run(self, job: Job):
+        try:
+            job.token.raise_if_cancelled()
+            with self.coordinator.metrics.trace("job") as job.trace_id:
+                await job.run(job.token)
+            job.state = "done"
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            self.logger.info(f"Job {job.id} stopped after cancellation.")
+        except Exception as e:
+            job.state = "failed"
+            self.logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+            await self._dispatch()
+
+    def _notify(self):
+        if self.on_change:
+            try:
+                self.on_change(self.snapshot())
+            except Exception as e:
+                self.logger.error(f"Job queue change callback failed: {e}", exc_info=True)
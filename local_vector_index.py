@@ -0,0 +1,382 @@
+# local_vector_index.py
+
+import logging
+import os
+import threading
+import numpy as np
+from vector_memory_module import as_neighbor_counts
+
+DOT_PRODUCT_DISTANCE = "DOT_PRODUCT_DISTANCE"
+COSINE_DISTANCE = "COSINE_DISTANCE"
+SQUARED_L2_DISTANCE = "SQUARED_L2_DISTANCE"
+
+class LocalVectorIndex:
+    """
+    In-process approximate nearest neighbor index (IVF-Flat) built on NumPy.
+
+    Drop-in search backend for VectorMemoryModule: `find_neighbors` returns the same
+    [{'id', 'distance'}, ...] shape as VertexVectorSearchClient, so the stack can run
+    without a network round-trip per retrieval.
+
+    Vectors live in one growable float32 matrix. Once the index holds `train_threshold`
+    vectors, k-means partitions them into ~sqrt(N) inverted lists and the matrix is
+    reordered so every list is a contiguous slice; a query only scans the `nprobe` lists
+    whose centroids are closest, without copying vectors. Inserts are appended and
+    assigned to their nearest centroid immediately; deletes are tombstones that are
+    compacted away once they make up half of the matrix. The partitioning is retrained
+    when the index has grown 4x; k-means runs on a snapshot outside the index lock, so
+    searches and writes continue meanwhile.
+
+    Distances follow the Vertex AI conventions for the chosen measure: dot product
+    (larger is closer), cosine distance 1 - cos (smaller is closer), squared L2
+    (smaller is closer).
+    """
+    def __init__(self, dimensions: int, distance_measure: str = DOT_PRODUCT_DISTANCE,
+                 nprobe: int = 8, train_threshold: int = 20000):
+        """
+        Args:
+            dimensions: Vector dimensionality (e.g. 768 for text-embedding-004).
+            distance_measure: DOT_PRODUCT_DISTANCE, COSINE_DISTANCE or SQUARED_L2_DISTANCE.
+            nprobe: Inverted lists scanned per query. Higher is more accurate and slower.
+            train_threshold: Below this many vectors every query is an exact scan.
+        """
+        if distance_measure not in (DOT_PRODUCT_DISTANCE, COSINE_DISTANCE, SQUARED_L2_DISTANCE):
+            raise ValueError(f"Unsupported distance measure: {distance_measure}")
+        self.logger = logging.getLogger("LocalVectorIndex")
+        self.dimensions = dimensions
+        self.distance_measure = distance_measure
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self._lock = threading.RLock()
+        self._train_lock = threading.Lock() # Held while k-means runs (outside _lock)
+
+        self._vectors = np.empty((1024, dimensions), dtype=np.float32) # Rows [0, _size) are in use
+        self._sq_norms = np.empty(1024, dtype=np.float32) # Squared norms, for L2 scoring
+        self._live = np.zeros(1024, dtype=bool) # False for tombstoned rows
+        self._ids = [] # row -> datapoint id
+        self._id_to_row = {}
+        self._size = 0
+
+        # --- IVF state (None until trained) ---
+        self._centroids = None
+        self._assignments = np.empty(1024, dtype=np.int32) # row -> inverted list
+        self._centroid_sq_norms = None
+        self._list_bounds = None # Rows [bounds[c], bounds[c + 1]) hold list c (sorted region)
+        self._tail_rows = {} # list -> rows appended after the matrix was last sorted
+        self._tail_count = 0
+        self._trained_size = 0
+        self._layout_version = 0 # Bumped whenever _compact moves rows
+
+    def __len__(self):
+        return len(self._id_to_row)
+
+    # --- Mutations ---
+    def upsert_datapoints(self, ids: list[str], vectors) -> int:
+        """
+        Inserts or replaces vectors. An id repeated within one call keeps its last vector.
+        Returns the number of datapoints written.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        if len(ids) != vectors.shape[0]:
+            raise ValueError(f"Got {len(ids)} ids for {vectors.shape[0]} vectors.")
+        last = {datapoint_id: position for position, datapoint_id in enumerate(ids)}
+        if len(last) != len(ids):
+            positions = sorted(last.values())
+            ids = [ids[position] for position in positions]
+            vectors = vectors[positions]
+        if self.distance_measure == COSINE_DISTANCE:
+            vectors = self._normalize(vectors)
+
+        with self._lock:
+            self._remove_rows([self._id_to_row[i] for i in ids if i in self._id_to_row])
+            start = self._size
+            self._reserve(start + len(ids))
+            end = start + len(ids)
+            self._vectors[start:end] = vectors
+            self._sq_norms[start:end] = np.einsum("ij,ij->i", vectors, vectors)
+            self._live[start:end] = True
+            for offset, datapoint_id in enumerate(ids):
+                self._ids.append(datapoint_id)
+                self._id_to_row[datapoint_id] = start + offset
+            self._size = end
+
+            if self._centroids is not None:
+                assignments = self._nearest_centroids(vectors)
+                self._assignments[start:end] = assignments
+                for offset, list_id in enumerate(assignments.tolist()):
+                    self._tail_rows.setdefault(list_id, []).append(start + offset)
+                self._tail_count += len(ids)
+                if self._tail_count > self._size // 8:
+                    self._compact() # Fold the unsorted tail back into contiguous lists
+        self._maybe_train()
+        return len(ids)
+
+    def remove_datapoints(self, ids: list[str]) -> int:
+        """Deletes datapoints by id. Unknown ids are ignored. Returns the number removed."""
+        with self._lock:
+            rows = [self._id_to_row.pop(i) for i in ids if i in self._id_to_row]
+            self._remove_rows(rows, already_unmapped=True)
+            if self._size and len(self._id_to_row) < self._size // 2:
+                self._compact()
+        return len(rows)
+
+    # --- Search ---
+    def find_neighbors(self, query_vector, neighbor_count: int = 10, return_full_datapoint: bool = False) -> list[dict]:
+        """
+        Finds the approximate nearest neighbors of query_vector.
+
+        Returns:
+            A list of {'id', 'distance'} dicts ordered from closest to farthest
+            (plus a float32 ndarray 'feature_vector' when return_full_datapoint is True).
+        """
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dimensions:
+            raise ValueError(f"Query has {query.shape[0]} dimensions, index expects {self.dimensions}.")
+        neighbor_count, = as_neighbor_counts(neighbor_count, 1)
+        if self.distance_measure == COSINE_DISTANCE:
+            query = self._normalize(query[None, :])[0]
+
+        with self._lock:
+            rows, scores = self._candidate_scores(query)
+            if rows.size == 0:
+                return []
+            k = min(neighbor_count, rows.size)
+            # Scores are "smaller is closer" for every measure (dot product is negated)
+            top = np.argpartition(scores, k - 1)[:k] if k < rows.size else np.arange(rows.size)
+            top = top[np.argsort(scores[top])]
+
+            top = top[np.isfinite(scores[top])] # Drop tombstones
+            neighbors = [
+                {"id": self._ids[row], "distance": self._to_distance(score)}
+                for row, score in zip(rows[top].tolist(), scores[top].tolist())
+            ]
+            if return_full_datapoint and neighbors:
+                # One stacked float32 copy; each neighbor gets a row view
+                for neighbor, vector in zip(neighbors, self._vectors[rows[top]]):
+                    neighbor["feature_vector"] = vector
+            return neighbors
+
+    def find_neighbors_batch(self, query_vectors, neighbor_counts=10, return_full_datapoint: bool = False) -> list[list[dict]]:
+        """Runs find_neighbors for each query vector. neighbor_counts is an int or one count per query."""
+        neighbor_counts = as_neighbor_counts(neighbor_counts, len(query_vectors))
+        with self._lock:
+            return [self.find_neighbors(query_vector, neighbor_count, return_full_datapoint)
+                    for query_vector, neighbor_count in zip(query_vectors, neighbor_counts)]
+
+    # --- Persistence ---
+    def save(self, path: str):
+        """Writes the index to a single .npz file (tombstones are compacted first)."""
+        with self._lock:
+            self._compact()
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                vectors=self._vectors[:self._size],
+                ids=np.array([str(datapoint_id) for datapoint_id in self._ids], dtype=np.str_), # Unicode, so loading needs no pickle
+                centroids=self._centroids if self._centroids is not None else np.empty((0, self.dimensions), dtype=np.float32),
+                assignments=self._assignments[:self._size],
+                meta=np.array([self.dimensions, self.nprobe, self.train_threshold, self._trained_size]),
+                distance_measure=np.array(self.distance_measure),
+            )
+            os.replace(tmp_path, path)
+        self.logger.info(f"Saved local vector index ({len(self)} datapoints) to {path}.")
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """
+        Loads an index written by save(). Pickled arrays are refused, so a crafted file cannot
+        run code; indexes saved with object-array ids by older versions must be rebuilt.
+        """
+        with np.load(path, allow_pickle=False) as archive:
+            try:
+                data = {name: archive[name] for name in archive.files}
+            except ValueError as e:
+                raise ValueError(f"{path} holds pickled arrays (an older index format); rebuild it by re-ingesting.") from e
+        dimensions, nprobe, train_threshold, trained_size = (int(v) for v in data["meta"])
+        index = cls(dimensions, distance_measure=str(data["distance_measure"]), nprobe=nprobe, train_threshold=train_threshold)
+        vectors = data["vectors"]
+        ids = data["ids"].tolist()
+        n = len(ids)
+        index._reserve(n)
+        index._vectors[:n] = vectors
+        index._sq_norms[:n] = np.einsum("ij,ij->i", vectors, vectors)
+        index._live[:n] = True
+        index._ids = ids
+        index._id_to_row = {datapoint_id: row for row, datapoint_id in enumerate(ids)}
+        index._size = n
+        if data["centroids"].shape[0]:
+            index._centroids = data["centroids"]
+            index._centroid_sq_norms = np.einsum("ij,ij->i", index._centroids, index._centroids)
+            index._assignments[:n] = data["assignments"]
+            index._trained_size = trained_size
+            index._compact(force=True) # Rebuilds the list bounds
+        index.logger.info(f"Loaded local vector index ({n} datapoints) from {path}.")
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str, dimensions: int, **kwargs) -> "LocalVectorIndex":
+        """Loads the index at path if it exists, otherwise returns a new empty index."""
+        if path and os.path.exists(path):
+            return cls.load(path)
+        return cls(dimensions, **kwargs)
+
+    # --- Internals ---
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _scores(self, vectors: np.ndarray, sq_norms: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Per-row scores where smaller is closer."""
+        dots = vectors @ query
+        if self.distance_measure == SQUARED_L2_DISTANCE:
+            return sq_norms - 2.0 * dots + float(query @ query)
+        return -dots # Dot product and cosine: larger similarity is closer
+
+    def _to_distance(self, score: float) -> float:
+        if self.distance_measure == DOT_PRODUCT_DISTANCE:
+            return -score
+        if self.distance_measure == COSINE_DISTANCE:
+            return 1.0 + score # 1 - cos
+        return max(score, 0.0)
+
+    def _reserve(self, capacity: int):
+        if capacity <= self._vectors.shape[0]:
+            return
+        new_capacity = max(capacity, self._vectors.shape[0] * 2)
+        for name in ("_vectors", "_sq_norms", "_live", "_assignments"):
+            old = getattr(self, name)
+            grown = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def _remove_rows(self, rows: list[int], already_unmapped: bool = False):
+        for row in rows:
+            if not already_unmapped:
+                del self._id_to_row[self._ids[row]]
+            self._live[row] = False
+
+    def _compact(self, force: bool = False):
+        """Drops tombstoned rows and, once trained, sorts the rows by inverted list."""
+        if not force and len(self._id_to_row) == self._size and not self._tail_rows:
+            return
+        keep = np.flatnonzero(self._live[:self._size])
+        if self._centroids is not None:
+            keep = keep[np.argsort(self._assignments[keep], kind="stable")]
+        n = keep.size
+        self._vectors[:n] = self._vectors[keep]
+        self._sq_norms[:n] = self._sq_norms[keep]
+        self._assignments[:n] = self._assignments[keep]
+        self._live[:n] = True
+        self._live[n:] = False
+        self._ids = [self._ids[row] for row in keep]
+        self._id_to_row = {datapoint_id: row for row, datapoint_id in enumerate(self._ids)}
+        self._size = n
+        self._tail_rows = {}
+        self._tail_count = 0
+        self._layout_version += 1
+        if self._centroids is not None:
+            self._list_bounds = np.searchsorted(self._assignments[:n], np.arange(self._centroids.shape[0] + 1))
+
+    def _candidate_scores(self, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (rows, scores) for the rows a query has to look at; tombstones score +inf."""
+        if self._centroids is None:
+            blocks = [(0, self._size)]
+            tail = []
+        else:
+            centroid_scores = self._centroid_sq_norms - 2.0 * (self._centroids @ query)
+            nprobe = min(self.nprobe, self._centroids.shape[0])
+            probe = np.argpartition(centroid_scores, nprobe - 1)[:nprobe].tolist()
+            blocks = [(int(self._list_bounds[c]), int(self._list_bounds[c + 1])) for c in probe]
+            tail = [row for c in probe for row in self._tail_rows.get(c, ())]
+
+        all_rows, all_scores = [], []
+        for start, end in blocks:
+            if end > start:
+                # Contiguous slice: scored in place, no gather
+                all_rows.append(np.arange(start, end))
+                all_scores.append(self._scores(self._vectors[start:end], self._sq_norms[start:end], query))
+        if tail:
+            tail = np.asarray(tail)
+            all_rows.append(tail)
+            all_scores.append(self._scores(self._vectors[tail], self._sq_norms[tail], query))
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows = np.concatenate(all_rows)
+        scores = np.concatenate(all_scores)
+        scores[~self._live[rows]] = np.inf
+        return rows, scores
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        return self._assign(vectors, self._centroids, self._centroid_sq_norms)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, centroid_sq_norms: np.ndarray,
+                chunk_size: int = 8192) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmin(centroid_sq_norms - 2.0 * (chunk @ centroids.T), axis=1)
+        return assignments
+
+    def _maybe_train(self):
+        """Called without _lock held. Skipped while another thread is training."""
+        live = len(self._id_to_row)
+        if live < self.train_threshold:
+            return
+        if self._centroids is not None and live < 4 * self._trained_size:
+            return
+        if self._train_lock.acquire(blocking=False):
+            try:
+                self._train()
+            finally:
+                self._train_lock.release()
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        """
+        (Re)builds the IVF partitioning with k-means over the live vectors. The clustering runs
+        on a snapshot without holding the index lock; only the final swap blocks other calls.
+        """
+        with self._train_lock:
+            self._train(iterations, seed)
+
+    def _train(self, iterations: int = 10, seed: int = 0):
+        with self._lock:
+            self._compact()
+            n = self._size
+            if n == 0:
+                return
+            snapshot = self._vectors[:n].copy()
+            layout_version = self._layout_version
+
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, nlist * 64)
+        sample = snapshot[rng.choice(n, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            centroid_sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+            labels = np.argmin(centroid_sq_norms - 2.0 * (sample @ centroids.T), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+            # Empty clusters keep their previous centroid
+        centroids = centroids.astype(np.float32)
+        centroid_sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+        snapshot_assignments = self._assign(snapshot, centroids, centroid_sq_norms)
+
+        with self._lock:
+            self._centroids = centroids
+            self._centroid_sq_norms = centroid_sq_norms
+            if self._layout_version == layout_version:
+                # Rows [0, n) did not move: only rows written during training need assigning
+                self._assignments[:n] = snapshot_assignments
+                self._assignments[n:self._size] = self._nearest_centroids(self._vectors[n:self._size])
+            else:
+                self._assignments[:self._size] = self._nearest_centroids(self._vectors[:self._size])
+            self._trained_size = len(self._id_to_row)
+            self._compact(force=True) # Sort rows so each list is a contiguous slice
+        self.logger.info(f"Trained IVF partitioning: {n} vectors in {nlist} lists (nprobe={self.nprobe}).")
\ No newline at end of file
@@ -0,0 +1,75 @@
+# rag_pipeline.py
+
+import logging
+
+DEFAULT_NUM_NEIGHBORS = 3
+
+logger = logging.getLogger("RagPipeline")
+
+
+async def fetch_text_content_by_ids(coordinator, neighbor_ids: list[str], cancel_token=None) -> dict[str, str]:
+    """Looks up the document text for retrieved neighbor IDs in the content store."""
+    fetch_message = {"target_module": "content_store", "action": "get_many", "payload": {"ids": neighbor_ids}}
+    fetched_content = await coordinator.route_message_async(fetch_message, cancel_token) or {}
+    if len(fetched_content) < len(neighbor_ids):
+        logger.warning(f"No stored content for IDs: {[id_ for id_ in neighbor_ids if id_ not in fetched_content]}")
+    return fetched_content
+
+
+async def retrieve(coordinator, user_input: str, num_neighbors: int = DEFAULT_NUM_NEIGHBORS,
+                   cancel_token=None) -> tuple[str | None, list[float] | None]:
+    """
+    Runs the retrieval half of a RAG turn through the coordinator: embed the query, search
+    vector memory, then fetch the neighbors' text. Returns (context, query_vector): the
+    formatted context string, or None when nothing usable was found (the chat turn then runs
+    without context), and the query embedding (None if embedding failed), which chat_message
+    passes on so the response cache does not embed the prompt again.
+    A cancel_token (job_scheduler.CancellationToken) is checked before each stage.
+    """
+    embedding_message = {"target_module": "embedding", "action": "generate_embedding", "payload": {"text": user_input, "task_type": "RETRIEVAL_QUERY"}}
+    query_vector = await coordinator.route_message_async(embedding_message, cancel_token)
+    if not query_vector:
+        logger.error("Failed to generate query vector. Skipping RAG.")
+        return None, None
+
+    search_message = {"target_module": "vector_memory", "action": "find_neighbors", "payload": {"query_vector": query_vector, "num_neighbors": num_neighbors}}
+    neighbors = await coordinator.route_message_async(search_message, cancel_token)
+    if not neighbors:
+        logger.info("No neighbors found in vector memory.")
+        return None, query_vector
+
+    fetched_texts_map = await fetch_text_content_by_ids(coordinator, [n['id'] for n in neighbors], cancel_token)
+    context_pieces = [f"Source ID: {n['id']}\nContent: {fetched_texts_map[n['id']]}\n---" for n in neighbors if n['id'] in fetched_texts_map]
+    if not context_pieces:
+        logger.info("No usable content fetched for retrieved neighbor IDs.")
+        return None, query_vector
+    return "Found potentially relevant information:\n\n" + "\n".join(context_pieces), query_vector
+
+
+async def retrieve_context(coordinator, user_input: str, num_neighbors: int = DEFAULT_NUM_NEIGHBORS, cancel_token=None) -> str | None:
+    """Like retrieve, returning only the context string."""
+    context, _ = await retrieve(coordinator, user_input, num_neighbors, cancel_token)
+    return context
+
+
+def chat_message(user_input: str, context: str | None, session_id: str = None, stream: bool = True,
+                 prompt_embedding=None) -> dict:
+    """
+    Builds the coordinator message for the generation half of a RAG turn. Pass the query
+    vector from retrieve as prompt_embedding; ChatModule's response cache then reuses it.
+    """
+    payload = {"prompt": user_input, "context": context}
+    if session_id:
+        payload["session_id"] = session_id
+    if prompt_embedding is not None:
+        payload["prompt_embedding"] = prompt_embedding
+    return {"target_module": "chat", "action": "generate_response_stream" if stream else "generate_response", "payload": payload}
+
+
+async def stream_rag_turn(coordinator, user_input: str, session_id: str = None, num_neighbors: int = DEFAULT_NUM_NEIGHBORS,
+                          cancel_token=None):
+    """Full RAG turn: retrieves context, then yields the chat response chunks as they arrive."""
+    context, query_vector = await retrieve(coordinator, user_input, num_neighbors, cancel_token)
+    async for chunk in coordinator.stream_message_async(chat_message(user_input, context, session_id, prompt_embedding=query_vector),
+                                                         cancel_token):
+        yield chunk
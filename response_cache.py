@@ -0,0 +1,149 @@
+# response_cache.py
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+def fingerprint(value) -> str:
+    """Stable hash of a JSON-able value (e.g. a generation config) or a string, for cache keys."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    TTL- and size-bounded cache of generated chat responses.
+
+    Entries are keyed on the normalized prompt plus a scope: a fingerprint of the retrieved
+    context, of the conversation history the prompt was asked in and of the model/generation
+    config the answer was produced with. On an exact miss,
+    the prompt's embedding is compared against the cached prompts of the same scope (one
+    matrix-vector product, as in RetrievalCache) and the closest answer is reused when it lies
+    within `similarity_threshold` cosine similarity. A differing context or history never
+    matches, so a paraphrase only hits when retrieval found the same documents, and a follow-up
+    question only hits in a conversation that got there the same way.
+    """
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600.0, similarity_threshold: float = 0.97):
+        """
+        Args:
+            max_entries: Maximum cached responses (least recently used are evicted).
+            ttl_seconds: Lifetime of a cached response.
+            similarity_threshold: Minimum cosine similarity for a semantic hit. Values > 1 disable
+                                  semantic matching (exact repeats only).
+        """
+        self.logger = logging.getLogger("ResponseCache")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._reset()
+
+    def _reset(self, dimensions: int = None):
+        self._entries = OrderedDict() # key -> slot, in LRU order
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._matrix = None if dimensions is None else np.zeros((self.max_entries, dimensions), dtype=np.float32)
+        self._has_vector = np.zeros(self.max_entries, dtype=bool)
+        self._expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._scopes = [None] * self.max_entries
+        self._responses = [None] * self.max_entries
+        self._keys = [None] * self.max_entries
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Case, whitespace and trailing punctuation do not change the question."""
+        return " ".join(prompt.lower().split()).rstrip("?!. ")
+
+    @staticmethod
+    def scope(context: str | None, config_fingerprint: str, history: list | None = None) -> str:
+        """Scope of an answer. `history` is the rendered history sent with the prompt (None or [] for none)."""
+        return fingerprint(context or "") + ":" + fingerprint(history or []) + ":" + config_fingerprint
+
+    def _key(self, prompt: str, scope: str) -> str:
+        return fingerprint(self.normalize(prompt)) + ":" + scope
+
+    @staticmethod
+    def _as_unit(embedding) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def get_exact(self, prompt: str, scope: str) -> str | None:
+        """Returns the cached response for this prompt and scope, without counting a miss."""
+        with self._lock:
+            slot = self._entries.get(self._key(prompt, scope))
+            if slot is None or self._expires_at[slot] <= time.monotonic():
+                return None
+            self._entries.move_to_end(self._keys[slot])
+            self.exact_hits += 1
+            return self._responses[slot]
+
+    def get_similar(self, embedding, scope: str) -> str | None:
+        """Returns the response of the closest cached prompt of this scope, or None (counted as a miss)."""
+        query = self._as_unit(embedding) if embedding is not None else None
+        with self._lock:
+            if query is not None and self._matrix is not None and self._matrix.shape[1] == query.shape[0] and self.similarity_threshold <= 1.0:
+                eligible = self._has_vector & (self._expires_at > time.monotonic())
+                eligible &= np.fromiter((s == scope for s in self._scopes), dtype=bool, count=self.max_entries)
+                if eligible.any():
+                    similarities = self._matrix @ query
+                    similarities[~eligible] = -np.inf
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(self._keys[best])
+                        self.semantic_hits += 1
+                        return self._responses[best]
+            self.misses += 1
+            return None
+
+    def record_miss(self):
+        """Counts a miss for a lookup that ended after get_exact (no embedding to search with)."""
+        with self._lock:
+            self.misses += 1
+
+    def put(self, prompt: str, scope: str, response: str, embedding=None):
+        """Caches a response. Without an embedding the entry only serves exact repeats."""
+        vector = self._as_unit(embedding) if embedding is not None else None
+        with self._lock:
+            if vector is not None and (self._matrix is None or self._matrix.shape[1] != vector.shape[0]):
+                self._reset(vector.shape[0])
+            key = self._key(prompt, scope)
+            slot = self._entries.pop(key, None)
+            if slot is None:
+                if not self._free_slots:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._scopes[evicted] = self._responses[evicted] = None
+                    self._has_vector[evicted] = False
+                    self._free_slots.append(evicted)
+                slot = self._free_slots.pop()
+            self._has_vector[slot] = vector is not None
+            if vector is not None:
+                self._matrix[slot] = vector
+            self._expires_at[slot] = time.monotonic() + self.ttl_seconds
+            self._scopes[slot] = scope
+            self._responses[slot] = response
+            self._keys[slot] = key
+            self._entries[key] = slot
+
+    def clear(self):
+        with self._lock:
+            dimensions = None if self._matrix is None else self._matrix.shape[1]
+            self._reset(dimensions)
+        self.logger.info("Response cache cleared.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
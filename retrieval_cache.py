@@ -0,0 +1,135 @@
+# retrieval_cache.py
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+class RetrievalCache:
+    """
+    TTL- and size-bounded cache of vector search results.
+
+    Exact repeats are found by hashing the float32 query bytes. Other queries are
+    compared against the recent cached queries (kept as a small normalized matrix, so
+    the lookup is one matrix-vector product) and a cached result is reused when its
+    query lies within `similarity_threshold` cosine similarity and asked for at least
+    as many neighbors.
+
+    Call invalidate() whenever the underlying index changes. Searches that started
+    before an invalidation cannot repopulate the cache with stale results: pass the
+    `generation` read before searching to put().
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, similarity_threshold: float = 0.98):
+        """
+        Args:
+            max_entries: Maximum cached queries (least recently used are evicted).
+            ttl_seconds: Lifetime of a cached result.
+            similarity_threshold: Minimum cosine similarity for a near-duplicate hit. Values > 1 disable
+                                  near-duplicate matching (exact repeats only).
+        """
+        self.logger = logging.getLogger("RetrievalCache")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self.generation = 0 # Bumped by invalidate()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._reset()
+
+    def _reset(self, dimensions: int = None):
+        self._entries = OrderedDict() # key -> slot, in LRU order
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._matrix = None if dimensions is None else np.zeros((self.max_entries, dimensions), dtype=np.float32)
+        self._active = np.zeros(self.max_entries, dtype=bool)
+        self._expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._neighbor_counts = np.zeros(self.max_entries, dtype=np.int32)
+        self._results = [None] * self.max_entries
+        self._keys = [None] * self.max_entries
+
+    @staticmethod
+    def _key(query: np.ndarray, neighbor_count: int) -> str:
+        return hashlib.sha1(query.tobytes()).hexdigest() + f":{neighbor_count}"
+
+    @staticmethod
+    def _as_query(query_vector) -> np.ndarray:
+        return np.ascontiguousarray(np.asarray(query_vector, dtype=np.float32).reshape(-1))
+
+    def get(self, query_vector, neighbor_count: int) -> list[dict] | None:
+        """Returns cached neighbors for the query (exact or near-duplicate), or None on a miss."""
+        query = self._as_query(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            slot = self._entries.get(self._key(query, neighbor_count))
+            if slot is not None and self._expires_at[slot] > now:
+                self._entries.move_to_end(self._keys[slot])
+                self.exact_hits += 1
+                return self._copy(self._results[slot], neighbor_count)
+
+            if self._matrix is not None and self._matrix.shape[1] == query.shape[0] and self.similarity_threshold <= 1.0:
+                norm = float(np.linalg.norm(query))
+                if norm > 0:
+                    similarities = self._matrix @ (query / norm)
+                    eligible = self._active & (self._expires_at > now) & (self._neighbor_counts >= neighbor_count)
+                    similarities[~eligible] = -np.inf
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(self._keys[best])
+                        self.near_hits += 1
+                        return self._copy(self._results[best], neighbor_count)
+
+            self.misses += 1
+            return None
+
+    def put(self, query_vector, neighbor_count: int, results: list[dict], generation: int = None):
+        """Caches results for a query. Ignored if the cache was invalidated since `generation` was read."""
+        query = self._as_query(query_vector)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self._reset(query.shape[0])
+            key = self._key(query, neighbor_count)
+            slot = self._entries.pop(key, None)
+            if slot is None:
+                if not self._free_slots:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._active[evicted] = False
+                    self._free_slots.append(evicted)
+                slot = self._free_slots.pop()
+            norm = float(np.linalg.norm(query))
+            self._matrix[slot] = query / norm if norm > 0 else 0.0
+            self._active[slot] = True
+            self._expires_at[slot] = time.monotonic() + self.ttl_seconds
+            self._neighbor_counts[slot] = neighbor_count
+            self._results[slot] = self._copy(results, neighbor_count)
+            self._keys[slot] = key
+            self._entries[key] = slot
+
+    def invalidate(self):
+        """Drops every cached result. Call this whenever the index is updated."""
+        with self._lock:
+            dimensions = None if self._matrix is None else self._matrix.shape[1]
+            self._reset(dimensions)
+            self.generation += 1
+        self.logger.info("Retrieval cache invalidated.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.near_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "generation": self.generation,
+            }
+
+    @staticmethod
+    def _copy(results: list[dict], neighbor_count: int) -> list[dict]:
+        # Callers get their own dicts so they cannot corrupt the cached entry
+        return [dict(neighbor) for neighbor in results[:neighbor_count]]
\ No newline at end of file
@@ -0,0 +1,172 @@
+# speech_chunking.py
+
+import re
+
+# Text-to-Speech rejects inputs over 5000 bytes (text or SSML, tags included)
+TTS_MAX_INPUT_BYTES = 5000
+# Later chunks are packed up to this size: small enough to synthesize in parallel, big enough to keep prosody natural
+DEFAULT_CHUNK_TARGET_BYTES = 800
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])["\')\]]*\s+')
+_ENDS_SENTENCE = re.compile(r'[.!?…]["\')\]]*\s*$')
+_SSML_TOKEN = re.compile(r'<[^>]*>|[^<]+')
+_SSML_SENTENCE_ELEMENTS = ("p", "s")
+
+def _byte_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+def is_ssml(text_or_ssml: str) -> bool:
+    return text_or_ssml.strip().startswith("<speak>")
+
+def split_sentences(text: str) -> list[str]:
+    """Splits plain text after sentence-ending punctuation (closing quotes/brackets stay with the sentence)."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.start() + len(match.group(0).rstrip())
+        sentences.append(text[start:end].strip())
+        start = match.end()
+    sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+def _prefix_chars(text: str, max_bytes: int) -> int:
+    """Length (in characters) of the longest prefix of text that fits in max_bytes of UTF-8."""
+    return len(text.encode("utf-8")[:max_bytes].decode("utf-8", "ignore"))
+
+def _split_words(text: str, max_bytes: int) -> list[str]:
+    """Last resort for a single sentence over the limit: cut it between words (inside a word over the limit)."""
+    pieces, current = [], ""
+    words = []
+    for word in text.split():
+        while _byte_len(word) > max_bytes:
+            cut = _prefix_chars(word, max_bytes)
+            words.append(word[:cut])
+            word = word[cut:]
+        words.append(word)
+    for word in words:
+        candidate = f"{current} {word}" if current else word
+        if current and _byte_len(candidate) > max_bytes:
+            pieces.append(current)
+            candidate = word
+        current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _ssml_units(ssml: str) -> list[str]:
+    """
+    Splits the body of a <speak> document into sentence-sized fragments. Splits only happen
+    outside elements (at tag depth 0), either between sentences of bare text or after a
+    top-level <p>/<s>, so every fragment is well-formed on its own.
+    """
+    body = ssml.strip()
+    body = body[len("<speak>"):]
+    if body.endswith("</speak>"):
+        body = body[:-len("</speak>")]
+    units, current, depth = [], "", 0
+    for token in _SSML_TOKEN.findall(body):
+        if token.startswith("<"):
+            current += token
+            if token.startswith("</"):
+                depth -= 1
+                name = token[2:-1].strip().split()[0] if token[2:-1].strip() else ""
+                if depth == 0 and name in _SSML_SENTENCE_ELEMENTS:
+                    units.append(current)
+                    current = ""
+            elif not token.endswith("/>") and not token.startswith(("<!", "<?")):
+                depth += 1
+        elif depth > 0:
+            current += token
+        else:
+            sentences = split_sentences(token)
+            if not sentences:
+                current += token
+                continue
+            if token[:1].isspace():
+                current += " "
+            current += sentences[0]
+            for sentence in sentences[1:]:
+                units.append(current)
+                current = sentence
+            if _ENDS_SENTENCE.search(token):
+                units.append(current)
+                current = ""
+            elif token[-1:].isspace():
+                current += " "
+    units.append(current)
+    return [unit.strip() for unit in units if unit.strip()]
+
+def chunk_for_tts(text_or_ssml: str, target_bytes: int = DEFAULT_CHUNK_TARGET_BYTES,
+                  max_bytes: int = TTS_MAX_INPUT_BYTES) -> list[str]:
+    """
+    Splits text or SSML into synthesis requests on sentence boundaries.
+
+    The first chunk is the first sentence alone, so its audio comes back as fast as possible;
+    the following sentences are packed into chunks of up to `target_bytes`. No chunk exceeds
+    `max_bytes` (SSML chunks are re-wrapped in <speak>, which is counted), except an SSML
+    element that cannot be split without breaking the markup.
+    """
+    ssml = is_ssml(text_or_ssml)
+    wrap = (lambda body: f"<speak>{body}</speak>") if ssml else (lambda body: body)
+    overhead = _byte_len(wrap(""))
+    units = _ssml_units(text_or_ssml) if ssml else split_sentences(text_or_ssml)
+
+    sized_units = []
+    for unit in units:
+        if not ssml and _byte_len(unit) > max_bytes:
+            sized_units.extend(_split_words(unit, max_bytes))
+        else:
+            sized_units.append(unit)
+    if not sized_units:
+        return []
+
+    chunks = [sized_units[0]]
+    current = ""
+    for unit in sized_units[1:]:
+        candidate = f"{current} {unit}" if current else unit
+        if current and _byte_len(candidate) + overhead > min(target_bytes, max_bytes):
+            chunks.append(current)
+            candidate = unit
+        current = candidate
+    if current:
+        chunks.append(current)
+    return [wrap(chunk) for chunk in chunks]
+
+class SentenceAccumulator:
+    """
+    Turns streamed text into complete sentences for speech. feed() returns the sentences
+    finished by a chunk; a sentence counts as finished once whitespace follows its final
+    punctuation, so "3." of "3.14" is never spoken early. Text running past `max_bytes`
+    without a sentence end is cut at the last space, or at `max_bytes` (on a character
+    boundary) when there is none. flush() returns the unfinished tail.
+    """
+    def __init__(self, max_bytes: int = TTS_MAX_INPUT_BYTES):
+        self.max_bytes = max_bytes
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            end = match.start() + len(match.group(0).rstrip())
+            sentence = self._buffer[start:end].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        while _byte_len(self._buffer) > self.max_bytes:
+            limit = _prefix_chars(self._buffer, self.max_bytes)
+            cut = self._buffer.rfind(" ", 0, limit)
+            if cut <= 0:
+                # No space to cut at (e.g. a URL or CJK text): hard cut
+                sentences.append(self._buffer[:limit].strip())
+                self._buffer = self._buffer[limit:]
+                continue
+            sentences.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut + 1:]
+        return sentences
+
+    def flush(self) -> str | None:
+        tail, self._buffer = self._buffer.strip(), ""
+        return tail or None
@@ -0,0 +1,65 @@
+# startup_report.py
+
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+class StartupReport:
+    """
+    Wall-clock cost of each startup step: imports, module construction and milestones such as
+    the first window appearing. Times are measured from `origin`, which is when this module was
+    first imported (entry points import it first). Thread-safe; lazily built modules record
+    their cost whenever they are first used.
+    """
+    def __init__(self):
+        self.logger = logging.getLogger("StartupReport")
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.steps = [] # (kind, label, seconds, finished_at seconds since origin)
+
+    def record(self, label: str, seconds: float, kind: str = "step"):
+        with self._lock:
+            self.steps.append((kind, label, seconds, time.perf_counter() - self.origin))
+
+    @contextmanager
+    def measure(self, label: str, kind: str = "step"):
+        """Records how long the enclosed block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(label, time.perf_counter() - start, kind)
+
+    def mark(self, label: str):
+        """Records a milestone (e.g. 'window shown') at its time since origin."""
+        self.record(label, time.perf_counter() - self.origin, kind="milestone")
+
+    def import_module(self, name: str):
+        """importlib.import_module, recording the cost the first time `name` is imported."""
+        if name in sys.modules:
+            return sys.modules[name]
+        with self.measure(name, kind="import"):
+            return importlib.import_module(name)
+
+    def render(self) -> str:
+        """Text table of every step in completion order."""
+        with self._lock:
+            steps = list(self.steps)
+        lines = [f"{'at (s)':>8}  {'cost (ms)':>10}  {'kind':<9}  step"]
+        for kind, label, seconds, finished_at in steps:
+            cost = "" if kind == "milestone" else f"{seconds * 1000:.1f}"
+            lines.append(f"{finished_at:8.3f}  {cost:>10}  {kind:<9}  {label}")
+        return "\n".join(lines)
+
+    def log(self, logger: logging.Logger = None):
+        (logger or self.logger).info("Startup report:\n" + self.render())
+
+# Process-wide report shared by the entry points, the coordinator and the modules
+STARTUP = StartupReport()
+
+def import_module(name: str):
+    """Deferred import of a heavy dependency, timed in the process-wide STARTUP report."""
+    return STARTUP.import_module(name)
@@ -0,0 +1,65 @@
+# tests/test_acrea_coordinator.py
+
+import asyncio
+import pytest
+import acrea_coordinator
+from acrea_coordinator import AcreaCoordinator
+from job_scheduler import CancellationToken
+
+class FakeChat:
+    def __init__(self, chunks: list[str]):
+        self.chunks = chunks
+
+    def handle_message(self, action, payload):
+        return iter(self.chunks)
+
+class FakeTTS:
+    def __init__(self):
+        self.spoken = []
+
+    def handle_message(self, action, payload):
+        self.spoken.append(payload["text"])
+        return {"success": True, "output_path": f"{len(self.spoken)}.mp3"}
+
+@pytest.fixture
+def coordinator():
+    coordinator = AcreaCoordinator()
+    coordinator.register_module("chat", FakeChat(["Hello there, this is Acrea. ", "Speaking the last sentence now"]))
+    coordinator.register_module("tts", FakeTTS())
+    return coordinator
+
+def speak(coordinator, playback: asyncio.Queue, token: CancellationToken):
+    message = {"target_module": "chat", "action": "generate_response_stream", "payload": {}}
+    return coordinator.stream_with_speech_async(message, playback, cancel_token=token)
+
+async def drain(playback: asyncio.Queue) -> list:
+    results = []
+    while (item := await asyncio.wait_for(playback.get(), 2)) is not None:
+        results.append(item)
+    return results
+
+def test_cancel_after_text_finished_still_ends_playback(coordinator):
+    async def scenario():
+        playback, token = asyncio.Queue(), CancellationToken()
+        text = [chunk async for chunk in speak(coordinator, playback, token)]
+        token.cancel() # The last sentence's synthesis has not started yet
+        return text, await drain(playback)
+
+    text, results = asyncio.run(scenario())
+    assert len(text) == 2
+    assert [result["index"] for result in results] == [0, 1]
+    assert results[-1]["text"] == "Speaking the last sentence now"
+    assert not results[-1]["success"]
+
+def test_consumer_that_stops_reading_does_not_block_delivery(coordinator, monkeypatch):
+    monkeypatch.setattr(acrea_coordinator, "PLAYBACK_POLL_SECONDS", 0.01)
+    async def scenario():
+        playback, token = asyncio.Queue(maxsize=1), CancellationToken()
+        async for _ in speak(coordinator, playback, token):
+            pass
+        await asyncio.sleep(0.1) # The first result fills the queue; nobody reads it
+        token.cancel()
+        await asyncio.wait_for(asyncio.gather(*coordinator._background_tasks), 2)
+        return await drain(playback)
+
+    assert asyncio.run(scenario()) == []
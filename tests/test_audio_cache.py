@@ -0,0 +1,94 @@
+# tests/test_audio_cache.py
+
+import os
+import pytest
+from audio_cache import AudioCache
+
+MP3 = 2 # Audio encoding enum value; only its int() matters for the key
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("audio_cache.time.monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+    def make(**kwargs):
+        cache = AudioCache(str(tmp_path / "audio"), **kwargs)
+        caches.append(cache)
+        return cache
+    yield make
+    for cache in caches:
+        cache.close()
+
+def key(text: str) -> str:
+    return AudioCache.make_key(text, "en-US", "en-US-Standard-C", MP3)
+
+def test_keys_cover_every_audio_parameter():
+    assert key("Hello") == key("Hello")
+    assert len({key("Hello"), key("hello"), AudioCache.make_key("Hello", "en-GB", "en-US-Standard-C", MP3),
+                AudioCache.make_key("Hello", "en-US", "en-US-Standard-C", 1)}) == 4
+
+def test_put_then_get_survives_a_restart(make_cache):
+    cache = make_cache()
+    assert cache.get(key("Hello")) is None
+    path = cache.put(key("Hello"), b"audio", ".mp3")
+    assert cache.get(key("Hello")) == path
+    cache.close()
+    reopened = make_cache()
+    assert reopened.get(key("Hello")) == path
+    with open(path, "rb") as f:
+        assert f.read() == b"audio"
+
+def test_least_recently_used_file_is_evicted(make_cache, clock):
+    cache = make_cache(max_entries=2, grace_seconds=10)
+    first = cache.put(key("one"), b"1", ".mp3")
+    cache.put(key("two"), b"2", ".mp3")
+    clock[0] += 60
+    cache.get(key("one"))
+    clock[0] += 60
+    cache.put(key("three"), b"3", ".mp3")
+    assert os.path.exists(first)
+    assert cache.get(key("two")) is None
+    assert cache.stats()["entries"] == 2
+
+def test_recently_returned_files_are_not_evicted_until_the_grace_period_ends(make_cache, clock):
+    cache = make_cache(max_entries=1, grace_seconds=10)
+    first = cache.put(key("one"), b"1", ".mp3") # Handed to the player...
+    second = cache.put(key("two"), b"2", ".mp3") # ...while the next sentence is cached
+    assert os.path.exists(first) and os.path.exists(second)
+    assert cache.stats()["entries"] == 2 # Over the limit for now
+    clock[0] += 11
+    cache.put(key("three"), b"3", ".mp3")
+    assert not os.path.exists(first) and not os.path.exists(second)
+    assert cache.stats()["entries"] == 1
+
+def test_size_limit_keeps_a_file_larger_than_the_cache(make_cache, clock):
+    cache = make_cache(max_bytes=4, grace_seconds=0)
+    cache.put(key("small"), b"12", ".mp3")
+    big = cache.put(key("big"), b"123456", ".mp3")
+    assert cache.get(key("small")) is None
+    assert cache.get(key("big")) == big
+
+def test_file_deleted_behind_the_cache_is_a_miss(make_cache):
+    cache = make_cache()
+    os.remove(cache.put(key("gone"), b"x", ".mp3"))
+    assert cache.get(key("gone")) is None
+    assert cache.stats()["entries"] == 0
+
+def test_torn_index_line_is_skipped_and_log_compacts(make_cache, tmp_path):
+    cache = make_cache()
+    cache.put(key("kept"), b"x", ".mp3")
+    cache.close()
+    with open(tmp_path / "audio" / "index.log", "a", encoding="utf-8") as f:
+        f.write('["put", "abc')
+    cache = make_cache()
+    assert cache.get(key("kept")) is not None
+    for _ in range(1100): # Hits pile up in the log until it is rewritten
+        cache.get(key("kept"))
+    with open(tmp_path / "audio" / "index.log", encoding="utf-8") as f:
+        assert len(f.readlines()) < 200
+    cache.close()
+    assert make_cache().get(key("kept")) is not None
@@ -0,0 +1,101 @@
+# tests/test_chat_module.py
+
+import sys
+import types
+import pytest
+from chat_module import ChatModule, SESSION_BUSY_REPLY
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.candidates = [types.SimpleNamespace(finish_reason=1, content=types.SimpleNamespace(parts=[text]))]
+        self.usage_metadata = None
+
+    def __iter__(self):
+        yield self # Streamed as a single chunk
+
+class FakeGenerativeModel:
+    """Answers every request with a numbered reply, so each real model call is distinguishable."""
+    calls = 0
+
+    def __init__(self, model_name, **kwargs):
+        pass
+
+    def generate_content(self, contents, stream=False):
+        FakeGenerativeModel.calls += 1
+        return FakeResponse(f"answer {FakeGenerativeModel.calls}")
+
+@pytest.fixture
+def make_chat(monkeypatch, tmp_path):
+    fake_genai = types.SimpleNamespace(configure=lambda **kwargs: None, GenerativeModel=FakeGenerativeModel)
+    monkeypatch.setitem(sys.modules, "google.generativeai", fake_genai)
+    FakeGenerativeModel.calls = 0
+    def make(**kwargs):
+        return ChatModule(api_key="test", model_name="fake-model", system_instruction="", generation_config={},
+                          safety_settings={}, sessions_dir=str(tmp_path / "sessions"), **kwargs)
+    return make
+
+@pytest.fixture
+def chat(make_chat):
+    return make_chat()
+
+def ask(chat: ChatModule, session_id: str, prompt: str) -> str:
+    return chat.handle_message("generate_response", {"prompt": prompt, "session_id": session_id})
+
+def test_response_cache_is_scoped_to_session_history(chat):
+    first = ask(chat, "alice", "What is ACREA?")
+    # Same question in a fresh conversation: served from the cache
+    assert ask(chat, "carol", "What is ACREA?") == first
+    assert FakeGenerativeModel.calls == 1
+
+    ask(chat, "bob", "Who are you?")
+    alice_more = ask(chat, "alice", "Tell me more.")
+    # Bob's follow-up refers to his own conversation, not Alice's
+    assert ask(chat, "bob", "tell me more.") != alice_more
+    # Alice asking again continues from her newer history instead of replaying the old answer
+    assert ask(chat, "alice", "Tell me more") != alice_more
+    assert FakeGenerativeModel.calls == 5
+
+def stream(chat: ChatModule, session_id: str, prompt: str):
+    return chat.handle_message("generate_response_stream", {"prompt": prompt, "session_id": session_id})
+
+def turns(chat: ChatModule, session_id: str) -> int:
+    return chat.handle_message("get_history", {"session_id": session_id})["turns"]
+
+def test_session_is_not_evicted_while_its_turn_runs(make_chat):
+    chat = make_chat(max_sessions=1)
+    alice = stream(chat, "alice", "What is ACREA?")
+    next(alice) # Alice's turn is in flight...
+    ask(chat, "bob", "Who are you?") # ...when Bob's turn needs the only slot
+    assert list(alice) == []
+    assert turns(chat, "alice") == 1
+    assert turns(chat, "bob") == 1
+
+def test_turns_of_one_session_run_one_at_a_time(make_chat):
+    chat = make_chat(session_wait_seconds=0.05)
+    first = stream(chat, "alice", "What is ACREA?")
+    next(first)
+    assert ask(chat, "alice", "Who are you?") == SESSION_BUSY_REPLY
+    assert ask(chat, "bob", "Who are you?") != SESSION_BUSY_REPLY
+    first.close()
+    assert ask(chat, "alice", "Who are you?") != SESSION_BUSY_REPLY
+
+def test_precomputed_prompt_embedding_is_reused_for_semantic_hits(make_chat):
+    embedded = []
+    chat = make_chat(embed_prompt=lambda text: embedded.append(text) or [1.0, 0.0])
+    first = chat.handle_message("generate_response", {"prompt": "What is ACREA?", "session_id": "alice",
+                                                      "prompt_embedding": [1.0, 0.0]})
+    # A paraphrase in a fresh session, with its retrieval vector: a semantic hit, nothing embedded
+    again = chat.handle_message("generate_response", {"prompt": "Explain ACREA", "session_id": "carol",
+                                                      "prompt_embedding": [0.99, 0.01]})
+    assert again == first
+    assert embedded == []
+    ask(chat, "dave", "Explain ACREA please") # No vector in the payload: falls back to embed_prompt
+    assert embedded == ["Explain ACREA please"]
+
+def test_without_an_embedding_only_exact_repeats_hit(chat):
+    first = ask(chat, "alice", "What is ACREA?")
+    assert ask(chat, "carol", "Explain ACREA") != first
+    stats = chat.handle_message("get_cache_stats", {})
+    assert stats["semantic_hits"] == 0
+    assert stats["misses"] == 2
@@ -0,0 +1,64 @@
+# tests/test_content_store.py
+
+import pytest
+from content_store import ContentStore
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+    def make(**kwargs):
+        store = ContentStore(str(tmp_path / "content"), **kwargs)
+        stores.append(store)
+        return store
+    yield make
+    for store in stores:
+        store.close()
+
+def test_round_trip_and_reopen(make_store):
+    store = make_store()
+    assert store.put_many({"a": "Alpha", "b": "Bêta ✓", "empty": ""}) == 3
+    assert store.get_many(["a", "b", "empty", "missing"]) == {"a": "Alpha", "b": "Bêta ✓", "empty": ""}
+    store.close()
+    assert make_store().get("b") == "Bêta ✓"
+
+def test_reads_see_appends_after_the_segment_was_mapped(make_store):
+    store = make_store()
+    store.put("a", "first")
+    assert store.get("a") == "first" # Maps the active segment
+    store.put("b", "second")
+    assert store.get("b") == "second"
+
+def test_last_write_for_an_id_wins(make_store):
+    store = make_store()
+    store.put("a", "old")
+    store.put("a", "new")
+    assert store.get("a") == "new"
+    store.close()
+    assert make_store().get("a") == "new"
+    assert len(make_store()) == 1
+
+def test_segments_roll_over_at_max_size(make_store):
+    store = make_store(max_segment_bytes=10)
+    store.put_many([(f"doc-{i}", "x" * 6) for i in range(3)])
+    assert store.handle_message("get_stats", {})["segments"] == 3
+    assert store.get_many(["doc-0", "doc-2"]) == {"doc-0": "xxxxxx", "doc-2": "xxxxxx"}
+
+def test_torn_index_record_is_dropped_on_open(make_store, tmp_path):
+    store = make_store()
+    store.put_many({"a": "Alpha", "b": "Beta"})
+    store.close()
+    with open(tmp_path / "content" / "index.log", "a", encoding="utf-8") as f:
+        f.write('["c", 0, 9') # Interrupted write
+    reopened = make_store()
+    assert len(reopened) == 2
+    reopened.put("c", "Gamma")
+    reopened.close()
+    assert make_store().get_many(["a", "c"]) == {"a": "Alpha", "c": "Gamma"}
+
+def test_handle_message_actions(make_store):
+    store = make_store()
+    assert store.handle_message("put_many", {"items": [("a", "Alpha")]}) == 1
+    assert store.handle_message("put_many", {}) == 0
+    assert store.handle_message("get_many", {"ids": ["a"]}) == {"a": "Alpha"}
+    assert store.handle_message("get_many", {}) == {}
+    assert store.handle_message("unknown", {}) is None
@@ -0,0 +1,75 @@
+# tests/test_embedding_cache.py
+
+import os
+import numpy as np
+import pytest
+from embedding_cache import EmbeddingCache
+
+MODEL = "models/text-embedding-004"
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**kwargs):
+        return EmbeddingCache(MODEL, cache_dir=str(tmp_path / "cache"), **kwargs)
+    return make
+
+def test_hits_come_from_memory_then_disk_after_restart(make_cache):
+    cache = make_cache()
+    assert cache.get("hello") is None
+    cache.put("hello", [0.5, 1.5, 2.5])
+    assert cache.get("hello") == [0.5, 1.5, 2.5]
+
+    restarted = make_cache()
+    assert restarted.get("hello") == [0.5, 1.5, 2.5]
+    assert restarted.get("hello") == [0.5, 1.5, 2.5]
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["memory_hits"] == 1
+
+def test_keys_are_scoped_to_task_type_and_model(make_cache, tmp_path):
+    cache = make_cache()
+    cache.put("hello", [1.0, 0.0], task_type="RETRIEVAL_QUERY")
+    assert cache.get("hello", task_type="RETRIEVAL_DOCUMENT") is None
+    other_model = EmbeddingCache("models/other", cache_dir=str(tmp_path / "cache"))
+    assert other_model.get("hello", task_type="RETRIEVAL_QUERY") is None
+
+def test_memory_tier_is_bounded(make_cache):
+    cache = make_cache(max_memory_entries=2)
+    for i in range(3):
+        cache.put(f"text {i}", [float(i)])
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.get("text 0") == [0.0] # Evicted from memory, still on disk
+    assert cache.stats()["disk_hits"] == 1
+
+def test_mismatched_dimension_is_not_persisted(make_cache):
+    cache = make_cache()
+    cache.put("a", [1.0, 2.0])
+    cache.put("b", [1.0, 2.0, 3.0])
+    assert make_cache().get("b") is None
+    assert make_cache().get("a") == [1.0, 2.0]
+
+def test_torn_write_leaves_rows_aligned(make_cache):
+    cache = make_cache()
+    cache.put("a", [1.0, 1.0])
+    cache.put("b", [2.0, 2.0])
+    vectors_path = os.path.join(cache.store_dir, "vectors.f32")
+    keys_path = os.path.join(cache.store_dir, "keys.txt")
+
+    # Crash after a vector was written but before its key: an orphaned row
+    with open(vectors_path, "ab") as f:
+        f.write(np.array([9.0, 9.0], dtype=np.float32).tobytes())
+    restarted = make_cache()
+    restarted.put("c", [3.0, 3.0]) # Overwrites the orphan instead of landing after it
+    assert os.path.getsize(vectors_path) == 3 * 2 * 4
+
+    # Crash with a key whose vector never made it to disk
+    with open(keys_path, "a", encoding="utf-8") as f:
+        f.write(restarted.make_key("ghost") + "\n")
+    reloaded = make_cache()
+    assert reloaded.get("ghost") is None
+    assert [reloaded.get(text) for text in "abc"] == [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]]
+
+def test_memory_only_cache_writes_nothing(tmp_path):
+    cache = EmbeddingCache(MODEL, cache_dir=None)
+    cache.put("hello", [1.0])
+    assert cache.get("hello") == [1.0]
+    assert not os.listdir(tmp_path)
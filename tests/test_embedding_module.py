@@ -0,0 +1,80 @@
+# tests/test_embedding_module.py
+
+import threading
+import time
+import pytest
+from embedding_module import EmbeddingBatcher
+
+class RecordingEmbedder:
+    """embed_batch stand-in: records every request and returns [len(text)] per text."""
+    def __init__(self, fail_task_type: str = None):
+        self.calls = []
+        self.fail_task_type = fail_task_type
+        self.lock = threading.Lock()
+
+    def __call__(self, texts, task_type):
+        with self.lock:
+            self.calls.append((list(texts), task_type))
+        if self.fail_task_type and task_type == self.fail_task_type:
+            raise RuntimeError("quota exceeded")
+        return [[float(len(text))] for text in texts]
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+    def make(embedder, **kwargs):
+        batcher = EmbeddingBatcher(embedder, **kwargs)
+        batchers.append(batcher)
+        return batcher
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+def submit_all(batcher: EmbeddingBatcher, texts: list[str], task_type: str = None) -> list:
+    return [batcher.submit(text, task_type) for text in texts]
+
+def test_concurrent_texts_share_one_request(make_batcher):
+    embedder = RecordingEmbedder()
+    batcher = make_batcher(embedder, max_wait_ms=200)
+    futures = submit_all(batcher, ["a", "bb", "a", "ccc"])
+    assert [future.result(timeout=2) for future in futures] == [[1.0], [2.0], [1.0], [3.0]]
+    assert embedder.calls == [(["a", "bb", "ccc"], None)] # Identical texts are embedded once
+
+def test_batches_are_capped_at_max_batch_size(make_batcher):
+    embedder = RecordingEmbedder()
+    batcher = make_batcher(embedder, max_batch_size=3, max_wait_ms=200)
+    futures = submit_all(batcher, [f"text {i}" for i in range(7)])
+    assert [future.result(timeout=2) for future in futures] == [[6.0]] * 7
+    assert [len(texts) for texts, _ in embedder.calls] == [3, 3, 1]
+
+def test_a_lone_text_waits_at_most_max_wait(make_batcher):
+    batcher = make_batcher(RecordingEmbedder(), max_wait_ms=50)
+    start = time.monotonic()
+    assert batcher.submit("solo").result(timeout=2) == [4.0]
+    assert time.monotonic() - start < 1.0
+
+def test_each_task_type_gets_its_own_request_and_errors(make_batcher):
+    embedder = RecordingEmbedder(fail_task_type="RETRIEVAL_DOCUMENT")
+    batcher = make_batcher(embedder, max_wait_ms=200)
+    queries = submit_all(batcher, ["q1", "q2"], "RETRIEVAL_QUERY")
+    documents = submit_all(batcher, ["d1", "d2"], "RETRIEVAL_DOCUMENT")
+    assert [future.result(timeout=2) for future in queries] == [[2.0], [2.0]]
+    for future in documents:
+        with pytest.raises(RuntimeError, match="quota exceeded"):
+            future.result(timeout=2)
+    assert sorted(task_type for _, task_type in embedder.calls) == ["RETRIEVAL_DOCUMENT", "RETRIEVAL_QUERY"]
+
+def test_wrong_number_of_vectors_fails_every_future(make_batcher):
+    batcher = make_batcher(lambda texts, task_type: [[0.0]], max_wait_ms=200)
+    futures = submit_all(batcher, ["a", "b"])
+    for future in futures:
+        with pytest.raises(ValueError, match="Expected 2 embeddings"):
+            future.result(timeout=2)
+
+def test_closed_batcher_flushes_queued_texts_and_refuses_new_ones(make_batcher):
+    batcher = make_batcher(RecordingEmbedder(), max_wait_ms=1000)
+    future = batcher.submit("queued")
+    batcher.close()
+    assert future.result(timeout=0) == [6.0]
+    with pytest.raises(RuntimeError):
+        batcher.submit("late")
@@ -0,0 +1,96 @@
+# tests/test_flet_update_scheduler.py
+
+import importlib
+import sys
+import threading
+import types
+import pytest
+
+class FakePage:
+    def __init__(self):
+        self.updates = [] # One entry per page.update() round-trip
+
+    def update(self, *controls):
+        self.updates.append(controls)
+
+class FakeControl:
+    def __init__(self, name: str):
+        self.name = name
+        self.scrolls = []
+
+    def scroll_to(self, **kwargs):
+        self.scrolls.append(kwargs)
+
+@pytest.fixture
+def scheduler_module(monkeypatch):
+    monkeypatch.setitem(sys.modules, "flet", types.SimpleNamespace(Page=FakePage, Control=FakeControl))
+    monkeypatch.delitem(sys.modules, "flet_update_scheduler", raising=False)
+    return importlib.import_module("flet_update_scheduler")
+
+@pytest.fixture
+def scheduler(scheduler_module):
+    """A scheduler whose flusher thread has exited, so the test drives flush() itself."""
+    scheduler = scheduler_module.FrameScheduler(FakePage())
+    scheduler.stop()
+    scheduler._thread.join(timeout=1)
+    return scheduler
+
+def test_one_page_update_per_frame(scheduler):
+    a, b = FakeControl("a"), FakeControl("b")
+    scheduler.update(a, b)
+    scheduler.update(a)
+    scheduler.flush()
+    assert scheduler.page.updates == [(a, b)]
+    scheduler.flush() # Nothing queued: no round-trip
+    assert len(scheduler.page.updates) == 1
+    assert scheduler.frames == 1
+
+def test_keyed_call_replaces_the_queued_one_in_place(scheduler):
+    applied = []
+    scheduler.call(lambda: applied.append("status 1"), key="status")
+    scheduler.call(lambda: applied.append("message"))
+    scheduler.call(lambda: applied.append("status 2"), key="status")
+    scheduler.flush()
+    assert applied == ["status 2", "message"]
+    scheduler.call(lambda: applied.append("status 3"), key="status") # A new frame starts a new slot
+    scheduler.flush()
+    assert applied[-1] == "status 3"
+
+def test_next_frame_runs_one_frame_later(scheduler):
+    applied = []
+    scheduler.next_frame(lambda: applied.append("second"))
+    scheduler.call(lambda: applied.append("first"))
+    scheduler.flush()
+    assert applied == ["first"]
+    scheduler.flush()
+    assert applied == ["first", "second"]
+
+def test_last_scroll_request_wins_and_runs_after_the_update(scheduler):
+    column = FakeControl("column")
+    scheduler.scroll_to(column, offset=10)
+    scheduler.scroll_to(column, offset=-1, duration=0)
+    scheduler.update(column)
+    scheduler.flush()
+    assert column.scrolls == [{"offset": -1, "duration": 0}]
+
+def test_failing_call_does_not_stop_the_frame(scheduler):
+    control = FakeControl("c")
+    scheduler.call(lambda: 1 / 0)
+    scheduler.update(control)
+    scheduler.flush()
+    assert scheduler.page.updates == [(control,)]
+
+def test_flusher_thread_coalesces_changes_from_other_threads(scheduler_module):
+    scheduler = scheduler_module.FrameScheduler(FakePage(), rate_hz=10)
+    done = threading.Event()
+    controls = [FakeControl(str(i)) for i in range(50)]
+    try:
+        for control in controls:
+            scheduler.update(control)
+        scheduler.call(done.set)
+        assert done.wait(timeout=2)
+    finally:
+        scheduler.stop()
+        scheduler._thread.join(timeout=1) # done.set ran before that frame's page.update
+    assert len(scheduler.page.updates) <= 2 # 50 updates in one or two frames, not 50 round-trips
+    assert sum(len(controls) for controls in scheduler.page.updates) == 50
@@ -0,0 +1,46 @@
+# tests/test_google_transport.py
+
+import pytest
+from google_transport import ClientPool
+
+class FakeTransport:
+    channels_created = 0
+
+    def __init__(self, host, channel):
+        self.host = host
+        self.channel = channel
+
+    @classmethod
+    def create_channel(cls, host, quota_project_id=None, options=None):
+        cls.channels_created += 1
+        return f"channel-{cls.channels_created}"
+
+class FakeClient:
+    def __init__(self, transport, client_options=None):
+        self.transport = transport
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(ClientPool, "_shared", {})
+    FakeTransport.channels_created = 0
+
+def test_clients_are_used_round_robin():
+    pool = ClientPool(FakeClient, FakeTransport, "example.googleapis.com", size=2)
+    assert pool.host == "example.googleapis.com:443"
+    first, second, third = pool.get(), pool.get(), pool.get()
+    assert first is not second and third is first
+
+def test_shared_pool_is_reused_and_grown_in_place():
+    pool = ClientPool.shared(FakeClient, FakeTransport, "example.googleapis.com", size=2)
+    assert ClientPool.shared(FakeClient, FakeTransport, "example.googleapis.com", size=1) is pool
+    bigger = ClientPool.shared(FakeClient, FakeTransport, "example.googleapis.com", size=4)
+    # The module already holding the pool sees the new channels; none were opened and dropped
+    assert bigger is pool
+    assert pool.size == 4
+    assert FakeTransport.channels_created == 4
+    assert pool.channels == ["channel-1", "channel-2", "channel-3", "channel-4"]
+
+def test_shared_pools_are_per_endpoint():
+    one = ClientPool.shared(FakeClient, FakeTransport, "one.googleapis.com")
+    other = ClientPool.shared(FakeClient, FakeTransport, "other.googleapis.com")
+    assert one is not other
@@ -0,0 +1,38 @@
+# tests/test_gui_design.py
+
+import tkinter as tk
+import pytest
+from gui_design import AcreaGUI
+
+@pytest.fixture
+def gui():
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        pytest.skip(f"Tk needs a display: {e}")
+    root.withdraw()
+    yield AcreaGUI(root, send_callback=lambda text: None)
+    root.destroy()
+
+def transcript(gui: AcreaGUI) -> str:
+    gui._render_pending()
+    return gui.output_text.get("1.0", "end-1c")
+
+def test_message_sent_mid_stream_does_not_split_the_reply(gui):
+    gui.display_message("You", "What is ACREA?")
+    gui.set_thinking_status(True)
+    gui.display_message("Acrea", "")
+    gui.append_to_last_message("An AI ")
+    transcript(gui)
+    gui.display_message("You", "And who made it?") # Sent (and queued) while the reply streams
+    gui.append_to_last_message("architecture ")
+    transcript(gui)
+    gui.append_to_last_message("assistant.")
+    gui.set_thinking_status(False)
+    assert transcript(gui) == "You: What is ACREA?\n\nAcrea: An AI architecture assistant.\n\nYou: And who made it?"
+
+    # The queued request's reply starts its own stream after the user's message
+    gui.set_thinking_status(True)
+    gui.display_message("Acrea", "")
+    gui.append_to_last_message("Its authors.")
+    assert transcript(gui).endswith("You: And who made it?\n\nAcrea: Its authors.")
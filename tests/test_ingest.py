@@ -0,0 +1,107 @@
+# tests/test_ingest.py
+
+import json
+import threading
+import pytest
+import ingest
+from benchmarks.fakes import fake_vector
+from content_store import ContentStore
+from ingest import IngestionPipeline, document_id
+from vector_memory_module import VectorMemoryModule
+
+DIMENSIONS = 8
+
+class CountingEmbedder:
+    """embed_texts stand-in: fake vectors, records embedded texts, fails texts containing `fail_on`."""
+    def __init__(self, fail_on: str = None):
+        self.texts = []
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def embed_texts(self, texts, task_type=None):
+        if self.fail_on and any(self.fail_on in text for text in texts):
+            raise RuntimeError("quota exceeded")
+        with self.lock:
+            self.texts.extend(texts)
+        return [fake_vector(text, DIMENSIONS) for text in texts]
+
+@pytest.fixture
+def corpus(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "alpha.txt").write_text("Alpha paragraph one.\n\nAlpha paragraph two.", encoding="utf-8")
+    (docs / "beta.md").write_text("Beta is short.", encoding="utf-8")
+    return docs
+
+@pytest.fixture
+def ingest_into(tmp_path, monkeypatch):
+    """Runs a fresh pipeline (as a new process would) over the same stores and checkpoint."""
+    monkeypatch.setattr(ingest, "MAX_EMBEDDING_ATTEMPTS", 1)
+    index_path = str(tmp_path / "index.npz")
+    saves = []
+    def run(paths, embedder, **kwargs):
+        memory = VectorMemoryModule.with_local_index(index_path, dimensions=DIMENSIONS, cache_max_entries=0)
+        original_save = memory.client.save
+        memory.client.save = lambda path: (saves.append(path), original_save(path))
+        store = ContentStore(str(tmp_path / "content"))
+        try:
+            pipeline = IngestionPipeline(embedder, store, memory, str(tmp_path / "checkpoint.json"),
+                                         chunk_size=30, chunk_overlap=0, embedding_workers=2,
+                                         embedding_batch_size=2, upsert_batch_size=2, **kwargs)
+            stats = pipeline.run([str(path) for path in paths])
+            return stats, memory.client, store.get_many(memory.client._ids)
+        finally:
+            store.close()
+    run.saves = saves
+    run.checkpoint = lambda: json.loads((tmp_path / "checkpoint.json").read_text(encoding="utf-8"))["files"]
+    return run
+
+def test_rerun_skips_unchanged_files_and_does_not_resave_the_index(corpus, ingest_into):
+    stats, index, contents = ingest_into([corpus], CountingEmbedder())
+    assert stats["files"] == 2 and stats["failed_chunks"] == 0
+    assert len(index) == stats["chunks"] == len(contents)
+    assert len(ingest_into.saves) == 1
+
+    embedder = CountingEmbedder()
+    stats, index, _ = ingest_into([corpus], embedder)
+    assert embedder.texts == []
+    assert stats["files"] == 0
+    assert len(ingest_into.saves) == 1 # Nothing was written, so the index file is left alone
+    assert len(ingest_into.checkpoint()) == 2
+
+def test_changed_file_is_reingested_and_its_stale_chunks_removed(corpus, ingest_into):
+    _, index, _ = ingest_into([corpus], CountingEmbedder())
+    alpha = str((corpus / "alpha.txt").resolve())
+    assert f"{document_id(alpha)}#1" in index._id_to_row
+
+    (corpus / "alpha.txt").write_text("Alpha, rewritten.", encoding="utf-8")
+    embedder = CountingEmbedder()
+    stats, index, contents = ingest_into([corpus], embedder)
+    assert embedder.texts == ["Alpha, rewritten."]
+    assert f"{document_id(alpha)}#1" not in index._id_to_row
+    assert contents[f"{document_id(alpha)}#0"] == "Alpha, rewritten."
+    assert ingest_into.checkpoint()[alpha]["chunks"] == 1
+
+def test_failed_file_is_left_out_of_the_checkpoint_and_retried(corpus, ingest_into):
+    stats, _, _ = ingest_into([corpus], CountingEmbedder(fail_on="Beta"))
+    assert stats["failed_chunks"] == 1
+    assert list(ingest_into.checkpoint()) == [str((corpus / "alpha.txt").resolve())]
+
+    embedder = CountingEmbedder()
+    stats, index, _ = ingest_into([corpus], embedder)
+    assert embedder.texts == ["Beta is short."]
+    assert len(ingest_into.checkpoint()) == 2
+    assert len(index) == 3
+
+def test_checkpoint_waits_for_an_index_save_that_covers_the_file(corpus, ingest_into, tmp_path):
+    memory = VectorMemoryModule.with_local_index(str(tmp_path / "index.npz"), dimensions=DIMENSIONS, cache_max_entries=0)
+    store = ContentStore(str(tmp_path / "content"))
+    pipeline = IngestionPipeline(CountingEmbedder(), store, memory, str(tmp_path / "checkpoint.json"),
+                                 index_save_interval=3600)
+    pipeline._files["done.txt"] = {"chunks": 1}
+    pipeline._index_dirty = True # Its rows were upserted but the index was not saved yet
+    pipeline._save_checkpoint()
+    assert ingest_into.checkpoint() == {}
+    pipeline._save_checkpoint(save_index=True)
+    assert ingest_into.checkpoint() == {"done.txt": {"chunks": 1}}
+    store.close()
@@ -0,0 +1,94 @@
+# tests/test_local_vector_index.py
+
+import numpy as np
+import pytest
+from local_vector_index import LocalVectorIndex, COSINE_DISTANCE, SQUARED_L2_DISTANCE
+
+DIMENSIONS = 16
+
+def clustered_vectors(count: int, seed: int = 0) -> np.ndarray:
+    """Points around 20 random centers, like embeddings of a handful of topics."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, DIMENSIONS))
+    return (centers[rng.integers(0, 20, count)] + 0.3 * rng.normal(size=(count, DIMENSIONS))).astype(np.float32)
+
+def ids_for(count: int) -> list[str]:
+    return [f"doc-{i}" for i in range(count)]
+
+def neighbor_ids(index: LocalVectorIndex, query, count: int = 10) -> list[str]:
+    return [neighbor["id"] for neighbor in index.find_neighbors(query, count)]
+
+@pytest.mark.parametrize("measure", [COSINE_DISTANCE, SQUARED_L2_DISTANCE])
+def test_trained_index_recall_matches_brute_force(measure):
+    vectors = clustered_vectors(3000)
+    exact = LocalVectorIndex(DIMENSIONS, distance_measure=measure, train_threshold=10**9)
+    approximate = LocalVectorIndex(DIMENSIONS, distance_measure=measure, train_threshold=1000, nprobe=8)
+    for start in range(0, len(vectors), 500): # Crosses the training threshold mid-way
+        exact.upsert_datapoints(ids_for(3000)[start:start + 500], vectors[start:start + 500])
+        approximate.upsert_datapoints(ids_for(3000)[start:start + 500], vectors[start:start + 500])
+    assert approximate._centroids is not None
+
+    queries = clustered_vectors(50, seed=1)
+    hits = sum(len(set(neighbor_ids(exact, query)) & set(neighbor_ids(approximate, query))) for query in queries)
+    assert hits / (10 * len(queries)) >= 0.9
+
+def test_upsert_replaces_existing_and_repeated_ids():
+    index = LocalVectorIndex(DIMENSIONS, distance_measure=SQUARED_L2_DISTANCE)
+    vectors = clustered_vectors(3)
+    index.upsert_datapoints(["a", "b"], vectors[:2])
+    # "a" moves, and the last of its two vectors in this call wins
+    assert index.upsert_datapoints(["a", "c", "a"], [vectors[1], vectors[2], vectors[2]]) == 2
+    assert len(index) == 3
+    top = index.find_neighbors(vectors[2], 2)
+    assert {neighbor["id"] for neighbor in top} == {"a", "c"}
+    assert top[0]["distance"] == pytest.approx(0.0, abs=1e-4)
+
+def test_removed_ids_are_not_returned():
+    index = LocalVectorIndex(DIMENSIONS, train_threshold=200)
+    vectors = clustered_vectors(400)
+    index.upsert_datapoints(ids_for(400), vectors)
+    assert index.remove_datapoints(["doc-0", "doc-1", "unknown"]) == 2
+    assert len(index) == 398
+    assert "doc-0" not in neighbor_ids(index, vectors[0], 50)
+    index.remove_datapoints(ids_for(400)[2:300]) # Over half tombstoned: compacted
+    assert index._size == len(index) == 100
+    remaining = neighbor_ids(index, vectors[350], 100)
+    assert remaining[0] == "doc-350"
+    assert set(remaining) <= set(ids_for(400)[300:])
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LocalVectorIndex(DIMENSIONS, distance_measure=COSINE_DISTANCE, train_threshold=500)
+    vectors = clustered_vectors(1000)
+    index.upsert_datapoints(ids_for(1000), vectors)
+    index.remove_datapoints(["doc-5"])
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+
+    with np.load(path, allow_pickle=False) as archive: # Nothing in the file needs pickle
+        assert archive["ids"].dtype.kind == "U"
+    loaded = LocalVectorIndex.load(path)
+    assert len(loaded) == 999
+    assert loaded.distance_measure == COSINE_DISTANCE
+    for query in clustered_vectors(20, seed=2):
+        assert neighbor_ids(loaded, query) == neighbor_ids(index, query)
+
+def test_load_refuses_pickled_index(tmp_path):
+    path = str(tmp_path / "old.npz")
+    np.savez(path, vectors=np.zeros((1, DIMENSIONS), dtype=np.float32), ids=np.array(["a"], dtype=object),
+             centroids=np.empty((0, DIMENSIONS), dtype=np.float32), assignments=np.zeros(1, dtype=np.int32),
+             meta=np.array([DIMENSIONS, 8, 20000, 0]), distance_measure=np.array("DOT_PRODUCT_DISTANCE"))
+    with pytest.raises(ValueError, match="pickled"):
+        LocalVectorIndex.load(path)
+
+@pytest.mark.parametrize("counts", [(2, 3), np.array([2, 3]), [np.int64(2), np.int32(3)]])
+def test_batch_neighbor_counts_accept_tuples_and_numpy_ints(counts):
+    index = LocalVectorIndex(DIMENSIONS)
+    vectors = clustered_vectors(10)
+    index.upsert_datapoints(ids_for(10), vectors)
+    results = index.find_neighbors_batch(vectors[:2], counts)
+    assert [len(neighbors) for neighbors in results] == [2, 3]
+    assert len(index.find_neighbors(vectors[0], np.int64(4))) == 4
+    with pytest.raises(ValueError):
+        index.find_neighbors_batch(vectors[:2], [2])
+    with pytest.raises(TypeError):
+        index.find_neighbors_batch(vectors[:2], [2.0, 3.0])
@@ -0,0 +1,61 @@
+# tests/test_retrieval_cache.py
+
+import numpy as np
+import pytest
+from retrieval_cache import RetrievalCache
+
+def neighbors(count: int) -> list[dict]:
+    return [{"id": f"doc-{i}", "distance": float(i)} for i in range(count)]
+
+@pytest.fixture
+def cache():
+    return RetrievalCache(max_entries=3, ttl_seconds=60.0, similarity_threshold=0.98)
+
+def test_exact_repeat_is_a_hit_and_results_are_copied(cache):
+    cache.put([1.0, 0.0, 0.0], 5, neighbors(5))
+    hit = cache.get([1.0, 0.0, 0.0], 5)
+    assert hit == neighbors(5)
+    hit[0]["id"] = "mutated"
+    assert cache.get([1.0, 0.0, 0.0], 5)[0]["id"] == "doc-0"
+    assert cache.stats()["exact_hits"] == 2
+
+def test_near_duplicate_query_reuses_a_result_with_enough_neighbors(cache):
+    cache.put([1.0, 0.0, 0.0], 5, neighbors(5))
+    assert cache.get([1.0, 0.01, 0.0], 3) == neighbors(3) # Similar query, fewer neighbors
+    assert cache.get([1.0, 0.01, 0.0], 10) is None # Needs more neighbors than were cached
+    assert cache.get([0.0, 1.0, 0.0], 3) is None # Different query
+    assert cache.stats()["near_hits"] == 1
+
+def test_threshold_above_one_only_serves_exact_repeats():
+    cache = RetrievalCache(similarity_threshold=1.1)
+    cache.put([1.0, 0.0], 2, neighbors(2))
+    assert cache.get([1.0, 0.001], 2) is None
+    assert cache.get([1.0, 0.0], 2) == neighbors(2)
+
+def test_entries_expire(cache, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("retrieval_cache.time.monotonic", lambda: clock[0])
+    cache.put([1.0, 0.0], 2, neighbors(2))
+    clock[0] += 61.0
+    assert cache.get([1.0, 0.0], 2) is None
+    assert cache.get([1.0, 0.001], 2) is None
+
+def test_least_recently_used_entry_is_evicted(cache):
+    queries = np.eye(4, dtype=np.float32)
+    for query in queries[:3]:
+        cache.put(query, 1, neighbors(1))
+    cache.get(queries[0], 1) # Refresh the first one
+    cache.put(queries[3], 1, neighbors(1))
+    assert cache.get(queries[0], 1) is not None
+    assert cache.get(queries[1], 1) is None
+    assert cache.stats()["entries"] == 3
+
+def test_invalidate_drops_entries_and_stale_puts(cache):
+    generation = cache.generation # Read before a search starts
+    cache.put([1.0, 0.0], 2, neighbors(2))
+    cache.invalidate() # The index changed while the search ran
+    assert cache.get([1.0, 0.0], 2) is None
+    cache.put([0.0, 1.0], 2, neighbors(2), generation=generation)
+    assert cache.get([0.0, 1.0], 2) is None
+    cache.put([0.0, 1.0], 2, neighbors(2), generation=cache.generation)
+    assert cache.get([0.0, 1.0], 2) == neighbors(2)
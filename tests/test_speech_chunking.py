@@ -0,0 +1,53 @@
+# tests/test_speech_chunking.py
+
+import pytest
+from speech_chunking import SentenceAccumulator, chunk_for_tts, split_sentences
+
+def byte_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+def test_split_sentences_keeps_closing_quotes():
+    assert split_sentences('He said "Stop." Then left! Why?') == ['He said "Stop."', "Then left!", "Why?"]
+
+def test_first_chunk_is_the_first_sentence_alone():
+    text = "Hello there. " + " ".join(f"Sentence number {i} is here." for i in range(40))
+    chunks = chunk_for_tts(text, target_bytes=200)
+    assert chunks[0] == "Hello there."
+    assert all(byte_len(chunk) <= 200 for chunk in chunks[1:])
+    assert " ".join(chunks) == text
+
+def test_oversized_sentence_is_cut_between_words_and_inside_long_words():
+    words = "word " * 30 + "é" * 40
+    chunks = chunk_for_tts(words, max_bytes=50)
+    assert all(byte_len(chunk) <= 50 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == words.replace(" ", "")
+
+def test_ssml_chunks_stay_wrapped_and_well_formed():
+    ssml = "<speak><p>First paragraph.</p><p>Second <emphasis>one</emphasis>.</p> Tail text.</speak>"
+    chunks = chunk_for_tts(ssml, target_bytes=40)
+    assert chunks[0] == "<speak><p>First paragraph.</p></speak>"
+    assert all(chunk.startswith("<speak>") and chunk.endswith("</speak>") for chunk in chunks)
+    assert "<emphasis>one</emphasis>" in "".join(chunks)
+
+def test_accumulator_waits_for_whitespace_after_punctuation():
+    accumulator = SentenceAccumulator()
+    assert accumulator.feed("Pi is 3.") == []
+    assert accumulator.feed("14. Next") == ["Pi is 3.14."]
+    assert accumulator.flush() == "Next"
+    assert accumulator.flush() is None
+
+def test_accumulator_cuts_long_text_at_a_space():
+    accumulator = SentenceAccumulator(max_bytes=20)
+    sentences = accumulator.feed("one two three four five six seven")
+    assert sentences and all(byte_len(sentence) <= 20 for sentence in sentences)
+    assert " ".join(sentences + [accumulator.flush()]) == "one two three four five six seven"
+
+@pytest.mark.parametrize("text", ["https://example.com/" + "a" * 60, "日本語のテキスト" * 5])
+def test_accumulator_hard_cuts_text_without_spaces(text):
+    accumulator = SentenceAccumulator(max_bytes=20)
+    sentences = []
+    for i in range(0, len(text), 7): # Streamed in small chunks
+        sentences += accumulator.feed(text[i:i + 7])
+    tail = accumulator.flush()
+    assert all(byte_len(sentence) <= 20 for sentence in sentences + [tail])
+    assert "".join(sentences) + tail == text
@@ -0,0 +1,27 @@
+# tests/test_vector_memory_module.py
+
+import numpy as np
+import pytest
+from vector_memory_module import VectorMemoryModule, as_neighbor_counts
+
+class SingleQueryBackend:
+    """A backend without find_neighbors_batch: the module runs one search per query."""
+    def find_neighbors(self, query_vector, neighbor_count, return_full_datapoint=False):
+        return [{"id": f"doc-{i}", "distance": float(i)} for i in range(neighbor_count)]
+
+@pytest.mark.parametrize("counts", [2, np.int64(2), (1, 2), np.array([1, 2])])
+def test_neighbor_counts_are_normalized_to_python_ints(counts):
+    normalized = as_neighbor_counts(counts, 2)
+    assert normalized in ([2, 2], [1, 2])
+    assert all(type(count) is int for count in normalized)
+
+@pytest.mark.parametrize("counts, error", [([1], ValueError), ([1, 0], ValueError), (2.5, TypeError), (["2", "3"], TypeError)])
+def test_invalid_neighbor_counts_are_rejected(counts, error):
+    with pytest.raises(error):
+        as_neighbor_counts(counts, 2)
+
+def test_batch_search_without_batch_backend_accepts_numpy_counts():
+    module = VectorMemoryModule(backend=SingleQueryBackend(), cache_max_entries=0)
+    results = module.handle_message("find_neighbors_batch", {"query_vectors": np.ones((2, 4), dtype=np.float32),
+                                                             "num_neighbors": np.array([1, 3])})
+    assert [len(neighbors) for neighbors in results] == [1, 3]
@@ -1,156 +1,286 @@
-# tts_module.py
-
-import logging
-import os
-from google.cloud import texttospeech
-from google.api_core import exceptions as google_exceptions
-import uuid # For unique filenames
-
-class TTSModule:
-    """
-    Handles text synthesis using Google Cloud Text-to-Speech API.
-    Saves the synthesized audio to a file.
-    """
-    def __init__(self, project_id: str = None,
-                 default_language_code: str = "en-US",
-                 default_voice_name: str = "en-US-Standard-C",
-                 default_audio_encoding = texttospeech.AudioEncoding.MP3,
-                 output_directory: str = "audio_cache"):
-        """
-        Initializes the TTS client and configuration.
-
-        Args:
-            project_id: Optional GCP Project ID. If None, inferred from ADC.
-            default_language_code: Default language code (e.g., "en-US", "pl-PL").
-            default_voice_name: Default voice name (e.g., "en-US-Standard-C", "pl-PL-Chirp3-HD-Leda").
-            default_audio_encoding: Default encoding (MP3 is recommended for playback).
-            output_directory: Folder where synthesized audio files will be saved.
-        """
-        self.logger = logging.getLogger("TTSModule")
-        self.default_language_code = default_language_code
-        self.default_voice_name = default_voice_name
-        self.default_audio_encoding = default_audio_encoding
-        self.output_directory = output_directory
-
-        try:
-            # Instantiate the client. ADC is used automatically.
-            # Pass project_id if provided, otherwise library attempts to infer.
-            client_options = {"quota_project_id": project_id} if project_id else None
-            self.client = texttospeech.TextToSpeechClient(client_options=client_options)
-            self.logger.info(f"TTSModule initialized. Project: {project_id or 'inferred'}. Default Voice: {self.default_voice_name}")
-
-            # Create output directory if it doesn't exist
-            if not os.path.exists(self.output_directory):
-                os.makedirs(self.output_directory)
-                self.logger.info(f"Created output directory: {self.output_directory}")
-
-        except google_exceptions.GoogleAPICallError as e:
-             self.logger.error(f"Failed to initialize TTS client (Check API enabled & ADC?): {e}", exc_info=True)
-             raise # Re-raise critical initialization error
-        except Exception as e:
-            self.logger.error(f"Failed to initialize TTSModule: {e}", exc_info=True)
-            raise
-
-    def _synthesize_speech(self, text_or_ssml: str, output_filename: str,
-                           language_code: str, voice_name: str,
-                           audio_encoding) -> str | None:
-        """Internal method to perform the synthesis and save the file."""
-        try:
-            # Determine if input is SSML or plain text
-            # Simple check: if it starts with '<speak>' assume SSML
-            if text_or_ssml.strip().startswith("<speak>"):
-                 synthesis_input = texttospeech.SynthesisInput(ssml=text_or_ssml)
-                 input_type = "SSML"
-            else:
-                 synthesis_input = texttospeech.SynthesisInput(text=text_or_ssml)
-                 input_type = "Text"
-
-            # Set the voice parameters
-            voice = texttospeech.VoiceSelectionParams(
-                language_code=language_code, name=voice_name
-            )
-
-            # Select the type of audio file you want
-            audio_config = texttospeech.AudioConfig(
-                audio_encoding=audio_encoding
-                # You can add speaking_rate, pitch etc. here if needed
-            )
-
-            self.logger.info(f"Synthesizing {input_type} (Voice: {voice_name}, Lang: {language_code})...")
-            # Perform the text-to-speech request
-            response = self.client.synthesize_speech(
-                input=synthesis_input, voice=voice, audio_config=audio_config
-            )
-
-            # Ensure output path is within the designated directory
-            output_path = os.path.join(self.output_directory, os.path.basename(output_filename))
-
-            # The response's audio_content is binary.
-            with open(output_path, "wb") as out:
-                out.write(response.audio_content)
-                self.logger.info(f"Audio content written to file: {output_path}")
-
-            return output_path # Return the full path to the saved file
-
-        except google_exceptions.InvalidArgument as e:
-            self.logger.error(f"TTS Invalid Argument (check text/ssml, voice name?): {e}", exc_info=True)
-            return None
-        except google_exceptions.GoogleAPICallError as e:
-            self.logger.error(f"TTS API Call Error (check quota, permissions?): {e}", exc_info=True)
-            return None
-        except Exception as e:
-            self.logger.error(f"Unexpected error during TTS synthesis: {e}", exc_info=True)
-            return None
-
-    def handle_message(self, action: str, payload: dict):
-        """Handles actions directed to the TTS module."""
-        if action == "synthesize_speech":
-            text_input = payload.get("text") # Prioritize plain text
-            ssml_input = payload.get("ssml") # Allow SSML override
-            output_filename_base = payload.get("output_filename", f"tts_output_{uuid.uuid4()}")
-
-            # Determine input content
-            content_to_synth = ssml_input if ssml_input else text_input
-            if not content_to_synth:
-                self.logger.error("Synthesize speech action missing 'text' or 'ssml' in payload.")
-                return {"success": False, "error": "Missing input text/ssml", "output_path": None}
-
-            # Determine filename and encoding (use defaults if not provided)
-            language_code = payload.get("language_code", self.default_language_code)
-            voice_name = payload.get("voice_name", self.default_voice_name)
-            audio_encoding_enum = payload.get("audio_encoding", self.default_audio_encoding)
-            # Ensure it's the enum type if passed as string (simple check)
-            if isinstance(audio_encoding_enum, str):
-                try:
-                    audio_encoding_enum = texttospeech.AudioEncoding[audio_encoding_enum.upper()]
-                except KeyError:
-                    self.logger.warning(f"Invalid audio encoding string '{audio_encoding_enum}', using default MP3.")
-                    audio_encoding_enum = texttospeech.AudioEncoding.MP3
-
-            # Determine file extension based on encoding
-            extension = ".mp3" # Default for MP3
-            if audio_encoding_enum == texttospeech.AudioEncoding.LINEAR16:
-                 extension = ".wav" # Or .raw
-            elif audio_encoding_enum == texttospeech.AudioEncoding.OGG_OPUS:
-                 extension = ".ogg"
-
-            # Construct unique output filename
-            output_filename = f"{output_filename_base}{extension}"
-
-            # Call the internal synthesis method
-            output_path = self._synthesize_speech(
-                text_or_ssml=content_to_synth,
-                output_filename=output_filename,
-                language_code=language_code,
-                voice_name=voice_name,
-                audio_encoding=audio_encoding_enum
-            )
-
-            if output_path:
-                return {"success": True, "output_path": output_path, "error": None}
-            else:
-                return {"success": False, "output_path": None, "error": "Synthesis failed. Check logs."}
-
-        else:
-            self.logger.warning(f"TTSModule received unknown action: {action}")
+# tts_module.py
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import uuid # For unique filenames
+from google_transport import ClientPool, DEFAULT_POOL_SIZE
+from audio_cache import AudioCache
+from speech_chunking import chunk_for_tts, is_ssml, DEFAULT_CHUNK_TARGET_BYTES
+from startup_report import import_module
+
+# Text-to-Speech SDK, imported when the first TTSModule is built (it is slow to import)
+texttospeech = None
+google_exceptions = None
+TextToSpeechGrpcTransport = None
+
+def _import_sdk():
+    global texttospeech, google_exceptions, TextToSpeechGrpcTransport
+    if texttospeech is None:
+        google_exceptions = import_module("google.api_core.exceptions")
+        TextToSpeechGrpcTransport = import_module(
+            "google.cloud.texttospeech_v1.services.text_to_speech.transports").TextToSpeechGrpcTransport
+        texttospeech = import_module("google.cloud.texttospeech")
+
+TTS_API_ENDPOINT = "texttospeech.googleapis.com"
+
+class TTSModule:
+    """
+    Handles text synthesis using Google Cloud Text-to-Speech API.
+    Saves the synthesized audio to a file.
+
+    'synthesize_speech_stream' splits long input on sentence boundaries and synthesizes the
+    chunks concurrently, yielding one result per chunk in playback order. The first chunk is a
+    single sentence, so playback can start while the rest is still being synthesized. It is
+    synthesized on the consumer's own thread, so it never waits behind other streams' chunks;
+    the rest share the synthesis pool, at most `stream_window` per stream at a time, so one long
+    answer cannot hold up the next.
+
+    Audio is cached in `output_directory` by content (AudioCache): a repeated input with the same
+    voice, language and encoding is served from disk, and the directory stays within
+    `audio_cache_max_entries` / `audio_cache_max_bytes`. With the cache enabled, output paths are
+    the cache's own file names and 'output_filename' is ignored.
+    """
+    def __init__(self, project_id: str = None,
+                 default_language_code: str = "en-US",
+                 default_voice_name: str = "en-US-Standard-C",
+                 default_audio_encoding = "MP3",
+                 output_directory: str = "audio_cache",
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 synthesis_workers: int = 4,
+                 stream_window: int = 2,
+                 chunk_target_bytes: int = DEFAULT_CHUNK_TARGET_BYTES,
+                 audio_cache_max_entries: int = 10000,
+                 audio_cache_max_bytes: int = 512 * 1024 * 1024):
+        """
+        Initializes the TTS client and configuration.
+
+        Args:
+            project_id: Optional GCP Project ID. If None, inferred from ADC.
+            default_language_code: Default language code (e.g., "en-US", "pl-PL").
+            default_voice_name: Default voice name (e.g., "en-US-Standard-C", "pl-PL-Chirp3-HD-Leda").
+            default_audio_encoding: Default encoding, a texttospeech.AudioEncoding or its name (MP3 is
+                                    recommended for playback).
+            output_directory: Folder where synthesized audio files will be saved.
+            pool_size: Number of persistent gRPC channels used round-robin for synthesis calls.
+            synthesis_workers: Size of the pool synthesizing streamed chunks (shared by all streams).
+            stream_window: Chunks of one stream in the pool at a time (synthesized ahead of playback).
+            chunk_target_bytes: Size to which sentences after the first are packed in streamed synthesis.
+            audio_cache_max_entries: Maximum cached audio files (0 disables the cache; every call then
+                                     writes a new file).
+            audio_cache_max_bytes: Maximum total size of the cached audio files.
+        """
+        self.logger = logging.getLogger("TTSModule")
+        _import_sdk()
+        if isinstance(default_audio_encoding, str):
+            default_audio_encoding = texttospeech.AudioEncoding[default_audio_encoding.upper()]
+        self.default_language_code = default_language_code
+        self.default_voice_name = default_voice_name
+        self.default_audio_encoding = default_audio_encoding
+        self.output_directory = output_directory
+        self.chunk_target_bytes = chunk_target_bytes
+        self.synthesis_executor = ThreadPoolExecutor(max_workers=synthesis_workers, thread_name_prefix="acrea-tts-chunk")
+        self.stream_window = max(1, stream_window)
+
+        try:
+            # Instantiate the client. ADC is used automatically.
+            # Pass project_id if provided, otherwise library attempts to infer.
+            client_options = {"quota_project_id": project_id} if project_id else None
+            self.client_pool = ClientPool.shared(
+                texttospeech.TextToSpeechClient, TextToSpeechGrpcTransport, TTS_API_ENDPOINT,
+                size=pool_size, client_options=client_options,
+            )
+            self.logger.info(f"TTSModule initialized. Project: {project_id or 'inferred'}. Default Voice: {self.default_voice_name}")
+
+            # Create output directory if it doesn't exist
+            if not os.path.exists(self.output_directory):
+                os.makedirs(self.output_directory)
+                self.logger.info(f"Created output directory: {self.output_directory}")
+            self.audio_cache = AudioCache(self.output_directory, audio_cache_max_entries, audio_cache_max_bytes) if audio_cache_max_entries else None
+
+        except google_exceptions.GoogleAPICallError as e:
+             self.logger.error(f"Failed to initialize TTS client (Check API enabled & ADC?): {e}", exc_info=True)
+             raise # Re-raise critical initialization error
+        except Exception as e:
+            self.logger.error(f"Failed to initialize TTSModule: {e}", exc_info=True)
+            raise
+
+    def _synthesize_speech(self, text_or_ssml: str, output_filename: str,
+                           language_code: str, voice_name: str,
+                           audio_encoding) -> str | None:
+        """Internal method to perform the synthesis and save the file (or return the cached one)."""
+        try:
+            cache_key = None
+            if self.audio_cache:
+                cache_key = AudioCache.make_key(text_or_ssml, language_code, voice_name, audio_encoding)
+                cached_path = self.audio_cache.get(cache_key)
+                if cached_path:
+                    self.logger.info(f"Serving cached audio: {cached_path}")
+                    return cached_path
+
+            # Determine if input is SSML or plain text
+            # Simple check: if it starts with '<speak>' assume SSML
+            if is_ssml(text_or_ssml):
+                 synthesis_input = texttospeech.SynthesisInput(ssml=text_or_ssml)
+                 input_type = "SSML"
+            else:
+                 synthesis_input = texttospeech.SynthesisInput(text=text_or_ssml)
+                 input_type = "Text"
+
+            # Set the voice parameters
+            voice = texttospeech.VoiceSelectionParams(
+                language_code=language_code, name=voice_name
+            )
+
+            # Select the type of audio file you want
+            audio_config = texttospeech.AudioConfig(
+                audio_encoding=audio_encoding
+                # You can add speaking_rate, pitch etc. here if needed
+            )
+
+            self.logger.info(f"Synthesizing {input_type} (Voice: {voice_name}, Lang: {language_code})...")
+            # Perform the text-to-speech request
+            response = self.client_pool.get().synthesize_speech(
+                input=synthesis_input, voice=voice, audio_config=audio_config
+            )
+
+            if cache_key:
+                output_path = self.audio_cache.put(cache_key, response.audio_content, os.path.splitext(output_filename)[1])
+                self.logger.info(f"Audio content written to cache file: {output_path}")
+                return output_path
+
+            # Ensure output path is within the designated directory
+            output_path = os.path.join(self.output_directory, os.path.basename(output_filename))
+
+            # The response's audio_content is binary.
+            with open(output_path, "wb") as out:
+                out.write(response.audio_content)
+                self.logger.info(f"Audio content written to file: {output_path}")
+
+            return output_path # Return the full path to the saved file
+
+        except google_exceptions.InvalidArgument as e:
+            self.logger.error(f"TTS Invalid Argument (check text/ssml, voice name?): {e}", exc_info=True)
+            return None
+        except google_exceptions.GoogleAPICallError as e:
+            self.logger.error(f"TTS API Call Error (check quota, permissions?): {e}", exc_info=True)
+            return None
+        except Exception as e:
+            self.logger.error(f"Unexpected error during TTS synthesis: {e}", exc_info=True)
+            return None
+
+    def _resolve_voice(self, payload: dict):
+        """Returns (language_code, voice_name, audio_encoding, file_extension) from the payload and defaults."""
+        language_code = payload.get("language_code", self.default_language_code)
+        voice_name = payload.get("voice_name", self.default_voice_name)
+        audio_encoding_enum = payload.get("audio_encoding", self.default_audio_encoding)
+        # Ensure it's the enum type if passed as string (simple check)
+        if isinstance(audio_encoding_enum, str):
+            try:
+                audio_encoding_enum = texttospeech.AudioEncoding[audio_encoding_enum.upper()]
+            except KeyError:
+                self.logger.warning(f"Invalid audio encoding string '{audio_encoding_enum}', using default MP3.")
+                audio_encoding_enum = texttospeech.AudioEncoding.MP3
+
+        # Determine file extension based on encoding
+        extension = ".mp3" # Default for MP3
+        if audio_encoding_enum == texttospeech.AudioEncoding.LINEAR16:
+             extension = ".wav" # Or .raw
+        elif audio_encoding_enum == texttospeech.AudioEncoding.OGG_OPUS:
+             extension = ".ogg"
+        return language_code, voice_name, audio_encoding_enum, extension
+
+    def _stream_chunks(self, chunks: list[str], output_filename_base: str, language_code: str,
+                       voice_name: str, audio_encoding, extension: str):
+        """
+        Yields the chunks' results in order, each as soon as it and all earlier chunks are done.
+        The first chunk is synthesized on the calling thread while the next `stream_window` run in
+        the pool; each result taken from the pool submits the next chunk. Submitted chunks not yet
+        started are cancelled if the consumer stops early.
+        """
+        def synthesize(index: int):
+            return self._synthesize_speech(chunks[index], f"{output_filename_base}_{index:03d}{extension}",
+                                           language_code, voice_name, audio_encoding)
+
+        pending = deque(self.synthesis_executor.submit(synthesize, index)
+                        for index in range(1, min(len(chunks), 1 + self.stream_window)))
+        next_index = 1 + len(pending)
+        try:
+            for index in range(len(chunks)):
+                if index == 0:
+                    output_path = synthesize(0)
+                else:
+                    output_path = pending.popleft().result()
+                    if next_index < len(chunks):
+                        pending.append(self.synthesis_executor.submit(synthesize, next_index))
+                        next_index += 1
+                if output_path:
+                    yield {"success": True, "index": index, "count": len(chunks), "output_path": output_path, "error": None}
+                else:
+                    yield {"success": False, "index": index, "count": len(chunks), "output_path": None, "error": "Synthesis failed. Check logs."}
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        """Stops the chunk synthesis pool and closes the audio cache index."""
+        self.synthesis_executor.shutdown(wait=False, cancel_futures=True)
+        if self.audio_cache:
+            self.audio_cache.close()
+
+    def warm_up(self) -> float:
+        """Opens the pooled channels and sends a cheap list_voices call. Returns elapsed seconds."""
+        return self.client_pool.warm_up(lambda client: client.list_voices(language_code=self.default_language_code))
+
+    def handle_message(self, action: str, payload: dict):
+        """Handles actions directed to the TTS module."""
+        if action == "synthesize_speech":
+            text_input = payload.get("text") # Prioritize plain text
+            ssml_input = payload.get("ssml") # Allow SSML override
+            output_filename_base = payload.get("output_filename", f"tts_output_{uuid.uuid4()}")
+
+            # Determine input content
+            content_to_synth = ssml_input if ssml_input else text_input
+            if not content_to_synth:
+                self.logger.error("Synthesize speech action missing 'text' or 'ssml' in payload.")
+                return {"success": False, "error": "Missing input text/ssml", "output_path": None}
+
+            # Determine filename and encoding (use defaults if not provided)
+            language_code, voice_name, audio_encoding_enum, extension = self._resolve_voice(payload)
+
+            # Construct unique output filename
+            output_filename = f"{output_filename_base}{extension}"
+
+            # Call the internal synthesis method
+            output_path = self._synthesize_speech(
+                text_or_ssml=content_to_synth,
+                output_filename=output_filename,
+                language_code=language_code,
+                voice_name=voice_name,
+                audio_encoding=audio_encoding_enum
+            )
+
+            if output_path:
+                return {"success": True, "output_path": output_path, "error": None}
+            else:
+                return {"success": False, "output_path": None, "error": "Synthesis failed. Check logs."}
+
+        elif action == "synthesize_speech_stream":
+            # Returns a generator of per-chunk results (same keys as synthesize_speech plus
+            # 'index' and 'count'); consume it via the coordinator's stream_message_async
+            content_to_synth = payload.get("ssml") or payload.get("text")
+            if not content_to_synth:
+                self.logger.error("Synthesize speech stream action missing 'text' or 'ssml' in payload.")
+                return iter([{"success": False, "error": "Missing input text/ssml", "output_path": None}])
+            chunks = chunk_for_tts(content_to_synth, target_bytes=payload.get("chunk_target_bytes", self.chunk_target_bytes))
+            self.logger.info(f"Streaming synthesis of {len(chunks)} chunk(s).")
+            return self._stream_chunks(chunks, payload.get("output_filename", f"tts_output_{uuid.uuid4()}"),
+                                       *self._resolve_voice(payload))
+
+        elif action == "get_cache_stats":
+            return self.audio_cache.stats() if self.audio_cache else None
+
+        else:
+            self.logger.warning(f"TTSModule received unknown action: {action}")
             return {"success": False, "error": f"Unknown action: {action}", "output_path": None}
\ No newline at end of file
@@ -1,47 +1,192 @@
-# vector_memory_module.py
-
-import logging
-# Assuming vector_search_client.py is accessible
-from vector_search_client import VertexVectorSearchClient
-from system_prompt_module import ACREA_SYSTEM_PROMPT
-
-class VectorMemoryModule:
-    """Handles interaction with the Vertex AI Vector Search index."""
-    def __init__(self, api_endpoint: str, index_endpoint_name: str, deployed_index_id: str):
-        self.logger = logging.getLogger("VectorMemoryModule")
-        try:
-            # Use the client class we defined earlier
-            self.client = VertexVectorSearchClient(
-                api_endpoint=api_endpoint,
-                index_endpoint_resource_name=index_endpoint_name,
-                deployed_index_id=deployed_index_id,
-            )
-            self.logger.info("VectorMemoryModule initialized.")
-        except Exception as e:
-            self.logger.error(f"Failed to initialize VectorMemoryModule: {e}", exc_info=True)
-            raise
-
-    def handle_message(self, action: str, payload: dict):
-        """Handles actions directed to the vector memory module."""
-        if action == "find_neighbors":
-            query_vector = payload.get("query_vector")
-            num_neighbors = payload.get("num_neighbors", 5) # Default to 5 neighbors
-
-            if not query_vector:
-                self.logger.error("Find neighbors action received without 'query_vector' in payload.")
-                return [] # Return empty list on error
-
-            try:
-                neighbors = self.client.find_neighbors(
-                    query_vector=query_vector,
-                    neighbor_count=num_neighbors
-                )
-                self.logger.info(f"Found {len(neighbors)} neighbors in vector memory.")
-                # Returns list of dicts like [{'id': '...', 'distance': ...}, ...]
-                return neighbors
-            except Exception as e:
-                self.logger.error(f"Error during vector search: {e}", exc_info=True)
-                return [] # Return empty list on error
-        else:
-            self.logger.warning(f"VectorMemoryModule received unknown action: {action}")
+# vector_memory_module.py
+
+import logging
+import operator
+from retrieval_cache import RetrievalCache
+from system_prompt_module import ACREA_SYSTEM_PROMPT
+
+def as_neighbor_counts(neighbor_counts, query_count: int) -> list[int]:
+    """
+    Normalizes a batch search's neighbor counts to one Python int per query. Accepts an int or
+    a sequence of ints, NumPy integers and integer arrays included.
+
+    Raises:
+        TypeError: If a count is not an integer.
+        ValueError: If a count is not positive or the counts don't match the queries.
+    """
+    try:
+        counts = [operator.index(neighbor_counts)] * query_count
+    except TypeError:
+        try:
+            counts = [operator.index(count) for count in neighbor_counts]
+        except TypeError:
+            raise TypeError("neighbor_counts must be an int or a sequence of ints.") from None
+    if len(counts) != query_count:
+        raise ValueError("neighbor_counts must be an int or a sequence with one count per query vector.")
+    if any(count <= 0 for count in counts):
+        raise ValueError("neighbor_count must be a positive integer.")
+    return counts
+
+class VectorMemoryModule:
+    """
+    Handles interaction with the vector search backend.
+
+    The backend is any object with `find_neighbors(query_vector, neighbor_count, return_full_datapoint)`
+    returning [{'id': ..., 'distance': ...}, ...]. Query vectors may be lists, float32 NumPy arrays
+    or buffer-protocol objects; they are passed through without copying. By default it is a VertexVectorSearchClient;
+    a LocalVectorIndex (or another implementation) can be passed in as `backend`. Backends that
+    also implement `upsert_datapoints`, `remove_datapoints` and `save` support the matching actions.
+
+    Single-query searches go through a RetrievalCache (exact and near-duplicate hits). It is
+    invalidated by this module's own index updates; call the 'invalidate_cache' action when the
+    index is updated elsewhere (e.g. a Vertex index rebuilt by another process).
+    """
+    def __init__(self, api_endpoint: str = None, index_endpoint_name: str = None, deployed_index_id: str = None,
+                 index_resource_name: str = None, backend: object = None, index_path: str = None,
+                 cache_max_entries: int = 1024, cache_ttl_seconds: float = 300.0, cache_similarity: float = 0.98):
+        """
+        Args:
+            api_endpoint, index_endpoint_name, deployed_index_id: Vertex AI Vector Search settings,
+                used when no backend is given.
+            index_resource_name: Vertex AI Index resource name; enables upserts/removals on the Vertex backend.
+            backend: Pre-built search backend (e.g. LocalVectorIndex).
+            index_path: Where 'save_index' writes backends that support persistence.
+            cache_max_entries: Size of the retrieval result cache (0 disables it).
+            cache_ttl_seconds: Lifetime of cached search results.
+            cache_similarity: Cosine similarity above which a cached query's results are reused.
+        """
+        self.logger = logging.getLogger("VectorMemoryModule")
+        self.index_path = index_path
+        self.cache = RetrievalCache(cache_max_entries, cache_ttl_seconds, cache_similarity) if cache_max_entries else None
+        try:
+            if backend is not None:
+                self.client = backend
+            else:
+                # Imported here so local backends work without google-cloud-aiplatform installed
+                from vector_search_client import VertexVectorSearchClient
+                self.client = VertexVectorSearchClient(
+                    api_endpoint=api_endpoint,
+                    index_endpoint_resource_name=index_endpoint_name,
+                    deployed_index_id=deployed_index_id,
+                    index_resource_name=index_resource_name,
+                )
+            self.logger.info(f"VectorMemoryModule initialized (backend: {type(self.client).__name__}).")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize VectorMemoryModule: {e}", exc_info=True)
+            raise
+
+    @classmethod
+    def with_local_index(cls, index_path: str, dimensions: int = 768, **module_kwargs) -> "VectorMemoryModule":
+        """Builds the module on an in-process LocalVectorIndex, loaded from index_path when it exists."""
+        from local_vector_index import LocalVectorIndex
+        backend = LocalVectorIndex.load_or_create(index_path, dimensions)
+        return cls(backend=backend, index_path=index_path, **module_kwargs)
+
+    def handle_message(self, action: str, payload: dict):
+        """Handles actions directed to the vector memory module."""
+        if action == "find_neighbors":
+            query_vector = payload.get("query_vector")
+            num_neighbors = payload.get("num_neighbors", 5) # Default to 5 neighbors
+
+            # query_vector may be a list, a float32 ndarray or a buffer; avoid truthiness checks on arrays
+            if query_vector is None or len(query_vector) == 0:
+                self.logger.error("Find neighbors action received without 'query_vector' in payload.")
+                return [] # Return empty list on error
+
+            use_cache = self.cache is not None and not payload.get("bypass_cache", False)
+            if use_cache:
+                cached = self.cache.get(query_vector, num_neighbors)
+                if cached is not None:
+                    self.logger.info(f"Served {len(cached)} neighbors from the retrieval cache.")
+                    return cached
+                generation = self.cache.generation # Read before searching so a concurrent invalidation wins
+
+            try:
+                neighbors = self.client.find_neighbors(
+                    query_vector=query_vector,
+                    neighbor_count=num_neighbors
+                )
+                self.logger.info(f"Found {len(neighbors)} neighbors in vector memory.")
+                if use_cache:
+                    self.cache.put(query_vector, num_neighbors, neighbors, generation=generation)
+                # Returns list of dicts like [{'id': '...', 'distance': ...}, ...]
+                return neighbors
+            except Exception as e:
+                self.logger.error(f"Error during vector search: {e}", exc_info=True)
+                return [] # Return empty list on error
+
+        elif action == "find_neighbors_batch":
+            # Several queries in one round-trip; returns one neighbor list per query vector
+            query_vectors = payload.get("query_vectors")
+            num_neighbors = payload.get("num_neighbors", 5) # An int, or one count per query vector
+
+            if query_vectors is None or len(query_vectors) == 0:
+                self.logger.error("Find neighbors batch action received without 'query_vectors' in payload.")
+                return []
+
+            try:
+                if hasattr(self.client, "find_neighbors_batch"):
+                    results = self.client.find_neighbors_batch(
+                        query_vectors=query_vectors,
+                        neighbor_counts=num_neighbors
+                    )
+                else:
+                    counts = as_neighbor_counts(num_neighbors, len(query_vectors))
+                    results = [self.client.find_neighbors(query_vector=q, neighbor_count=n) for q, n in zip(query_vectors, counts)]
+                self.logger.info(f"Ran {len(results)} vector searches in one batch.")
+                return results
+            except Exception as e:
+                self.logger.error(f"Error during batched vector search: {e}", exc_info=True)
+                return []
+
+        elif action in ("upsert_datapoints", "remove_datapoints", "save_index"):
+            result = self._handle_index_update(action, payload)
+            if result and action != "save_index":
+                self.invalidate_cache()
+            return result
+
+        elif action == "invalidate_cache":
+            self.invalidate_cache()
+            return True
+
+        elif action == "get_cache_stats":
+            return self.cache.stats() if self.cache else None
+        else:
+            self.logger.warning(f"VectorMemoryModule received unknown action: {action}")
+            return None
+
+    def warm_up(self) -> float:
+        """Warms the backend's connections if it has any (local indexes need nothing)."""
+        return self.client.warm_up() if hasattr(self.client, "warm_up") else 0.0
+
+    def invalidate_cache(self):
+        """Drops cached search results; hook for any code that updates the index."""
+        if self.cache:
+            self.cache.invalidate()
+
+    def _handle_index_update(self, action: str, payload: dict):
+        """Index maintenance actions. Returns the number of datapoints affected (True for save), or None on error."""
+        if not hasattr(self.client, action if action != "save_index" else "save"):
+            self.logger.error(f"Backend {type(self.client).__name__} does not support '{action}'.")
+            return None
+        try:
+            if action == "upsert_datapoints":
+                ids, vectors = payload.get("ids"), payload.get("vectors")
+                if not ids or vectors is None:
+                    self.logger.error("Upsert datapoints action requires 'ids' and 'vectors' in payload.")
+                    return None
+                count = self.client.upsert_datapoints(ids, vectors)
+            elif action == "remove_datapoints":
+                count = self.client.remove_datapoints(payload.get("ids", []))
+            else:
+                path = payload.get("path", self.index_path)
+                if not path:
+                    self.logger.error("Save index action requires 'path' in payload or an index_path.")
+                    return None
+                self.client.save(path)
+                return True
+            self.logger.info(f"{action}: {count} datapoints.")
+            return count
+        except Exception as e:
+            self.logger.error(f"Error during {action}: {e}", exc_info=True)
             return None
\ No newline at end of file
@@ -1,200 +1,351 @@
-import os
-import sys
-from typing import List, Dict, Any, Optional
-# Import necessary Google Cloud libraries
-try:
-    from google.cloud import aiplatform_v1
-    from google.api_core import exceptions as google_exceptions
-except ImportError:
-    print("Error: google-cloud-aiplatform library not found.", file=sys.stderr)
-    print("Please install it using: pip install google-cloud-aiplatform", file=sys.stderr)
-    sys.exit(1)
-
-
-DEFAULT_API_ENDPOINT = "YOUR_API_ENDPOINT" 
-DEFAULT_INDEX_ENDPOINT_RESOURCE_NAME = "YOUR_INDEX_ENDPOINT_RESOURCE_NAME" 
-DEFAULT_DEPLOYED_INDEX_ID = "YOUR_DEPLOYED_INDEX_ID" 
-
-
-class VertexVectorSearchClient:
-    """
-    A client module for interacting with a Google Cloud Vertex AI Vector Search index.
-
-    This class encapsulates the configuration and logic for performing nearest
-    neighbor searches against a specific deployed index endpoint.
-    """
-
-    def __init__(
-        self,
-        api_endpoint: str = DEFAULT_API_ENDPOINT,
-        index_endpoint_resource_name: str = DEFAULT_INDEX_ENDPOINT_RESOURCE_NAME,
-        deployed_index_id: str = DEFAULT_DEPLOYED_INDEX_ID,
-        client_options: Optional[Dict[str, Any]] = None,
-    ):
-        """
-        Initializes the VertexVectorSearchClient.
-
-        Args:
-            api_endpoint: The specific API endpoint for the deployed index
-                          (e.g., "12345.us-central1-12345.vdb.vertexai.goog").
-            index_endpoint_resource_name: The full resource name of the Index Endpoint
-                                         (e.g., "projects/.../locations/.../indexEndpoints/...").
-            deployed_index_id: The ID of the specific index deployed on the endpoint.
-            client_options: Optional dictionary of client options passed directly to
-                            aiplatform_v1.MatchServiceClient. Primarily used for custom
-                            endpoint configuration if api_endpoint is not sufficient.
-
-        Raises:
-            ValueError: If required configuration arguments are missing or invalid.
-            ImportError: If google-cloud-aiplatform is not installed.
-        """
-        if not all([api_endpoint, index_endpoint_resource_name, deployed_index_id]):
-            raise ValueError("API endpoint, index endpoint resource name, and deployed index ID are required.")
-
-        self.api_endpoint = api_endpoint
-        self.index_endpoint_resource_name = index_endpoint_resource_name
-        self.deployed_index_id = deployed_index_id
-
-        effective_client_options = {"api_endpoint": self.api_endpoint}
-        if client_options:
-            effective_client_options.update(client_options)
-
-        try:
-            # Configure and initialize the underlying Vector Search client
-            self.client = aiplatform_v1.MatchServiceClient(
-                client_options=effective_client_options,
-            )
-            print(f"VertexVectorSearchClient initialized for endpoint: {self.api_endpoint}")
-        except Exception as e:
-            print(f"Error initializing MatchServiceClient: {e}", file=sys.stderr)
-            raise # Re-raise the exception after logging
-
-    def find_neighbors(
-        self,
-        query_vector: List[float],
-        neighbor_count: int = 10,
-        return_full_datapoint: bool = False,
-    ) -> List[Dict[str, Any]]:
-        """
-        Finds the nearest neighbors for a given query vector.
-
-        Args:
-            query_vector: A list of floats representing the embedding or feature vector
-                          to search for.
-            neighbor_count: The desired number of nearest neighbors to retrieve.
-            return_full_datapoint: If True, retrieve the full datapoint object
-                                   (including feature vector) for each neighbor.
-                                   Defaults to False for efficiency.
-
-        Returns:
-            A list of dictionaries, where each dictionary represents a neighbor
-            and contains 'id' (the datapoint ID) and 'distance' (the distance
-            score from the query vector). Returns an empty list if no neighbors
-            are found or an error occurs.
-
-        Raises:
-            TypeError: If query_vector is not a list of floats or neighbor_count is not an int.
-            ValueError: If neighbor_count is not positive.
-            google_exceptions.GoogleAPICallError: If the API call fails.
-        """
-        if not isinstance(query_vector, list) or not all(isinstance(n, (int, float)) for n in query_vector):
-            raise TypeError("query_vector must be a list of numbers (floats or ints).")
-        if not isinstance(neighbor_count, int):
-             raise TypeError("neighbor_count must be an integer.")
-        if neighbor_count <= 0:
-            raise ValueError("neighbor_count must be a positive integer.")
-
-        try:
-            # 1. Construct the datapoint for the query vector
-            datapoint = aiplatform_v1.IndexDatapoint(feature_vector=query_vector)
-
-            # 2. Construct the query object
-            query = aiplatform_v1.FindNeighborsRequest.Query(
-                datapoint=datapoint,
-                neighbor_count=neighbor_count,
-            )
-
-            # 3. Construct the main request
-            request = aiplatform_v1.FindNeighborsRequest(
-                index_endpoint=self.index_endpoint_resource_name,
-                deployed_index_id=self.deployed_index_id,
-                queries=[query],
-                return_full_datapoint=return_full_datapoint,
-            )
-
-            # 4. Execute the request
-            response = self.client.find_neighbors(request)
-
-            # 5. Process the response
-            processed_neighbors = []
-            # The response contains a list of nearest_neighbor_result, one for each query.
-            # Since we sent one query, we access the first element.
-            if response.nearest_neighbors and response.nearest_neighbors[0].neighbors:
-                for neighbor in response.nearest_neighbors[0].neighbors:
-                    neighbor_data = {"id": neighbor.datapoint.datapoint_id, "distance": neighbor.distance}
-                    if return_full_datapoint:
-                         neighbor_data["feature_vector"] = list(neighbor.datapoint.feature_vector) # Convert tuple to list
-                    processed_neighbors.append(neighbor_data)
-
-            return processed_neighbors
-
-        except google_exceptions.GoogleAPICallError as e:
-            print(f"API Error during find_neighbors: {e}", file=sys.stderr)
-            raise # Re-raise the API error for upstream handling
-        except Exception as e:
-            print(f"An unexpected error occurred in find_neighbors: {e}", file=sys.stderr)
-            # Depending on desired robustness, you might raise, return [], or log differently
-            raise # Re-raise unexpected errors by default
-
-
-# --- Example Usage (Guard with if __name__ == "__main__":) ---
-if __name__ == "__main__":
-    # Best Practice: Load sensitive details from environment variables or a config system
-    # Ensure these environment variables are set before running the script
-    API_ENDPOINT = os.environ.get("VDB_API_ENDPOINT", DEFAULT_API_ENDPOINT)
-    INDEX_ENDPOINT = os.environ.get("VDB_INDEX_ENDPOINT_RESOURCE_NAME", DEFAULT_INDEX_ENDPOINT_RESOURCE_NAME)
-    DEPLOYED_INDEX_ID = os.environ.get("VDB_DEPLOYED_INDEX_ID", DEFAULT_DEPLOYED_INDEX_ID)
-
-    # --- Dummy Example ---
-    # Replace this with a real feature vector (e.g., from a text embedding model)
-    # The dimension must match the dimension of the vectors in your index!
-    # Example: A 4-dimensional vector
-    example_query_vector = [0.1, 0.8, 0.3, 0.5]
-    num_neighbors_to_find = 5
-
-    print("\n--- Running Vertex AI Vector Search Example ---")
-    print(f"Target Index Endpoint: {INDEX_ENDPOINT}")
-    print(f"Deployed Index ID: {DEPLOYED_INDEX_ID}")
-
-    try:
-        # Instantiate the client
-        search_client = VertexVectorSearchClient(
-            api_endpoint=API_ENDPOINT,
-            index_endpoint_resource_name=INDEX_ENDPOINT,
-            deployed_index_id=DEPLOYED_INDEX_ID,
-        )
-
-        # Perform the search
-        print(f"\nSearching for {num_neighbors_to_find} neighbors for vector: {example_query_vector[:10]}...") # Print first few dimensions
-        neighbors = search_client.find_neighbors(
-            query_vector=example_query_vector,
-            neighbor_count=num_neighbors_to_find
-        )
-
-        # Display results
-        if neighbors:
-            print(f"\nFound {len(neighbors)} neighbors:")
-            for i, neighbor in enumerate(neighbors):
-                print(f"  {i+1}. ID: {neighbor['id']}, Distance: {neighbor['distance']:.4f}")
-        else:
-            print("\nNo neighbors found.")
-
-    except ValueError as ve:
-        print(f"\nConfiguration Error: {ve}", file=sys.stderr)
-    except ImportError as ie:
-         # Message already printed if import failed initially
-         pass
-    except google_exceptions.GoogleAPICallError as api_error:
-        print(f"\nAPI Call Failed: {api_error}", file=sys.stderr)
-    except Exception as e:
+import os
+import sys
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
+# Import necessary Google Cloud libraries
+try:
+    from google.cloud import aiplatform_v1
+    from google.cloud.aiplatform_v1.services.match_service.transports import MatchServiceGrpcTransport
+    from google.cloud.aiplatform_v1.services.index_service.transports import IndexServiceGrpcTransport
+    from google.api_core import exceptions as google_exceptions
+except ImportError as e:
+    # Raised rather than exiting, so importers (e.g. VectorMemoryModule) can report it or fall back
+    raise ImportError("google-cloud-aiplatform library not found. "
+                      "Please install it using: pip install google-cloud-aiplatform") from e
+from google_transport import ClientPool, DEFAULT_POOL_SIZE
+from vector_memory_module import as_neighbor_counts
+
+
+DEFAULT_API_ENDPOINT = "YOUR_API_ENDPOINT" 
+DEFAULT_INDEX_ENDPOINT_RESOURCE_NAME = "YOUR_INDEX_ENDPOINT_RESOURCE_NAME" 
+DEFAULT_DEPLOYED_INDEX_ID = "YOUR_DEPLOYED_INDEX_ID" 
+
+# Datapoints sent per UpsertDatapoints request
+MAX_UPSERT_BATCH_SIZE = 1000
+
+# Anything np.asarray understands: lists, float32 ndarrays, or buffer-protocol objects (memoryview, array.array)
+VectorLike = Union[List[float], np.ndarray, memoryview]
+
+
+def as_float32_vectors(vectors: Any, ndim: int) -> np.ndarray:
+    """
+    Validates dtype and shape once and returns a float32 array with `ndim` dimensions.
+
+    float32 ndarrays and float32 buffers are returned as views (no copy); other numeric
+    dtypes are converted once. A 1-D input is accepted where a 2-D batch is expected.
+
+    Raises:
+        TypeError: If the input is not numeric or does not have the expected shape.
+    """
+    try:
+        if isinstance(vectors, (np.ndarray, list, tuple)):
+            array = np.asarray(vectors)
+        else:
+            array = np.asarray(memoryview(vectors)) # Buffer protocol, keeps the buffer's item format
+    except (TypeError, ValueError) as e:
+        raise TypeError(f"Expected a list of numbers, a NumPy array or a buffer-protocol object: {e}")
+    if array.dtype.kind not in "fiu":
+        raise TypeError(f"Query vectors must be numeric, got dtype {array.dtype}.")
+    if ndim == 2 and array.ndim == 1:
+        array = array[None, :]
+    if array.ndim != ndim or array.shape[-1] == 0 or (ndim == 2 and array.shape[0] == 0):
+        raise TypeError(f"Expected a non-empty {ndim}-D array of query values, got shape {array.shape}.")
+    return array if array.dtype == np.float32 else array.astype(np.float32)
+
+
+
+class VertexVectorSearchClient:
+    """
+    A client module for interacting with a Google Cloud Vertex AI Vector Search index.
+
+    This class encapsulates the configuration and logic for performing nearest
+    neighbor searches against a specific deployed index endpoint.
+    """
+
+    def __init__(
+        self,
+        api_endpoint: str = DEFAULT_API_ENDPOINT,
+        index_endpoint_resource_name: str = DEFAULT_INDEX_ENDPOINT_RESOURCE_NAME,
+        deployed_index_id: str = DEFAULT_DEPLOYED_INDEX_ID,
+        client_options: Optional[Dict[str, Any]] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        index_resource_name: Optional[str] = None,
+    ):
+        """
+        Initializes the VertexVectorSearchClient.
+
+        Args:
+            api_endpoint: The specific API endpoint for the deployed index
+                          (e.g., "12345.us-central1-12345.vdb.vertexai.goog").
+            index_endpoint_resource_name: The full resource name of the Index Endpoint
+                                         (e.g., "projects/.../locations/.../indexEndpoints/...").
+            deployed_index_id: The ID of the specific index deployed on the endpoint.
+            client_options: Optional dictionary of client options passed directly to
+                            aiplatform_v1.MatchServiceClient. Primarily used for custom
+                            endpoint configuration if api_endpoint is not sufficient.
+            pool_size: Number of persistent gRPC channels (one MatchServiceClient each) used
+                       round-robin. The pool is shared with other clients of the same endpoint.
+            index_resource_name: Optional full resource name of the Index itself
+                                 (e.g., "projects/.../locations/.../indexes/..."). Required for
+                                 upsert_datapoints/remove_datapoints, which need an index
+                                 created with stream updates enabled.
+
+        Raises:
+            ValueError: If required configuration arguments are missing or invalid.
+            ImportError: If google-cloud-aiplatform is not installed.
+        """
+        if not all([api_endpoint, index_endpoint_resource_name, deployed_index_id]):
+            raise ValueError("API endpoint, index endpoint resource name, and deployed index ID are required.")
+
+        self.api_endpoint = api_endpoint
+        self.index_endpoint_resource_name = index_endpoint_resource_name
+        self.deployed_index_id = deployed_index_id
+        self.index_resource_name = index_resource_name
+        self._index_client_pool = None # Created on the first index update
+
+        effective_client_options = {"api_endpoint": self.api_endpoint}
+        if client_options:
+            effective_client_options.update(client_options)
+
+        try:
+            # Pooled, keepalive gRPC channels to the endpoint (shared process-wide)
+            self.client_pool = ClientPool.shared(
+                aiplatform_v1.MatchServiceClient, MatchServiceGrpcTransport, self.api_endpoint,
+                size=pool_size, client_options=effective_client_options,
+            )
+            print(f"VertexVectorSearchClient initialized for endpoint: {self.api_endpoint}")
+        except Exception as e:
+            print(f"Error initializing MatchServiceClient: {e}", file=sys.stderr)
+            raise # Re-raise the exception after logging
+
+    def find_neighbors(
+        self,
+        query_vector: VectorLike,
+        neighbor_count: int = 10,
+        return_full_datapoint: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Finds the nearest neighbors for a given query vector.
+
+        Args:
+            query_vector: The embedding or feature vector to search for: a list of floats,
+                          a float32 NumPy array, or any buffer-protocol object.
+            neighbor_count: The desired number of nearest neighbors to retrieve.
+            return_full_datapoint: If True, retrieve the full datapoint object
+                                   (including feature vector) for each neighbor.
+                                   Defaults to False for efficiency.
+
+        Returns:
+            A list of dictionaries, where each dictionary represents a neighbor
+            and contains 'id' (the datapoint ID) and 'distance' (the distance
+            score from the query vector). Returns an empty list if no neighbors
+            are found or an error occurs.
+
+        Raises:
+            TypeError: If query_vector is not a 1-D numeric vector or neighbor_count is not an int.
+            ValueError: If neighbor_count is not positive.
+            google_exceptions.GoogleAPICallError: If the API call fails.
+        """
+        return self.find_neighbors_batch(
+            query_vectors=as_float32_vectors(query_vector, ndim=1)[None, :],
+            neighbor_counts=[neighbor_count],
+            return_full_datapoint=return_full_datapoint,
+        )[0]
+
+    def find_neighbors_batch(
+        self,
+        query_vectors: Union[List[VectorLike], np.ndarray],
+        neighbor_counts: Union[int, List[int], np.ndarray] = 10,
+        return_full_datapoint: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Finds the nearest neighbors for several query vectors in a single RPC.
+
+        Args:
+            query_vectors: A 2-D float32 array (one row per query), or a list of query vectors.
+            neighbor_counts: Either one neighbor count applied to every query, or a
+                             sequence (list, tuple, NumPy array) with one count per query.
+            return_full_datapoint: If True, include each neighbor's feature vector.
+
+        Returns:
+            A list with one entry per query vector, in the same order. Each entry is a
+            list of {'id', 'distance'} dictionaries as returned by find_neighbors. With
+            return_full_datapoint, each neighbor's 'feature_vector' is a row view into one
+            stacked float32 ndarray per query.
+
+        Raises:
+            TypeError: If the query vectors are not numeric with a consistent dimension, or a neighbor count is not an int.
+            ValueError: If a neighbor count is not positive or the counts don't match the queries.
+            google_exceptions.GoogleAPICallError: If the API call fails.
+        """
+        # Validated once for the whole batch instead of per element
+        query_matrix = as_float32_vectors(query_vectors, ndim=2)
+        neighbor_counts = as_neighbor_counts(neighbor_counts, query_matrix.shape[0])
+
+        try:
+            # 1. Construct one query object per vector, each with its own neighbor count.
+            # The proto needs Python floats; tolist() converts each row in one C-level pass.
+            queries = [
+                aiplatform_v1.FindNeighborsRequest.Query(
+                    datapoint=aiplatform_v1.IndexDatapoint(feature_vector=query_row),
+                    neighbor_count=neighbor_count,
+                )
+                for query_row, neighbor_count in zip(query_matrix.tolist(), neighbor_counts)
+            ]
+
+            # 2. Construct the main request
+            request = aiplatform_v1.FindNeighborsRequest(
+                index_endpoint=self.index_endpoint_resource_name,
+                deployed_index_id=self.deployed_index_id,
+                queries=queries,
+                return_full_datapoint=return_full_datapoint,
+            )
+
+            # 3. Execute the request
+            response = self.client_pool.get().find_neighbors(request)
+
+            # 4. Process the response
+            # The response contains one nearest_neighbors entry per query, in request order.
+            results = []
+            for i in range(len(queries)):
+                processed_neighbors = []
+                if i < len(response.nearest_neighbors):
+                    neighbors = response.nearest_neighbors[i].neighbors
+                    for neighbor in neighbors:
+                        processed_neighbors.append({"id": neighbor.datapoint.datapoint_id, "distance": neighbor.distance})
+                    if return_full_datapoint and processed_neighbors:
+                        # One stacked float32 matrix per query; each neighbor gets a row view
+                        vectors = np.array([neighbor.datapoint.feature_vector for neighbor in neighbors], dtype=np.float32)
+                        for neighbor_data, vector in zip(processed_neighbors, vectors):
+                            neighbor_data["feature_vector"] = vector
+                results.append(processed_neighbors)
+
+            return results
+
+        except google_exceptions.GoogleAPICallError as e:
+            print(f"API Error during find_neighbors: {e}", file=sys.stderr)
+            raise # Re-raise the API error for upstream handling
+        except Exception as e:
+            print(f"An unexpected error occurred in find_neighbors: {e}", file=sys.stderr)
+            # Depending on desired robustness, you might raise, return [], or log differently
+            raise # Re-raise unexpected errors by default
+
+    def upsert_datapoints(self, ids: List[str], vectors: Union[List[VectorLike], np.ndarray]) -> int:
+        """
+        Inserts or replaces datapoints in the index (stream update), in requests of
+        MAX_UPSERT_BATCH_SIZE datapoints.
+
+        Args:
+            ids: Datapoint IDs, one per vector.
+            vectors: A 2-D float32 array (one row per datapoint), or a list of vectors.
+
+        Returns:
+            The number of datapoints upserted.
+
+        Raises:
+            ValueError: If no index_resource_name was configured or ids and vectors differ in length.
+            TypeError: If the vectors are not numeric with a consistent dimension.
+            google_exceptions.GoogleAPICallError: If the API call fails.
+        """
+        vector_matrix = as_float32_vectors(vectors, ndim=2)
+        if len(ids) != vector_matrix.shape[0]:
+            raise ValueError(f"Got {len(ids)} ids for {vector_matrix.shape[0]} vectors.")
+        client = self._index_client()
+        for start in range(0, len(ids), MAX_UPSERT_BATCH_SIZE):
+            datapoints = [
+                aiplatform_v1.IndexDatapoint(datapoint_id=datapoint_id, feature_vector=vector)
+                for datapoint_id, vector in zip(ids[start:start + MAX_UPSERT_BATCH_SIZE],
+                                                vector_matrix[start:start + MAX_UPSERT_BATCH_SIZE].tolist())
+            ]
+            client.upsert_datapoints(request=aiplatform_v1.UpsertDatapointsRequest(
+                index=self.index_resource_name, datapoints=datapoints,
+            ))
+        return len(ids)
+
+    def remove_datapoints(self, ids: List[str]) -> int:
+        """Removes datapoints from the index (stream update). Returns the number of IDs sent."""
+        client = self._index_client()
+        for start in range(0, len(ids), MAX_UPSERT_BATCH_SIZE):
+            client.remove_datapoints(request=aiplatform_v1.RemoveDatapointsRequest(
+                index=self.index_resource_name, datapoint_ids=ids[start:start + MAX_UPSERT_BATCH_SIZE],
+            ))
+        return len(ids)
+
+    def _index_client(self):
+        """Returns an IndexServiceClient on the regional endpoint of the configured index."""
+        if not self.index_resource_name:
+            raise ValueError("index_resource_name is required to update the index.")
+        if self._index_client_pool is None:
+            # projects/{project}/locations/{location}/indexes/{index}
+            location = self.index_resource_name.split("/")[3]
+            self._index_client_pool = ClientPool.shared(
+                aiplatform_v1.IndexServiceClient, IndexServiceGrpcTransport, f"{location}-aiplatform.googleapis.com",
+                size=1, client_options={"api_endpoint": f"{location}-aiplatform.googleapis.com"},
+            )
+        return self._index_client_pool.get()
+
+    def warm_up(self) -> float:
+        """
+        Opens every pooled channel and sends a cheap ReadIndexDatapoints call (no ids) so TLS,
+        HTTP/2 and credential fetching are done before the first user query. Returns elapsed seconds.
+        """
+        return self.client_pool.warm_up(lambda client: client.read_index_datapoints(
+            request=aiplatform_v1.ReadIndexDatapointsRequest(
+                index_endpoint=self.index_endpoint_resource_name,
+                deployed_index_id=self.deployed_index_id,
+                ids=[],
+            )
+        ))
+
+
+# --- Example Usage (Guard with if __name__ == "__main__":) ---
+if __name__ == "__main__":
+    # Best Practice: Load sensitive details from environment variables or a config system
+    # Ensure these environment variables are set before running the script
+    API_ENDPOINT = os.environ.get("VDB_API_ENDPOINT", DEFAULT_API_ENDPOINT)
+    INDEX_ENDPOINT = os.environ.get("VDB_INDEX_ENDPOINT_RESOURCE_NAME", DEFAULT_INDEX_ENDPOINT_RESOURCE_NAME)
+    DEPLOYED_INDEX_ID = os.environ.get("VDB_DEPLOYED_INDEX_ID", DEFAULT_DEPLOYED_INDEX_ID)
+
+    # --- Dummy Example ---
+    # Replace this with a real feature vector (e.g., from a text embedding model)
+    # The dimension must match the dimension of the vectors in your index!
+    # Example: A 4-dimensional vector
+    example_query_vector = [0.1, 0.8, 0.3, 0.5]
+    num_neighbors_to_find = 5
+
+    print("\n--- Running Vertex AI Vector Search Example ---")
+    print(f"Target Index Endpoint: {INDEX_ENDPOINT}")
+    print(f"Deployed Index ID: {DEPLOYED_INDEX_ID}")
+
+    try:
+        # Instantiate the client
+        search_client = VertexVectorSearchClient(
+            api_endpoint=API_ENDPOINT,
+            index_endpoint_resource_name=INDEX_ENDPOINT,
+            deployed_index_id=DEPLOYED_INDEX_ID,
+        )
+
+        # Perform the search
+        print(f"\nSearching for {num_neighbors_to_find} neighbors for vector: {example_query_vector[:10]}...") # Print first few dimensions
+        neighbors = search_client.find_neighbors(
+            query_vector=example_query_vector,
+            neighbor_count=num_neighbors_to_find
+        )
+
+        # Display results
+        if neighbors:
+            print(f"\nFound {len(neighbors)} neighbors:")
+            for i, neighbor in enumerate(neighbors):
+                print(f"  {i+1}. ID: {neighbor['id']}, Distance: {neighbor['distance']:.4f}")
+        else:
+            print("\nNo neighbors found.")
+
+    except ValueError as ve:
+        print(f"\nConfiguration Error: {ve}", file=sys.stderr)
+    except ImportError:
+         # Message already printed if import failed initially
+         pass
+    except google_exceptions.GoogleAPICallError as api_error:
+        print(f"\nAPI Call Failed: {api_error}", file=sys.stderr)
+    except Exception as e:
         print(f"\nAn unexpected error occurred during the example run: {e}", file=sys.stderr)
\ No newline at end of file